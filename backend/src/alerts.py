@@ -0,0 +1,134 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, union, update
+from sqlalchemy.orm import Session
+
+from models import (
+    JournalEntry, AttendanceMark, Grade, Student, Subject,
+    StudentWeeklyStats, JobWatermark, NotificationOutbox
+)
+from rollups import week_start
+from settings import (
+    ALERT_WINDOW_DAYS, ALERT_MIN_AVERAGE, ALERT_MIN_GRADES,
+    ALERT_MAX_ABSENCES, ALERT_COOLDOWN_HOURS
+)
+
+
+# Проверка правил уведомлений. Задача смотрит только записи, измененные после отметки
+# (watermark), и считает показатели учеников по агрегатам student_weekly_stats.
+# Все сработавшие правила по одному ученику сводятся в одно уведомление в outbox.
+
+ALERT_JOB = "alerts"
+# Запас на транзакции, начатые до отметки и закоммиченные после нее
+WATERMARK_LAG = timedelta(seconds=30)
+
+
+def claim_window(db: Session, now: datetime):
+    # Отметка сдвигается условным UPDATE: если задачу параллельно запустил другой процесс, окно достанется одному
+    cutoff = now - WATERMARK_LAG
+    watermark = db.get(JobWatermark, ALERT_JOB)
+    if watermark is None:
+        db.add(JobWatermark(job=ALERT_JOB, value=cutoff))
+        db.flush()
+        return datetime.min, cutoff
+    since = watermark.value
+    if since >= cutoff:
+        return None
+    claimed = db.execute(
+        update(JobWatermark)
+        .where(JobWatermark.job == ALERT_JOB, JobWatermark.value == since)
+        .values(value=cutoff)
+    ).rowcount
+    return (since, cutoff) if claimed else None
+
+def changed_students(db: Session, since: datetime, until: datetime) -> List[int]:
+    changed = select(JournalEntry.id).where(JournalEntry.updated_at > since, JournalEntry.updated_at <= until)
+    return list(db.scalars(union(
+        select(AttendanceMark.student_id).where(AttendanceMark.entry_id.in_(changed)),
+        select(Grade.student_id).where(Grade.entry_id.in_(changed))
+    )))
+
+def evaluate_rules(db: Session, student_ids: List[int], now: datetime) -> Dict[int, List[str]]:
+    reasons = defaultdict(list)
+    if not student_ids:
+        return reasons
+
+    rows = db.execute(
+        select(
+            StudentWeeklyStats.student_id,
+            Subject.name,
+            func.sum(StudentWeeklyStats.grade_sum),
+            func.sum(StudentWeeklyStats.grade_count),
+            func.sum(StudentWeeklyStats.absences)
+        )
+        .outerjoin(Subject, StudentWeeklyStats.subject_id == Subject.id)
+        .where(
+            StudentWeeklyStats.student_id.in_(student_ids),
+            StudentWeeklyStats.week_start >= week_start(now - timedelta(days=ALERT_WINDOW_DAYS))
+        )
+        .group_by(StudentWeeklyStats.student_id, StudentWeeklyStats.subject_id, Subject.name)
+    )
+
+    absences = defaultdict(int)
+    for student_id, subject_name, grade_sum, grade_count, subject_absences in rows:
+        absences[student_id] += subject_absences or 0
+        if grade_count and grade_count >= ALERT_MIN_GRADES and grade_sum / grade_count < ALERT_MIN_AVERAGE:
+            reasons[student_id].append(
+                f"Средний балл по предмету «{subject_name}» за {ALERT_WINDOW_DAYS} дней: {grade_sum / grade_count:.2f}"
+            )
+    for student_id, count in absences.items():
+        if count >= ALERT_MAX_ABSENCES:
+            reasons[student_id].append(f"Пропусков за {ALERT_WINDOW_DAYS} дней: {count}")
+    return reasons
+
+def enqueue_alerts(db: Session, reasons: Dict[int, List[str]], now: datetime) -> int:
+    if not reasons:
+        return 0
+    students = {student.id: student for student in db.scalars(select(Student).where(Student.id.in_(reasons)))}
+    # Последнее уведомление по каждому ученику: неотправленное обновляем, недавно отправленное не повторяем
+    latest_ids = (
+        select(func.max(NotificationOutbox.id))
+        .where(NotificationOutbox.student_id.in_(reasons))
+        .group_by(NotificationOutbox.student_id)
+    )
+    latest = {
+        message.student_id: message
+        for message in db.scalars(select(NotificationOutbox).where(NotificationOutbox.id.in_(latest_ids)))
+    }
+
+    cooldown = now - timedelta(hours=ALERT_COOLDOWN_HOURS)
+    queued = 0
+    for student_id, lines in reasons.items():
+        student = students.get(student_id)
+        if student is None:
+            continue
+        subject = f"Журнал: {student.last_name} {student.first_name}"
+        body = "\n".join(lines)
+        message = latest.get(student_id)
+        if message is not None and message.sent_at is None:
+            message.subject, message.body, message.created_at = subject, body, now
+        elif message is not None and message.sent_at > cooldown:
+            continue
+        else:
+            db.add(NotificationOutbox(
+                student_id=student_id,
+                recipient=student.email,
+                subject=subject,
+                body=body,
+                created_at=now
+            ))
+        queued += 1
+    return queued
+
+def run_alert_job(db: Session, now: Optional[datetime] = None) -> int:
+    now = now or datetime.utcnow()
+    window = claim_window(db, now)
+    if window is None:
+        db.rollback()
+        return 0
+    student_ids = changed_students(db, *window)
+    queued = enqueue_alerts(db, evaluate_rules(db, student_ids, now), now)
+    db.commit()
+    return queued
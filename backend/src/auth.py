@@ -1,32 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from jose import jwt
-from passlib.context import CryptContext
+from jose import JWTError, jwt
+from uuid import uuid4
 
-from database import get_db
-from models import User
-from schemas import UserCreate, UserResponse
-from dependencies import SECRET_KEY, ALGORITHM, get_current_user
+from cache import BloomFilter
+from database import get_db, current_tenant
+from models import User, RefreshToken
+from schemas import UserCreate, UserResponse, RefreshTokenRequest
+from hashing import verify_password_async, get_password_hash_async
+from services import create_refresh_token
+from settings import REFRESH_TOKEN_EXPIRE_DAYS, REVOKED_TOKENS_BLOOM_CAPACITY
+from dependencies import SECRET_KEY, ALGORITHM, get_current_user, CurrentUser, credentials_exception
 # Используем префикс для аутентификации
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Запросы к БД идут в пуле потоков, проверка пароля - в пуле процессов через await:
+# пока считается bcrypt, не заняты ни поток, ни соединение с БД
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def find_credentials(db: Session, username: str):
+    try:
+        return db.execute(select(User.username, User.hashed_password).where(User.username == username)).first()
+    finally:
+        # Соединение возвращается в пул до проверки пароля
+        db.rollback()
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: Session, username: str, password: str):
+    user = await run_in_threadpool(find_credentials, db, username)
+    if not user or not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
+def token_claims(username: str) -> dict:
+    # Школа пишется в токен, дальше запросы с ним идут в базу этой школы (tenants.py)
+    claims = {"sub": username}
+    if current_tenant.get() is not None:
+        claims["school"] = current_tenant.get()
+    return claims
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -37,41 +53,138 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-@router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(
-        (User.username == user.username) | (User.email == user.email)
-    ).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username or email already registered")
-    
-    hashed_password = get_password_hash(user.password)
+
+# Отозванные семейства refresh-токенов. Попадание в фильтр - отказ без запроса к БД;
+# редкое ложное срабатывание (error_rate) означает лишь повторный вход по паролю.
+revoked_families = BloomFilter(capacity=REVOKED_TOKENS_BLOOM_CAPACITY)
+
+def issue_refresh_token(db: Session, username: str, family_id: str = None) -> str:
+    jti = uuid4().hex
+    family_id = family_id or uuid4().hex
+    expires_delta = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(RefreshToken(
+        jti=jti,
+        family_id=family_id,
+        username=username,
+        expires_at=datetime.utcnow() + expires_delta
+    ))
+    return create_refresh_token({**token_claims(username), "jti": jti, "fam": family_id}, expires_delta)
+
+def load_revoked_families(db: Session):
+    # Фильтр живет в памяти процесса, после рестарта заполняем его из таблицы
+    families = db.scalars(
+        select(RefreshToken.family_id)
+        .where(RefreshToken.revoked == True, RefreshToken.expires_at > datetime.utcnow())
+        .distinct()
+    )
+    for family_id in families:
+        revoked_families.add(family_id)
+
+def revoke_family(db: Session, family_id: str):
+    db.execute(update(RefreshToken).where(RefreshToken.family_id == family_id).values(revoked=True))
+    db.commit()
+    revoked_families.add(family_id)
+
+def user_exists(db: Session, user: UserCreate) -> bool:
+    try:
+        return db.query(User.id).filter(
+            (User.username == user.username) | (User.email == user.email)
+        ).first() is not None
+    finally:
+        db.rollback()
+
+def save_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     new_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
     return new_user
 
+@router.post("/register", response_model=UserResponse)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(user_exists, db, user):
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(save_user, db, user, hashed_password)
+
+def issue_login_tokens(db: Session, username: str) -> dict:
+    access_token = create_access_token(
+        data=token_claims(username)
+    )
+
+    # Заодно чистим истекшие refresh-токены пользователя
+    db.execute(delete(RefreshToken).where(
+        RefreshToken.username == username,
+        RefreshToken.expires_at < datetime.utcnow()
+    ))
+    refresh_token = issue_refresh_token(db, username)
+    db.commit()
+    
+    return {
+        "access_token": access_token, 
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
-    
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}
+    return await run_in_threadpool(issue_login_tokens, db, user.username)
+
+# Обновление сессии без пароля: bcrypt не вызывается, только JWT и одна запись в БД
+@router.post("/refresh")
+def refresh_access_token(body: RefreshTokenRequest, db: Session = Depends(get_db)):
+    try:
+        payload = jwt.decode(body.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception()
+    username = payload.get("sub")
+    jti = payload.get("jti")
+    family_id = payload.get("fam")
+    if payload.get("type") != "refresh" or not (username and jti and family_id):
+        raise credentials_exception()
+    # Токен одной школы не обновляется в базе другой
+    if payload.get("school") != current_tenant.get():
+        raise credentials_exception()
+
+    if family_id in revoked_families:
+        raise credentials_exception()
+
+    # Токен одноразовый: помечаем использованным атомарно, гонка двух запросов даст ровно один успех
+    now = datetime.utcnow()
+    result = db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.jti == jti,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > now
+        )
+        .values(used_at=now)
     )
-    
+    if result.rowcount != 1:
+        # Повторное предъявление уже использованного токена - признак кражи, отзываем все семейство
+        db.rollback()
+        revoke_family(db, family_id)
+        raise credentials_exception()
+
+    refresh_token = issue_refresh_token(db, username, family_id)
+    db.commit()
+
     return {
-        "access_token": access_token, 
+        "access_token": create_access_token(data=token_claims(username)),
         "token_type": "bearer",
+        "refresh_token": refresh_token,
         "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
     }
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
\ No newline at end of file
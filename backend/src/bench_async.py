@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.util import await_
+
+
+# Синхронный и асинхронный режим (ASYNC_DB=0/1) под одной нагрузкой: N запросов GET /entries/?class_id=…
+# с параллельностью C через ASGI-приложение целиком (без сети), база - временный файл SQLite.
+# ASYNC_DB читается при импорте, поэтому каждый режим запускается в отдельном процессе.
+# LATENCY_MS - время ожидания сервера БД на каждый SQL-запрос (сеть и выполнение; у локального SQLite его почти нет).
+# Синхронный драйвер ждет ответа, занимая поток; асинхронный ждет в event loop, как asyncpg.
+# Пул соединений в обоих режимах - по числу параллельных запросов, журнал медленных запросов выключен.
+# Клиент работает в том же процессе и делит с приложением GIL, поэтому при быстрой БД оба режима
+# упираются в процессор; асинхронный выигрывает, когда ожидание БД занимает все 40 потоков пула.
+# Запуск: python bench_async.py [N] [C] [PAGE] [LATENCY_MS]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+def fill(path: str, classes: int, entries_per_class: int):
+    from models import AttendanceMark, Base, Class, Grade, JournalEntry, Student, Subject
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    students_per_class = 25
+    started = datetime(2025, 9, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(Class), [{"id": c + 1, "name": f"{c + 1}А"} for c in range(classes)])
+        connection.execute(insert(Subject), [{"id": 1, "name": "Математика"}])
+        connection.execute(insert(Student), [
+            {"id": c * students_per_class + s + 1, "first_name": f"Имя{s}", "last_name": f"Фамилия{s}",
+             "email": f"s{c}_{s}@example.com", "class_id": c + 1}
+            for c in range(classes) for s in range(students_per_class)
+        ])
+        entries, marks, grades = [], [], []
+        for c in range(classes):
+            for e in range(entries_per_class):
+                entry_id = c * entries_per_class + e + 1
+                entries.append({
+                    "id": entry_id, "subject_id": 1, "class_id": c + 1, "date": started + timedelta(days=e),
+                    "topic": f"Тема {e}", "homework": f"Задание {e}", "updated_at": started, "version": 1,
+                })
+                for s in range(students_per_class):
+                    student_id = c * students_per_class + s + 1
+                    marks.append({"entry_id": entry_id, "student_id": student_id, "status": "present"})
+                    if s % 5 == e % 5:
+                        grades.append({"entry_id": entry_id, "student_id": student_id, "value": "5", "kind": "lesson"})
+        connection.execute(insert(JournalEntry), entries)
+        connection.execute(insert(AttendanceMark), marks)
+        connection.execute(insert(Grade), grades)
+    engine.dispose()
+
+async def load(requests: int, concurrency: int, classes: int, page: int):
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies, statuses = [], []
+        queue = iter(range(requests))
+
+        async def worker():
+            for i in queue:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/entries/?class_id={i % classes + 1}&limit={page}")
+                    status = response.status_code
+                except Exception:
+                    # ASGITransport пробрасывает исключения приложения, например таймаут пула соединений
+                    status = 500
+                latencies.append(time.perf_counter() - started)
+                statuses.append(status)
+
+        # Прогрев: соединения пула и импорт обработчиков не должны попасть в замер
+        await asyncio.gather(*(client.get("/entries/?limit=1") for _ in range(concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - started
+
+def run_mode(requests: int, concurrency: int, classes: int, page: int, latency_ms: int):
+    # Дочерний процесс: режим и база заданы переменными окружения ASYNC_DB и DATABASE_URL
+    import database
+    import dependencies
+    from dependencies import CurrentUser
+    from main import app
+
+    if latency_ms:
+        delay = latency_ms / 1000
+        event.listen(database.engine, "before_cursor_execute", lambda *args: time.sleep(delay))
+        if database.async_engine is not None:
+            event.listen(
+                database.async_engine.sync_engine, "before_cursor_execute", lambda *args: await_(asyncio.sleep(delay))
+            )
+    user = CurrentUser(id=1, username="bench", email="bench@example.com", is_active=True)
+    app.dependency_overrides[dependencies.get_current_user] = lambda: user
+    app.dependency_overrides[dependencies.get_current_user_async] = lambda: user
+    latencies, statuses, elapsed = asyncio.run(load(requests, concurrency, classes, page))
+    ok = [latency for latency, code in zip(latencies, statuses) if code == 200]
+    print(json.dumps({
+        "ok": len(ok),
+        "errors": len(statuses) - len(ok),
+        "rps": len(ok) / elapsed,
+        "p50": statistics.median(ok) if ok else 0.0,
+        "p99": percentile(ok, 0.99),
+    }))
+
+def main(requests: int = 800, concurrency: int = 200, page: int = 20, latency_ms: int = 200):
+    classes, entries_per_class = 20, 200
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    fill(path, classes, entries_per_class)
+    print(f"{requests} запросов GET /entries/?class_id=…&limit={page}, параллельно {concurrency}, "
+          f"задержка БД {latency_ms}мс на запрос")
+    try:
+        for mode in ("0", "1"):
+            env = {
+                **os.environ, "ASYNC_DB": mode, "DATABASE_URL": f"sqlite:///{path}", "ALERTS_ENABLED": "0",
+                "DB_POOL_SIZE": str(concurrency), "DB_MAX_OVERFLOW": "0", "SLOW_QUERY_MS": "-1",
+            }
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", *(str(arg) for arg in (requests, concurrency, classes, page, latency_ms))],
+                env=env, stdout=subprocess.PIPE, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{'асинхронный' if mode == '1' else 'синхронный '}: {result['rps']:.0f} запросов/с, "
+                  f"p50 {result['p50'] * 1000:.1f}мс, p99 {result['p99'] * 1000:.1f}мс, "
+                  f"успешно {result['ok']}, ошибок {result['errors']}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run_mode(*(int(arg) for arg in sys.argv[2:7]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:5]))
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("ALERTS_ENABLED", "0")
+
+import database
+import dependencies
+from dependencies import CurrentUser
+from hashing import _hash, shutdown_executor
+from main import app
+from models import Base, Class, User
+from settings import PASSWORD_HASH_WORKERS
+
+
+# Волна входов: N запросов POST /auth/token с параллельностью C через ASGI-приложение целиком
+# (без сети). Одновременно раз в 20 мс идет GET /classes/ - синхронный эндпоинт из того же пула
+# потоков: его задержка показывает, не занимает ли ожидание bcrypt потоки остальных запросов.
+# Запуск: python bench_login.py [N] [C]; размер пула - PASSWORD_HASH_WORKERS.
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+def fill(path: str, users: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    hashed = _hash("password")  # один хеш на всех: стоимость проверки та же
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed, "is_active": True}
+            for i in range(users)
+        ])
+        connection.execute(insert(Class), [{"name": "5А"}])
+    return engine
+
+async def storm(logins: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies, statuses, probe = [], [], []
+        queue = iter(range(logins))
+        done = asyncio.Event()
+
+        async def worker():
+            for i in queue:
+                started = time.perf_counter()
+                response = await client.post("/auth/token", data={"username": f"user{i}", "password": "password"})
+                latencies.append(time.perf_counter() - started)
+                statuses.append(response.status_code)
+
+        async def prober():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/classes/")
+                probe.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        probe_task = asyncio.create_task(prober())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+        return latencies, statuses, probe, elapsed
+
+def main(logins: int = 200, concurrency: int = 50):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = fill(path, logins)
+    Session = sessionmaker(bind=engine)
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[dependencies.get_current_user] = lambda: CurrentUser(
+        id=1, username="bench", email="bench@example.com", is_active=True
+    )
+    try:
+        latencies, statuses, probe, elapsed = asyncio.run(storm(logins, concurrency))
+    finally:
+        shutdown_executor()
+        engine.dispose()
+        os.remove(path)
+
+    ok = [latency for latency, code in zip(latencies, statuses) if code == 200]
+    cores = max(PASSWORD_HASH_WORKERS, 1)
+    print(f"{logins} входов, параллельно {concurrency}, воркеров bcrypt: {PASSWORD_HASH_WORKERS}, ядер: {os.cpu_count()}")
+    print(f"успешно: {len(ok)}, 503: {statuses.count(503)}, прочие: {len(statuses) - len(ok) - statuses.count(503)}")
+    if ok:
+        print(f"вход: p50 {percentile(ok, 0.5) * 1000:.0f}мс, p99 {percentile(ok, 0.99) * 1000:.0f}мс, "
+              f"{len(ok) / elapsed:.1f} входов/с, {len(ok) / elapsed / cores:.1f} входов/с на ядро")
+    if probe:
+        # Запросы-пробы идут по одному, поэтому остановка пула видна как одна долгая проба: смотрим максимум
+        print(f"GET /classes/ во время волны: p50 {statistics.median(probe) * 1000:.1f}мс, "
+              f"p99 {percentile(probe, 0.99) * 1000:.1f}мс, максимум {max(probe) * 1000:.0f}мс ({len(probe)} запросов)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,78 @@
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import crud
+from models import Base, JournalEntry, AttendanceMark, Grade, Student, Class, Subject, User
+from routes.entries import entry_response
+from schemas import JournalEntryResponse
+from serialization import dumps, entry_rows, orjson
+
+
+# Сравнение ответа /entries/ на N записях (по умолчанию 10 000) в памяти:
+# ORM-объекты + JournalEntryResponse + проверка и сериализация через response_model (как делает FastAPI)
+# против кортежей SQL + словарей + orjson. Запуск: python bench_serialization.py [N] [учеников в классе]
+
+def fill(db: Session, entries: int, students: int):
+    db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="", is_active=True))
+    db.add(Class(id=1, name="5А"))
+    db.add(Subject(id=1, name="Математика", teacher_id=1))
+    db.execute(insert(Student), [
+        {"id": i, "first_name": f"Имя{i}", "last_name": f"Фамилия{i}", "email": f"s{i}@example.com", "class_id": 1}
+        for i in range(1, students + 1)
+    ])
+    start = datetime(2026, 9, 1, 8, 30)
+    db.execute(insert(JournalEntry), [
+        {"id": i, "subject_id": 1, "class_id": 1, "date": start + timedelta(hours=i),
+         "topic": f"Тема урока {i}", "homework": f"Параграф {i % 40}, упражнения {i % 7}-{i % 7 + 3}"}
+        for i in range(1, entries + 1)
+    ])
+    db.execute(insert(AttendanceMark), [
+        {"entry_id": i, "student_id": s, "status": "absent" if (i + s) % 9 == 0 else "present"}
+        for i in range(1, entries + 1) for s in range(1, students + 1)
+    ])
+    db.execute(insert(Grade), [
+        {"entry_id": i, "student_id": s, "value": str(2 + (i + s) % 4), "kind": "lesson"}
+        for i in range(1, entries + 1) for s in range(1, students + 1) if (i * s) % 5 == 0
+    ])
+    db.commit()
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+def main(entries: int = 10_000, students: int = 25):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    adapter = TypeAdapter(List[JournalEntryResponse])
+    with Session(engine) as db:
+        fill(db, entries, students)
+
+    with Session(engine) as db:
+        orm, orm_load = timed(lambda: db.scalars(crud.entries_page_select()).all())
+        responses, orm_build = timed(lambda: [entry_response(entry) for entry in orm])
+        orm_body, orm_dump = timed(lambda: adapter.dump_json(adapter.validate_python(responses, from_attributes=True)))
+
+    with Session(engine) as db:
+        (rows, attendance, grades), fast_load = timed(lambda: crud.list_entry_rows(db))
+        dicts, fast_build = timed(lambda: entry_rows(rows, attendance, grades))
+        fast_body, fast_dump = timed(lambda: dumps(dicts))
+
+    print(f"{entries} записей, {students} учеников, сериализатор: {'orjson' if orjson else 'json'}")
+    print(f"{'':22}{'загрузка':>10}{'сборка':>10}{'JSON':>10}{'всего':>10}")
+    for name, load, build, dump in (
+        ("response_model", orm_load, orm_build, orm_dump),
+        ("кортежи + orjson", fast_load, fast_build, fast_dump),
+    ):
+        print(f"{name:22}{load * 1000:>8.0f}мс{build * 1000:>8.0f}мс{dump * 1000:>8.0f}мс{(load + build + dump) * 1000:>8.0f}мс")
+    print("ответы совпадают" if orm_body == fast_body else "ОТВЕТЫ РАЗЛИЧАЮТСЯ")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import current_sessionmaker, current_tenant, read_only_request
+from models import ChangeLog
+from settings import (
+    CHANGE_FEED_POLL_INTERVAL, CHANGE_FEED_HEARTBEAT, CHANGE_FEED_QUEUE_SIZE, CHANGE_FEED_BATCH,
+    CHANGE_FEED_GAP_GRACE, CHANGE_LOG_RETENTION_DAYS
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Лента изменений. Создание, изменение и удаление записей журнала и расписания добавляют строку
+# в change_log в той же транзакции, что и само изменение. Клиент подписывается на класс
+# и продолжает с последнего полученного seq, поэтому после переподключения ничего не теряется.
+# Рассылка - внутри процесса: одна задача на школу читает новые строки журнала и раскладывает
+# их по очередям подписчиков, а сам подписчик без изменений только ждет своей очереди.
+#
+# seq выдается при вставке, а строка видна только после коммита. На PostgreSQL транзакция, получившая
+# меньший seq, может закоммитить позже: строки читаются только до первого пропуска в нумерации ("горизонт").
+# Через пропуск переходим, когда следующая за ним строка старше CHANGE_FEED_GAP_GRACE -
+# считаем, что пропущенный seq откатился. Если транзакция все же закоммитит его позже, клиенты
+# эту строку не получат, поэтому CHANGE_FEED_GAP_GRACE должен быть больше самой долгой транзакции записи.
+
+def change_rows(
+    kind: str,
+    object_id: int,
+    action: str,
+    class_id: Optional[int],
+    version: Optional[int] = None,
+    previous_class_id: Optional[int] = None
+) -> List[dict]:
+    rows = []
+    if previous_class_id is not None and previous_class_id != class_id:
+        # Объект ушел в другой класс: для подписчиков старого класса он удален
+        rows.append({"kind": kind, "object_id": object_id, "action": "delete", "class_id": previous_class_id})
+    rows.append({"kind": kind, "object_id": object_id, "action": action, "class_id": class_id, "version": version})
+    return rows
+
+def record_changes(db: Session, rows: List[dict]):
+    if not rows:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(ChangeLog), [{"version": None, **row, "created_at": now} for row in rows])
+    # Подписчики узнают об изменениях после коммита (см. publish_after_commit)
+    db.info["changes_pending"] = True
+
+def record_change(db: Session, kind: str, object_id: int, action: str, class_id: Optional[int], **kwargs):
+    record_changes(db, change_rows(kind, object_id, action, class_id, **kwargs))
+
+
+def change_event(row: ChangeLog) -> dict:
+    return {
+        "seq": row.seq,
+        "kind": row.kind,
+        "id": row.object_id,
+        "action": row.action,
+        "class_id": row.class_id,
+        "version": row.version,
+        "at": row.created_at,
+    }
+
+def settled_seq(db: Session, after: int) -> int:
+    # Горизонт: наибольший seq, до которого после after нет незакоммиченных строк
+    cutoff = datetime.utcnow() - timedelta(seconds=CHANGE_FEED_GAP_GRACE)
+    rows = db.execute(
+        select(ChangeLog.seq, ChangeLog.created_at).where(ChangeLog.seq > after).order_by(ChangeLog.seq).limit(CHANGE_FEED_BATCH)
+    )
+    horizon = after
+    for seq, created_at in rows:
+        if seq != horizon + 1 and created_at > cutoff:
+            break
+        horizon = seq
+    return horizon
+
+def read_changes(
+    after: int,
+    class_id: Optional[int] = None,
+    limit: int = CHANGE_FEED_BATCH,
+    until: Optional[int] = None
+) -> Tuple[List[dict], int]:
+    # Изменения после after, не дальше горизонта (или until, если он уже известен), и сам горизонт:
+    # если строк меньше limit, выдано все до него
+    db = current_sessionmaker()()
+    try:
+        horizon = settled_seq(db, after) if until is None else until
+        stmt = select(ChangeLog).where(ChangeLog.seq > after, ChangeLog.seq <= horizon)
+        if class_id is not None:
+            stmt = stmt.where(ChangeLog.class_id == class_id)
+        return [change_event(row) for row in db.scalars(stmt.order_by(ChangeLog.seq).limit(limit))], horizon
+    finally:
+        db.close()
+
+def log_bounds(db: Session) -> Tuple[Optional[int], int]:
+    # (первый хранящийся seq, горизонт журнала); пустой журнал - (None, 0).
+    # Горизонт ищется от последней строки старше CHANGE_FEED_GAP_GRACE: более ранние уже не изменятся
+    cutoff = datetime.utcnow() - timedelta(seconds=CHANGE_FEED_GAP_GRACE)
+    first, settled = db.execute(
+        select(func.min(ChangeLog.seq), func.max(ChangeLog.seq).filter(ChangeLog.created_at <= cutoff))
+    ).one()
+    if first is None:
+        return None, 0
+    return first, settled_seq(db, settled if settled is not None else first - 1)
+
+def seq_bounds() -> Tuple[Optional[int], int]:
+    db = current_sessionmaker()()
+    try:
+        return log_bounds(db)
+    finally:
+        db.close()
+
+def needs_reset(after: int, first: Optional[int]) -> bool:
+    # Строки после after уже удалены очисткой: клиенту нужно загрузить данные заново
+    return first is not None and after < first - 1
+
+
+class Subscription:
+    def __init__(self, class_id: Optional[int], after: int):
+        self.class_id = class_id
+        self.last_seq = after
+        self.feed = None
+        self.queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        # Пропущенное (до подписки или при переполнении очереди) дочитывается из журнала
+        self.catch_up = True
+
+    def deliver(self, change: dict):
+        if self.catch_up:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.catch_up = True
+
+    async def events(self):
+        # Изменения по порядку seq; None - пора отправить пустое сообщение, чтобы соединение не закрылось
+        while True:
+            if self.catch_up:
+                await self.feed.ready.wait()
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.catch_up = False
+                # Из журнала - до горизонта рассылки, дальше изменения придут в очередь
+                until = self.feed.last_seq
+                while self.last_seq < until:
+                    backlog, _ = await run_in_threadpool(read_changes, self.last_seq, self.class_id, CHANGE_FEED_BATCH, until)
+                    for change in backlog:
+                        self.last_seq = change["seq"]
+                        yield change
+                    if len(backlog) < CHANGE_FEED_BATCH:
+                        self.last_seq = until
+                continue
+            try:
+                change = await asyncio.wait_for(self.queue.get(), CHANGE_FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            # Изменение могло уже прийти из журнала при дочитывании
+            if change["seq"] > self.last_seq:
+                self.last_seq = change["seq"]
+                yield change
+
+
+class ChangeFeed:
+    # Новые строки журнала одной школы: по сигналу после коммита в этом процессе
+    # или раз в CHANGE_FEED_POLL_INTERVAL (изменения, сделанные другими процессами)
+    def __init__(self, tenant: Optional[str]):
+        self.tenant = tenant
+        self.subscribers: Dict[Optional[int], Set[Subscription]] = defaultdict(set)
+        self.wakeup = asyncio.Event()
+        # Горизонт рассылки известен (после первого чтения журнала)
+        self.ready = asyncio.Event()
+        self.task = None
+        self.last_seq = None
+
+    def add(self, subscription: Subscription):
+        self.subscribers[subscription.class_id].add(subscription)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def remove(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.class_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.class_id]
+
+    async def run(self):
+        # Контекст задачи скопирован из запроса: читаем журнал своей школы и с основной базы
+        current_tenant.set(self.tenant)
+        read_only_request.set(False)
+        try:
+            while self.subscribers:
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception("Change feed failed to read change_log (school: %s)", self.tenant)
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), CHANGE_FEED_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+        finally:
+            self.task = None
+            # При следующем запуске начнем с горизонта журнала: новые подписчики дочитывают пропущенное сами
+            self.last_seq = None
+            self.ready.clear()
+
+    async def poll(self):
+        if self.last_seq is None:
+            self.last_seq = (await run_in_threadpool(seq_bounds))[1]
+            self.ready.set()
+        while True:
+            # Строки за пропуском в нумерации остаются до следующего опроса
+            changes, _ = await run_in_threadpool(read_changes, self.last_seq)
+            for change in changes:
+                self.last_seq = change["seq"]
+                for subscription in self.subscribers.get(change["class_id"], set()) | self.subscribers.get(None, set()):
+                    subscription.deliver(change)
+            if len(changes) < CHANGE_FEED_BATCH:
+                return
+
+
+class ChangeBroker:
+    def __init__(self):
+        self.feeds: Dict[Optional[str], ChangeFeed] = {}
+        self.loop = None
+
+    def subscribe(self, class_id: Optional[int], after: int) -> Subscription:
+        # Вызывается из обработчика запроса, в цикле событий сервера
+        self.loop = asyncio.get_running_loop()
+        tenant = current_tenant.get()
+        feed = self.feeds.get(tenant)
+        if feed is None:
+            feed = self.feeds[tenant] = ChangeFeed(tenant)
+        subscription = Subscription(class_id, after)
+        subscription.feed = feed
+        feed.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        feed = subscription.feed
+        feed.remove(subscription)
+        if not feed.subscribers:
+            # Последний подписчик ушел: задача школы останавливается сразу, а не при следующем опросе
+            if feed.task is not None:
+                feed.task.cancel()
+            if self.feeds.get(feed.tenant) is feed:
+                del self.feeds[feed.tenant]
+
+    def notify(self, tenant: Optional[str]):
+        # Из любого потока: будим задачу школы, если у нее есть подписчики
+        feed = self.feeds.get(tenant)
+        if feed is None or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(feed.wakeup.set)
+        except RuntimeError:
+            # Цикл событий уже закрыт (остановка сервера)
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "feeds": len(self.feeds),
+            "subscribers": sum(len(subs) for feed in self.feeds.values() for subs in feed.subscribers.values()),
+        }
+
+
+broker = ChangeBroker()
+
+@event.listens_for(Session, "after_commit")
+def publish_after_commit(session: Session):
+    if session.info.pop("changes_pending", False):
+        broker.notify(current_tenant.get())
+
+@event.listens_for(Session, "after_rollback")
+def drop_pending_changes(session: Session):
+    session.info.pop("changes_pending", None)
+
+
+def purge_change_log(db: Session, now: Optional[datetime] = None) -> int:
+    # Фоновая задача: клиент, отставший больше чем на CHANGE_LOG_RETENTION_DAYS, получит reset
+    cutoff = (now or datetime.utcnow()) - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+    # Последняя строка остается всегда: по ней видно, что более ранние номера уже удалены
+    newest = select(func.max(ChangeLog.seq)).scalar_subquery()
+    removed = db.execute(delete(ChangeLog).where(ChangeLog.created_at < cutoff, ChangeLog.seq < newest)).rowcount
+    db.commit()
+    return removed
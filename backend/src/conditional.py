@@ -0,0 +1,115 @@
+import hashlib
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import get_db, get_async_db
+from dependencies import get_current_user, get_current_user_async, CurrentUser
+from models import TableVersion
+from rollups import DIALECT_INSERTS
+
+
+# Условные GET-запросы: клиент присылает If-None-Match с ранее полученным ETag
+# и получает 304 без тела, если данные не изменились.
+
+def make_etag(data: bytes) -> str:
+    return f'"{hashlib.blake2b(data, digest_size=12).hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Сравнение слабое: W/"x" и "x" считаются одинаковыми
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def conditional_response(request: Request, body: bytes, etag: str, media_type: str = "application/json") -> Response:
+    headers = validator_headers(etag)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+# Слабый ETag по версиям таблиц, из которых собирается ответ: max(updated_at) по индексу и счетчик
+# жестких удалений из table_versions (мягкое удаление и так меняет updated_at). Проверка идет
+# до обработчика, поэтому на 304 тело не запрашивается и не сериализуется.
+# У таблиц без updated_at (история и снимки записей) строки не изменяются, версия - max(id):
+# каждое изменение записи и каждое сворачивание истории добавляет строку, и ответ на as_of
+# меняется вместе с ETag.
+
+def count_deletes(connection, tables):
+    # В порядке имен, чтобы параллельные транзакции не блокировали строки счетчиков крест-накрест
+    stmt = DIALECT_INSERTS[connection.dialect.name](TableVersion)
+    stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"deletes": TableVersion.deletes + 1})
+    connection.execute(stmt, [{"name": table, "deletes": 1} for table in sorted(tables)])
+
+@event.listens_for(Session, "after_flush")
+def count_flushed_deletes(session: Session, flush_context):
+    # После flush списки сессии еще содержат удаленные объекты; счетчик меняется в той же транзакции
+    tables = {obj.__table__.name for obj in session.deleted if hasattr(obj, "updated_at")}
+    if tables:
+        count_deletes(session.connection(), tables)
+
+@event.listens_for(Session, "do_orm_execute")
+def count_bulk_deletes(orm_execute_state):
+    # db.execute(delete(Model).where(...)) идет мимо flush
+    table = orm_execute_state.statement.table if orm_execute_state.is_delete else None
+    if table is not None and "updated_at" in table.c:
+        count_deletes(orm_execute_state.session.connection(), {table.name})
+
+def versions_select(models):
+    columns = []
+    for model in models:
+        if hasattr(model, "updated_at"):
+            columns.append(select(func.max(model.updated_at)).scalar_subquery())
+            columns.append(
+                select(TableVersion.deletes).where(TableVersion.name == model.__tablename__).scalar_subquery()
+            )
+        else:
+            columns.append(select(func.max(model.id)).scalar_subquery())
+    return select(*columns)
+
+def versions_etag(request: Request, user_id: int, versions) -> str:
+    # Путь, параметры и пользователь входят в ключ: версии таблиц у разных выборок одинаковые
+    key = f"{request.url.path}?{request.url.query}|{user_id}|{tuple(versions)}"
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+def check_not_modified(request: Request, response: Response, etag: str):
+    if etag_matches(request, etag):
+        raise HTTPException(status_code=304, headers=validator_headers(etag))
+    response.headers.update(validator_headers(etag))
+
+def conditional_get(*models):
+    # Зависимость для GET-маршрута: dependencies=[Depends(conditional_get(Student, Class))]
+    def dependency(
+        request: Request,
+        response: Response,
+        current_user: CurrentUser = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        try:
+            versions = db.execute(versions_select(models)).one()
+        finally:
+            # Соединение возвращается в пул до обработчика: иначе запрос держит его, пока ждет
+            # свободный поток, а потоки пула ждут соединений - при нагрузке выше размера пула это взаимная блокировка
+            db.rollback()
+        check_not_modified(request, response, versions_etag(request, current_user.id, versions))
+    return dependency
+
+def conditional_get_async(*models):
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: CurrentUser = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        versions = (await db.execute(versions_select(models))).one()
+        check_not_modified(request, response, versions_etag(request, current_user.id, versions))
+    return dependency
@@ -0,0 +1,399 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, insert, or_, select, true
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import history
+import rollups
+from changes import change_rows, record_change, record_changes
+from models import JournalEntry, AttendanceMark, Grade, Student, Class, Schedule, Subject
+from schemas import JournalEntryCreate
+
+
+# Общие запросы для списков. Связанные объекты подгружаются сразу (joinedload/selectinload),
+# поэтому число SQL-запросов не зависит от количества строк в ответе.
+# Функции *_select строят запрос и используются как синхронной, так и асинхронной сессией.
+
+def entries_select():
+    return select(JournalEntry).options(
+        joinedload(JournalEntry.subject),
+        joinedload(JournalEntry.class_),
+        selectinload(JournalEntry.attendance_marks),
+        selectinload(JournalEntry.grade_marks)
+    )
+
+def entry_select(entry_id: int):
+    return entries_select().where(JournalEntry.id == entry_id, JournalEntry.deleted_at.is_(None))
+
+def entry_filters(
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> list:
+    # Фильтры превращаются в SQL-условия и попадают в индекс (class_id, subject_id, date).
+    # Удаленные записи остаются в таблице ради истории и в выборки не попадают
+    conditions = [JournalEntry.deleted_at.is_(None)]
+    if class_id is not None:
+        conditions.append(JournalEntry.class_id == class_id)
+    if subject_id is not None:
+        conditions.append(JournalEntry.subject_id == subject_id)
+    if date_from is not None:
+        conditions.append(JournalEntry.date >= date_from)
+    if date_to is not None:
+        conditions.append(JournalEntry.date <= date_to)
+    return conditions
+
+def entries_page_select(
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+    base=None
+):
+    stmt = (entries_select() if base is None else base).where(*entry_filters(class_id, subject_id, date_from, date_to))
+
+    # Keyset-пагинация по (date, id): продолжаем строго после последней записи предыдущей страницы
+    if after is not None:
+        last_date, last_id = after
+        stmt = stmt.where(or_(
+            JournalEntry.date > last_date,
+            and_(JournalEntry.date == last_date, JournalEntry.id > last_id)
+        ))
+
+    stmt = stmt.order_by(JournalEntry.date, JournalEntry.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def classes_select():
+    return select(Class)
+
+def classes_with_students_select():
+    # selectinload: один запрос за классами и один за всеми их учениками
+    return select(Class).options(selectinload(Class.students)).order_by(Class.id)
+
+def subjects_select(teacher_id: int):
+    return select(Subject).where(Subject.teacher_id == teacher_id, Subject.deleted_at.is_(None))
+
+def active_subject_ids(db: Session, subject_ids) -> set:
+    # Удаленный предмет нельзя указать в новой записи
+    if not subject_ids:
+        return set()
+    return set(db.scalars(select(Subject.id).where(Subject.id.in_(subject_ids), Subject.deleted_at.is_(None))))
+
+def schedules_select(teacher_id: int, class_id: Optional[int] = None):
+    stmt = select(Schedule).options(
+        joinedload(Schedule.subject),
+        joinedload(Schedule.class_)
+    ).where(Schedule.teacher_id == teacher_id)
+    if class_id is not None:
+        stmt = stmt.where(Schedule.class_id == class_id)
+    return stmt
+
+def class_schedules_select(class_id: int):
+    # Все уроки класса, независимо от учителя
+    return select(Schedule).options(
+        joinedload(Schedule.subject),
+        joinedload(Schedule.class_)
+    ).where(Schedule.class_id == class_id)
+
+def schedule_select(schedule_id: int, teacher_id: int):
+    return schedules_select(teacher_id).where(Schedule.id == schedule_id)
+
+
+def gradebook_select(
+    class_id: int,
+    subject_id: int,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
+    # Плотная сетка ученик x урок одним запросом: ученики класса, соединенные со всеми уроками,
+    # плюс оценка и посещаемость на пересечении. Порядок строк совпадает с порядком ячеек матрицы.
+    lessons = (
+        select(JournalEntry.id, JournalEntry.date)
+        .where(*entry_filters(class_id, subject_id, date_from, date_to))
+        .subquery()
+    )
+    return (
+        select(
+            Student.id, Student.last_name, Student.first_name,
+            lessons.c.id, lessons.c.date,
+            Grade.value, AttendanceMark.status
+        )
+        .select_from(Student)
+        .outerjoin(lessons, true())
+        .outerjoin(Grade, and_(Grade.entry_id == lessons.c.id, Grade.student_id == Student.id))
+        .outerjoin(AttendanceMark, and_(AttendanceMark.entry_id == lessons.c.id, AttendanceMark.student_id == Student.id))
+        .where(Student.class_id == class_id)
+        .order_by(Student.last_name, Student.first_name, Student.id, lessons.c.date, lessons.c.id)
+    )
+
+def get_entry(db: Session, entry_id: int) -> Optional[JournalEntry]:
+    return db.scalars(entry_select(entry_id)).first()
+
+# Те же выборки кортежами столбцов, без ORM-объектов: для быстрых ответов (serialization.py)
+
+def entry_rows_select():
+    return (
+        select(
+            JournalEntry.id, JournalEntry.subject_id, JournalEntry.class_id, JournalEntry.date,
+            JournalEntry.topic, JournalEntry.homework, Subject.name.label("subject_name"), Class.name.label("class_name"),
+            JournalEntry.version
+        )
+        .outerjoin(Subject, JournalEntry.subject_id == Subject.id)
+        .outerjoin(Class, JournalEntry.class_id == Class.id)
+    )
+
+def attendance_rows_select(entry_ids: List[int]):
+    return select(AttendanceMark.entry_id, AttendanceMark.student_id, AttendanceMark.status).where(
+        AttendanceMark.entry_id.in_(entry_ids)
+    )
+
+def grade_rows_select(entry_ids: List[int]):
+    return select(Grade.entry_id, Grade.student_id, Grade.value, Grade.comment, Grade.kind).where(
+        Grade.entry_id.in_(entry_ids)
+    )
+
+def student_rows_select():
+    return (
+        select(Student.id, Student.first_name, Student.last_name, Student.email, Student.class_id,
+               Class.name.label("class_name"))
+        .outerjoin(Class, Student.class_id == Class.id)
+    )
+
+def schedule_rows_select(teacher_id: int, class_id: Optional[int] = None):
+    stmt = (
+        select(
+            Schedule.id, Schedule.class_id, Schedule.subject_id, Schedule.day_of_week,
+            Schedule.lesson_number, Class.name.label("class_name"), Subject.name.label("subject_name")
+        )
+        .outerjoin(Class, Schedule.class_id == Class.id)
+        .outerjoin(Subject, Schedule.subject_id == Subject.id)
+        .where(Schedule.teacher_id == teacher_id)
+    )
+    if class_id is not None:
+        stmt = stmt.where(Schedule.class_id == class_id)
+    return stmt
+
+
+def list_entry_rows(db: Session, **filters):
+    # Записи и их отметки тремя запросами: (записи, посещаемость, оценки)
+    rows = db.execute(entries_page_select(base=entry_rows_select(), **filters)).all()
+    return rows, *entry_marks_rows(db, [row.id for row in rows])
+
+def entry_marks_rows(db: Session, entry_ids: List[int]):
+    if not entry_ids:
+        return [], []
+    return db.execute(attendance_rows_select(entry_ids)).all(), db.execute(grade_rows_select(entry_ids)).all()
+
+def list_classes_with_students(db: Session):
+    return db.scalars(classes_with_students_select()).all()
+
+def list_schedules(db: Session, teacher_id: int, class_id: Optional[int] = None):
+    return db.scalars(schedules_select(teacher_id, class_id)).all()
+
+def list_class_schedules(db: Session, class_id: int):
+    return db.scalars(class_schedules_select(class_id)).all()
+
+def get_schedule(db: Session, schedule_id: int, teacher_id: int) -> Optional[Schedule]:
+    return db.scalars(schedule_select(schedule_id, teacher_id)).first()
+
+
+# Посещаемость и оценки хранятся строками в attendance_marks/grades,
+# а в API по-прежнему выглядят как словари student_id -> значение.
+
+DEFAULT_GRADE_KIND = "lesson"
+
+def _grade_fields(info: Any) -> Dict[str, Any]:
+    if isinstance(info, dict):
+        value = info.get("grade")
+        return {
+            "value": None if value is None else str(value),
+            "comment": info.get("comment"),
+            "kind": info.get("kind") or DEFAULT_GRADE_KIND
+        }
+    return {"value": None if info is None else str(info), "comment": None, "kind": DEFAULT_GRADE_KIND}
+
+def set_entry_marks(entry: JournalEntry, attendance: Dict[int, str], grades: Dict[int, Any]):
+    # Обновляем существующие строки на месте, чтобы не нарушать уникальность (entry_id, student_id)
+    marks = {mark.student_id: mark for mark in entry.attendance_marks}
+    for student_id, status in attendance.items():
+        if student_id in marks:
+            marks.pop(student_id).status = status
+        else:
+            entry.attendance_marks.append(AttendanceMark(student_id=student_id, status=status))
+    for mark in marks.values():
+        entry.attendance_marks.remove(mark)
+
+    existing = {grade.student_id: grade for grade in entry.grade_marks}
+    for student_id, info in grades.items():
+        fields = _grade_fields(info)
+        if student_id in existing:
+            grade = existing.pop(student_id)
+            grade.value, grade.comment, grade.kind = fields["value"], fields["comment"], fields["kind"]
+        else:
+            entry.grade_marks.append(Grade(student_id=student_id, **fields))
+    for grade in existing.values():
+        entry.grade_marks.remove(grade)
+
+def entry_attendance(entry: JournalEntry) -> Dict[str, str]:
+    return {str(mark.student_id): mark.status for mark in entry.attendance_marks}
+
+def grade_info(value: Optional[str], comment: Optional[str], kind: str) -> Dict[str, Any]:
+    info = {"grade": value}
+    if comment is not None:
+        info["comment"] = comment
+    if kind != DEFAULT_GRADE_KIND:
+        info["kind"] = kind
+    return info
+
+def entry_grades(entry: JournalEntry) -> Dict[str, Any]:
+    return {str(grade.student_id): grade_info(grade.value, grade.comment, grade.kind) for grade in entry.grade_marks}
+
+
+# Изменение одной записи вместе с агрегатами отчетов и историей. Коммит делает вызывающий код,
+# поэтому несколько изменений (например, пакет синхронизации) идут одной транзакцией.
+
+def entry_state(entry: JournalEntry) -> dict:
+    return history.state(
+        entry.subject_id, entry.class_id, entry.date, entry.topic, entry.homework,
+        entry_attendance(entry), entry_grades(entry), deleted=entry.deleted_at is not None
+    )
+
+def record_entry_history(db: Session, entry: JournalEntry, action: str, before: Optional[dict], user_id: Optional[int]):
+    changes = history.diff(before, entry_state(entry))
+    history.record_history(db, [history.history_row(entry.id, entry.version, action, changes, user_id, entry.updated_at)])
+
+def create_entry(db: Session, data: JournalEntryCreate, user_id: Optional[int] = None) -> JournalEntry:
+    entry = JournalEntry(
+        subject_id=data.subject_id,
+        class_id=data.class_id,
+        date=data.date,
+        topic=data.topic,
+        homework=data.homework
+    )
+    set_entry_marks(entry, data.attendance, data.grades)
+    db.add(entry)
+    rollups.record_entry_change(db, None, rollups.entry_snapshot(entry))
+    db.flush()
+    record_change(db, "entry", entry.id, "create", entry.class_id, version=entry.version)
+    record_entry_history(db, entry, "create", None, user_id)
+    return entry
+
+def update_entry(db: Session, entry: JournalEntry, data: JournalEntryCreate, user_id: Optional[int] = None) -> JournalEntry:
+    before = rollups.entry_snapshot(entry)
+    previous_state = entry_state(entry)
+    previous_class_id = entry.class_id
+    entry.subject_id = data.subject_id
+    entry.class_id = data.class_id
+    entry.date = data.date
+    entry.topic = data.topic
+    entry.homework = data.homework
+    # Отметки меняются в дочерних таблицах, поэтому время изменения ставим явно:
+    # так меняется и сама запись, и ее version
+    entry.updated_at = datetime.utcnow()
+    set_entry_marks(entry, data.attendance, data.grades)
+    rollups.record_entry_change(db, before, rollups.entry_snapshot(entry))
+    db.flush()
+    record_change(
+        db, "entry", entry.id, "update", entry.class_id, version=entry.version, previous_class_id=previous_class_id
+    )
+    record_entry_history(db, entry, "update", previous_state, user_id)
+    return entry
+
+def delete_entry(db: Session, entry: JournalEntry, user_id: Optional[int] = None):
+    # Мягкое удаление: отметки и сама запись остаются, история по-прежнему восстанавливает прошлые состояния
+    rollups.record_entry_change(db, rollups.entry_snapshot(entry), None)
+    previous_state = entry_state(entry)
+    entry.deleted_at = entry.updated_at = datetime.utcnow()
+    db.flush()
+    record_change(db, "entry", entry.id, "delete", entry.class_id)
+    record_entry_history(db, entry, "delete", previous_state, user_id)
+
+
+# Массовый импорт: проверка ссылок одним запросом на множество id,
+# вставка пачками по chunk_size строк, каждая пачка в своей транзакции.
+
+def bulk_create_entries(
+    db: Session,
+    items: List[Tuple[int, JournalEntryCreate]],
+    chunk_size: int,
+    user_id: Optional[int] = None
+) -> Tuple[Dict[int, int], Dict[int, str]]:
+    subject_ids = {item.subject_id for _, item in items}
+    class_ids = {item.class_id for _, item in items}
+    existing_subjects = active_subject_ids(db, subject_ids)
+    existing_classes = set(db.scalars(select(Class.id).where(Class.id.in_(class_ids)))) if class_ids else set()
+
+    created = {}
+    errors = {}
+    valid = []
+    for row, item in items:
+        if item.subject_id not in existing_subjects:
+            errors[row] = "Subject not found"
+        elif item.class_id not in existing_classes:
+            errors[row] = "Class not found"
+        else:
+            valid.append((row, item))
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            entry_ids = db.scalars(
+                insert(JournalEntry).returning(JournalEntry.id, sort_by_parameter_order=True),
+                [{
+                    "subject_id": item.subject_id,
+                    "class_id": item.class_id,
+                    "date": item.date,
+                    "topic": item.topic,
+                    "homework": item.homework
+                } for _, item in chunk]
+            ).all()
+
+            attendance_rows = []
+            grade_rows = []
+            for entry_id, (_, item) in zip(entry_ids, chunk):
+                for student_id, status in item.attendance.items():
+                    attendance_rows.append({"entry_id": entry_id, "student_id": student_id, "status": status})
+                for student_id, info in item.grades.items():
+                    grade_rows.append({"entry_id": entry_id, "student_id": student_id, **_grade_fields(info)})
+            if attendance_rows:
+                db.execute(insert(AttendanceMark), attendance_rows)
+            if grade_rows:
+                db.execute(insert(Grade), grade_rows)
+            rollups.record_entries_added(db, (
+                rollups.snapshot(
+                    item.class_id,
+                    item.subject_id,
+                    item.date,
+                    item.attendance,
+                    {student_id: _grade_fields(info)["value"] for student_id, info in item.grades.items()}
+                ) for _, item in chunk
+            ))
+            record_changes(db, [
+                row for entry_id, (_, item) in zip(entry_ids, chunk)
+                for row in change_rows("entry", entry_id, "create", item.class_id, version=1)
+            ])
+            now = datetime.utcnow()
+            history.record_history(db, [
+                history.history_row(entry_id, 1, "create", history.state(
+                    item.subject_id, item.class_id, item.date, item.topic, item.homework,
+                    {str(student_id): status for student_id, status in item.attendance.items()},
+                    {str(student_id): grade_info(**_grade_fields(info)) for student_id, info in item.grades.items()}
+                ), user_id, now)
+                for entry_id, (_, item) in zip(entry_ids, chunk)
+            ])
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            for row, _ in chunk:
+                errors[row] = f"Database error: {getattr(e, 'orig', None) or e}"
+        else:
+            created.update((row, entry_id) for (row, _), entry_id in zip(chunk, entry_ids))
+
+    return created, errors
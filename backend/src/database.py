@@ -1,19 +1,267 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import itertools
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from settings import (
+    DATABASE_URL, ASYNC_DB,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KIB,
+    TENANCY, TENANT_DB_DIR, TENANT_SCHEMA_PREFIX, TENANT_ENGINE_CACHE_SIZE,
+    DATABASE_REPLICA_URLS, REPLICA_RETRY_AFTER
+)
+
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL позволяет читать параллельно с записью, busy_timeout убирает "database is locked" при коротких конфликтах
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+    cursor.close()
+
+def engine_options(url: str) -> dict:
+    if is_sqlite_memory(url):
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        # PostgreSQL: проверяем соединение перед выдачей из пула, чтобы не получить оборванное
+        options["pool_pre_ping"] = True
+    return options
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    engine = create_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
+
+
+# Реплики для чтения. Сессия читает с реплики, только если запрос помечен как читающий
+# (read_only_request ставит ReplicaRoutingMiddleware из replicas.py) и сама сессия еще ничего не писала.
+# Реплика выбирается по кругу один раз на сессию, чтобы все чтения запроса видели один снимок.
+
+read_only_request: ContextVar[bool] = ContextVar("read_only_request", default=False)
+
+class ReplicaSet:
+    def __init__(self, urls, retry_after: float = REPLICA_RETRY_AFTER):
+        self.urls = list(urls)
+        self.engines = [create_db_engine(url) for url in self.urls]
+        self.retry_after = retry_after
+        self._down_until = [0.0] * len(self.engines)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for engine_ in self.engines:
+            event.listen(engine_, "handle_error", self._on_error)
+
+    def choose(self):
+        # Следующая по кругу рабочая реплика; если все недоступны - None (читаем с основной базы)
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = next(self._counter) % len(self.engines)
+                if self._down_until[index] <= now:
+                    return self.engines[index]
+        return None
+
+    def mark_down(self, replica):
+        with self._lock:
+            self._down_until[self.engines.index(replica)] = time.monotonic() + self.retry_after
+
+    def _on_error(self, exception_context):
+        # Обрыв соединения или ошибка самой базы (например, пустой файл реплики) выводят реплику
+        # из ротации; текущий запрос получит ошибку, следующие пойдут на другие базы
+        if exception_context.is_disconnect or isinstance(exception_context.sqlalchemy_exception, DBAPIError):
+            self.mark_down(exception_context.engine)
+
+    def check(self):
+        # Периодическая проверка: отвечающая реплика возвращается в ротацию раньше retry_after
+        for index, replica in enumerate(self.engines):
+            try:
+                with replica.connect() as connection:
+                    connection.execute(text("SELECT 1 FROM users LIMIT 1"))
+            except Exception:
+                self.mark_down(replica)
+            else:
+                with self._lock:
+                    self._down_until[index] = 0.0
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"url": replica.url.render_as_string(hide_password=True), "up": down_until <= now}
+                for replica, down_until in zip(self.engines, self._down_until)
+            ]
+
+# Реплики только для основной базы: при TENANCY=1 у каждой школы своя база
+replica_set = ReplicaSet(DATABASE_REPLICA_URLS) if DATABASE_REPLICA_URLS and not TENANCY else None
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'journal.db')}"
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or (clause is not None and getattr(clause, "is_dml", False)):
+            # После первой записи сессия до конца работает с основной базой
+            self.info["primary"] = True
+        if self.info.get("primary") or not read_only_request.get():
+            return engine
+        if "replica" not in self.info:
+            self.info["replica"] = replica_set.choose() or engine
+        return self.info["replica"]
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    class_=RoutingSession if replica_set is not None else Session,
+    autocommit=False, autoflush=False, bind=engine
+)
 Base = declarative_base()
 
+
+# Несколько школ (TENANCY=1). Школа текущего запроса лежит в contextvar (ставит TenantMiddleware
+# из tenants.py), get_db по ней выбирает движок. Для SQLite у каждой школы свой файл и своя
+# блокировка записи, для PostgreSQL - своя схема в общей базе и общий пул соединений.
+
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9_]{1,48}$")
+
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+def tenant_db_path(tenant: str) -> str:
+    return os.path.join(TENANT_DB_DIR, f"{tenant}.db")
+
+def tenant_schema(tenant: str) -> str:
+    return TENANT_SCHEMA_PREFIX + tenant
+
+def tenant_engine(tenant: str, must_exist: bool = True):
+    # Возвращает (движок, свой ли у него пул). Неизвестная школа - LookupError
+    if not TENANT_ID_PATTERN.match(tenant):
+        raise LookupError(tenant)
+    if is_sqlite(SQLALCHEMY_DATABASE_URL):
+        path = tenant_db_path(tenant)
+        if must_exist and not os.path.exists(path):
+            raise LookupError(tenant)
+        return create_db_engine(f"sqlite:///{path}"), True
+    if must_exist and not inspect(engine).has_schema(tenant_schema(tenant)):
+        raise LookupError(tenant)
+    # Таблицы без схемы в моделях попадают в схему школы, пул соединений общий
+    return engine.execution_options(schema_translate_map={None: tenant_schema(tenant)}), False
+
+class TenantEngines:
+    # LRU открытых движков: движок давно не использованной школы закрывается и при следующем
+    # запросе открывается заново, поэтому число файлов и соединений ограничено maxsize
+    def __init__(self, maxsize: int = TENANT_ENGINE_CACHE_SIZE):
+        self.maxsize = maxsize
+        # Вызываются для каждого нового движка со своим пулом (метрики, журнал медленных запросов)
+        self.on_create = []
+        self.opened = 0
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sessionmaker(self, tenant: str) -> sessionmaker:
+        with self._lock:
+            item = self._sessions.get(tenant)
+            if item is not None:
+                self._sessions.move_to_end(tenant)
+                return item[0]
+            tenant_bind, owned = tenant_engine(tenant)
+            if owned:
+                for hook in self.on_create:
+                    hook(tenant_bind)
+            factory = sessionmaker(autocommit=False, autoflush=False, bind=tenant_bind)
+            self._sessions[tenant] = (factory, tenant_bind if owned else None)
+            self.opened += 1
+            while len(self._sessions) > self.maxsize:
+                _, (_, evicted_engine) = self._sessions.popitem(last=False)
+                self.evicted += 1
+                # Выданные соединения дорабатывают, закрываются только свободные
+                if evicted_engine is not None:
+                    evicted_engine.dispose()
+            return factory
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._sessions), "opened": self.opened, "evicted": self.evicted}
+
+tenant_engines = TenantEngines()
+
+def current_sessionmaker() -> sessionmaker:
+    tenant = current_tenant.get()
+    if not TENANCY:
+        return SessionLocal
+    if tenant is None:
+        raise HTTPException(status_code=400, detail="School is not specified")
+    try:
+        return tenant_engines.sessionmaker(tenant)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="School not found")
+
 def get_db():
-    db = SessionLocal()
+    db = current_sessionmaker()()
     try:
         yield db
     finally:
         db.close()
 
+
+# Асинхронный режим (ASYNC_DB=1): чтение идет через AsyncEngine и не занимает поток пула на время запроса.
+# Драйверы: aiosqlite локально, asyncpg для PostgreSQL.
+def to_async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+def create_async_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    options = engine_options(url)
+    options.pop("connect_args", None)
+    async_engine = create_async_engine(to_async_url(url), **options)
+    if is_sqlite(url):
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB and TENANCY:
+    # Асинхронные роутеры читают через один общий AsyncEngine и о школах не знают
+    raise RuntimeError("ASYNC_DB=1 is not supported together with TENANCY=1")
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_db_engine()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
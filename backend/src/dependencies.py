@@ -1,29 +1,106 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from database import get_db
+from dataclasses import dataclass
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from cache import TTLCache
+from database import get_db, get_async_db, current_tenant
 from models import User
+from settings import USER_CACHE_SIZE, USER_CACHE_TTL
 
 SECRET_KEY = "your_secret_key_here_make_it_long_and_secure"
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+
+# Легкий снимок пользователя: его держит кэш вместо ORM-объекта, привязанного к сессии
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    email: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(id=user.id, username=user.username, email=user.email, is_active=user.is_active is not False)
+
+
+# Кэш по школе и sub из токена: повторные запросы с тем же пользователем не ходят в БД
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def user_cache_key(username: str):
+    return current_tenant.get(), username
+
+# Изменение пользователя сбрасывает кэш после коммита: при сбросе во время flush параллельный запрос
+# успел бы снова закэшировать еще не закоммиченное состояние. Откат изменений кэш не трогает
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target):
+    keys = object_session(target).info.setdefault("invalidated_users", set())
+    keys.add(user_cache_key(target.username))
+    # При смене логина сбрасываем и запись под старым именем
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        keys.add(user_cache_key(old_username))
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_users(session: Session):
+    for key in session.info.pop("invalidated_users", ()):
+        user_cache.invalidate(key)
+
+@event.listens_for(Session, "after_rollback")
+def drop_invalidated_users(session: Session):
+    session.info.pop("invalidated_users", None)
+
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_username_from_token(token: str) -> str:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        # Refresh-токен годится только для /auth/refresh
+        if username is None or payload.get("type") == "refresh":
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    return username
+
+# Обычная функция: FastAPI выполняет ее в пуле потоков, и синхронный запрос к БД не блокирует event loop
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+    username = get_username_from_token(token)
     
-    user = db.query(User).filter(User.username == username).first()
+    user = user_cache.get(user_cache_key(username))
+    if user is None:
+        # Поколение до чтения: если пользователя изменят, пока мы читаем, старый снимок в кэш не попадет
+        generation = user_cache.generation
+        # Сессия открывает соединение только здесь, при попадании в кэш БД не используется
+        db_user = db.query(User).filter(User.username == username).first()
+        if db_user is None:
+            raise credentials_exception()
+        user = CurrentUser.from_user(db_user)
+        user_cache.set(user_cache_key(username), user, generation)
+    if not user.is_active:
+        raise credentials_exception()
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db=Depends(get_async_db)) -> CurrentUser:
+    username = get_username_from_token(token)
+
+    user = user_cache.get(user_cache_key(username))
     if user is None:
-        raise credentials_exception
+        generation = user_cache.generation
+        db_user = (await db.scalars(select(User).where(User.username == username))).first()
+        if db_user is None:
+            raise credentials_exception()
+        user = CurrentUser.from_user(db_user)
+        user_cache.set(user_cache_key(username), user, generation)
+    if not user.is_active:
+        raise credentials_exception()
     return user
\ No newline at end of file
@@ -0,0 +1,198 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from crud import entry_filters
+from gradebook import grade_score
+from models import JournalEntry, AttendanceMark, Grade, Student, Class, Subject
+
+
+# Отчеты выгружаются потоково: строки читаются из БД порциями (yield_per)
+# и сразу пишутся в ответ, поэтому память не растет с объемом журнала.
+
+EXPORT_BATCH_SIZE = 1000
+
+REPORT_COLUMNS = {
+    "journal": ["Дата", "Класс", "Предмет", "Тема", "Домашнее задание"],
+    "attendance": ["Дата", "Класс", "Предмет", "Фамилия", "Имя", "Посещаемость"],
+    "grades": ["Дата", "Класс", "Предмет", "Фамилия", "Имя", "Оценка", "Тип", "Комментарий"],
+}
+
+# Столбцы, которые в XLSX пишутся числом, если значение - число: оценки хранятся строками ("5", "4,5", "зачет"),
+# а в Excel по ним должны считаться формулы
+NUMERIC_COLUMNS = {
+    "grades": {REPORT_COLUMNS["grades"].index("Оценка")},
+}
+
+
+def report_select(report: str, filters: dict):
+    base = (
+        JournalEntry.date,
+        Class.name,
+        Subject.name,
+    )
+    if report == "journal":
+        stmt = select(*base, JournalEntry.topic, JournalEntry.homework).select_from(JournalEntry)
+    elif report == "attendance":
+        stmt = (
+            select(*base, Student.last_name, Student.first_name, AttendanceMark.status)
+            .select_from(AttendanceMark)
+            .join(JournalEntry, AttendanceMark.entry_id == JournalEntry.id)
+            .join(Student, AttendanceMark.student_id == Student.id)
+        )
+    elif report == "grades":
+        stmt = (
+            select(*base, Student.last_name, Student.first_name, Grade.value, Grade.kind, Grade.comment)
+            .select_from(Grade)
+            .join(JournalEntry, Grade.entry_id == JournalEntry.id)
+            .join(Student, Grade.student_id == Student.id)
+        )
+    else:
+        raise ValueError(f"Unknown report: {report}")
+
+    return (
+        stmt.outerjoin(Class, JournalEntry.class_id == Class.id)
+        .outerjoin(Subject, JournalEntry.subject_id == Subject.id)
+        .where(*entry_filters(**filters))
+        .order_by(JournalEntry.date, JournalEntry.id)
+    )
+
+def iter_report_rows(db: Session, report: str, filters: dict):
+    yield REPORT_COLUMNS[report]
+    result = db.execute(report_select(report, filters).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        yield list(row)
+
+
+def format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    return str(value)
+
+def stream_csv(rows, flush_every: int = 500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel правильно открыл кириллицу
+    buffer.write("\ufeff")
+    for i, row in enumerate(rows, start=1):
+        writer.writerow([format_cell(value) for value in row])
+        if i % flush_every == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# Минимальный XLSX (один лист, строки inline) пишется прямо в zip-поток без временных файлов
+
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+class _ChunkSink:
+    # Файлоподобный объект без seek: zipfile пишет в него, а генератор забирает накопленные байты
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def xlsx_number(value):
+    # "5" -> 5, "4,5" -> 4.5; нечисловые отметки остаются текстом
+    score = grade_score(value) if isinstance(value, str) else None
+    if score is None:
+        return value
+    return int(score) if score.is_integer() else score
+
+def xlsx_row(row_number: int, row, numeric_columns=()) -> str:
+    cells = []
+    for i, value in enumerate(row):
+        ref = f"{column_letter(i)}{row_number}"
+        if i in numeric_columns:
+            value = xlsx_number(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="n"><v>{value}</v></c>')
+        else:
+            text = escape(_ILLEGAL_XML_CHARS.sub("", format_cell(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+def stream_xlsx(rows, flush_every: int = 500, numeric_columns=()):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.pop()
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row_number, row in enumerate(rows, start=1):
+                sheet.write(xlsx_row(row_number, row, numeric_columns).encode("utf-8"))
+                if row_number % flush_every == 0:
+                    yield sink.pop()
+            sheet.write(b"</sheetData></worksheet>")
+        yield sink.pop()
+    yield sink.pop()
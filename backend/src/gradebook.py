@@ -0,0 +1,62 @@
+from math import fsum, isfinite
+from typing import Optional
+
+
+# Журнал класса по предмету: матрица ученик x урок в колоночном виде.
+# Строки запроса уже упорядочены по ученику и уроку, поэтому ячейки дописываются
+# в конец строк матрицы без словарей и поиска; статистика считается по строкам целиком.
+
+ATTENDED_STATUSES = ("present", "late")
+
+def grade_score(value: Optional[str]) -> Optional[float]:
+    # Нечисловые отметки ("зачет", "н/а") в средний балл не входят
+    if value is None:
+        return None
+    try:
+        score = float(value.replace(",", "."))
+    except ValueError:
+        return None
+    # "nan" и "inf" разбираются float, но в суммы и средние попадать не должны
+    return score if isfinite(score) else None
+
+def row_stats(grades: list, attendance: list) -> tuple:
+    scores = [score for score in map(grade_score, grades) if score is not None]
+    marked = len(attendance) - attendance.count(None)
+    attended = sum(map(attendance.count, ATTENDED_STATUSES))
+    return (
+        round(fsum(scores) / len(scores), 2) if scores else None,
+        len(scores),
+        round(attended / marked, 3) if marked else None
+    )
+
+def build_gradebook(class_id: int, subject_id: int, rows) -> dict:
+    student_ids, student_names = [], []
+    lesson_ids, lesson_dates = [], []
+    grades, attendance = [], []
+
+    for student_id, last_name, first_name, entry_id, date, value, status in rows:
+        if not student_ids or student_ids[-1] != student_id:
+            student_ids.append(student_id)
+            student_names.append(f"{last_name} {first_name}")
+            grades.append([])
+            attendance.append([])
+        if entry_id is None:
+            continue
+        # У всех учеников одинаковый набор уроков, столбцы берем из первой строки
+        if len(student_ids) == 1:
+            lesson_ids.append(entry_id)
+            lesson_dates.append(date)
+        grades[-1].append(value)
+        attendance[-1].append(status)
+
+    averages, counts, attendance_rates = map(list, zip(*map(row_stats, grades, attendance))) if student_ids else ([], [], [])
+
+    return {
+        "class_id": class_id,
+        "subject_id": subject_id,
+        "students": {"id": student_ids, "name": student_names},
+        "lessons": {"id": lesson_ids, "date": lesson_dates},
+        "grades": grades,
+        "attendance": attendance,
+        "stats": {"average": averages, "count": counts, "attendance_rate": attendance_rates}
+    }
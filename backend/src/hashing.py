@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+from settings import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE
+
+
+# bcrypt занимает ядро на сотни миллисекунд, поэтому хеширование и проверка паролей
+# выполняются в отдельном пуле процессов. Пул ограничен: если все воркеры заняты
+# и очередь заполнена, запрос сразу получает 503 вместо ожидания.
+# Обработчики входа и регистрации ждут результат через await (run_in_pool_async): ожидающий запрос
+# не занимает поток из пула Starlette, и волна входов не останавливает остальные синхронные эндпоинты.
+# Синхронный run_in_pool остается для запуска и командной строки (create_test_user).
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(PASSWORD_HASH_WORKERS, 1) + PASSWORD_HASH_QUEUE)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерние процессы не наследуют потоки и блокировки веб-сервера
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def acquire_slot():
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+def submit(func, *args):
+    # Слот освобождается, когда задача в пуле закончилась, а не когда ее перестали ждать:
+    # запрос, отмененный из-за отключения клиента, не останавливает уже запущенный bcrypt
+    acquire_slot()
+    try:
+        future = get_executor().submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+def run_in_pool(func, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return func(*args)
+    return submit(func, *args).result()
+
+async def run_in_pool_async(func, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        # Без пула процессов bcrypt считается в потоке, но не в цикле событий
+        return await run_in_threadpool(func, *args)
+    return await asyncio.wrap_future(submit(func, *args))
+
+
+def get_password_hash(password):
+    return run_in_pool(_hash, password)
+
+def verify_password(plain_password, hashed_password):
+    if not hashed_password:
+        return False
+    return run_in_pool(_verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_in_pool_async(_hash, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    if not hashed_password:
+        return False
+    return await run_in_pool_async(_verify, plain_password, hashed_password)
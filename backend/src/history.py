@@ -0,0 +1,202 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from models import JournalEntryHistory, JournalEntrySnapshot
+from rollups import month_start
+from settings import HISTORY_RETENTION_DAYS, HISTORY_COMPACT_BATCH
+
+
+# История записей журнала: кто, когда и что изменил. Каждое изменение добавляет одну строку
+# в journal_entry_history в той же транзакции. Хранится только разница: изменившиеся поля записи
+# и отметки тех учеников, у которых они изменились (None - отметку убрали). Создание хранит все
+# состояние. Состояние на момент времени собирается из ближайшего снимка и следующих за ним изменений.
+# Изменения старше HISTORY_RETENTION_DAYS сворачиваются в снимки - по одному на запись за месяц.
+
+ENTRY_FIELDS = ("subject_id", "class_id", "date", "topic", "homework", "deleted")
+MARK_FIELDS = ("attendance", "grades")
+
+
+class HistoryCompacted(Exception):
+    # Состояние на этот момент уже свернуто в более поздний снимок
+    pass
+
+
+def state(
+    subject_id: int,
+    class_id: int,
+    date_: Optional[datetime],
+    topic: str,
+    homework: str,
+    attendance: Dict[str, str],
+    grades: Dict[str, Any],
+    deleted: bool = False
+) -> dict:
+    # attendance и grades - в виде API: ключ - id ученика строкой
+    return {
+        "subject_id": subject_id,
+        "class_id": class_id,
+        "date": date_.isoformat() if date_ else None,
+        "topic": topic,
+        "homework": homework,
+        "deleted": deleted,
+        "attendance": attendance,
+        "grades": grades,
+    }
+
+def diff(before: Optional[dict], after: dict) -> dict:
+    if before is None:
+        return after
+    changes = {field: after[field] for field in ENTRY_FIELDS if before[field] != after[field]}
+    for field in MARK_FIELDS:
+        old, new = before[field], after[field]
+        changed = {student: new.get(student) for student in sorted(old.keys() | new.keys()) if old.get(student) != new.get(student)}
+        if changed:
+            changes[field] = changed
+    return changes
+
+def apply_diff(current: Optional[dict], changes: dict) -> dict:
+    if current is None:
+        return {**changes, **{field: dict(changes.get(field, {})) for field in MARK_FIELDS}}
+    result = {**current, **{field: changes[field] for field in ENTRY_FIELDS if field in changes}}
+    for field in MARK_FIELDS:
+        marks = dict(current[field])
+        for student, value in changes.get(field, {}).items():
+            if value is None:
+                marks.pop(student, None)
+            else:
+                marks[student] = value
+        result[field] = marks
+    return result
+
+
+def history_row(entry_id: int, version: int, action: str, changes: dict, user_id: Optional[int], at: datetime) -> dict:
+    return {
+        "entry_id": entry_id,
+        "version": version,
+        "action": action,
+        "changed_by": user_id,
+        "changed_at": at,
+        "diff": json.dumps(changes, ensure_ascii=False, separators=(",", ":")),
+    }
+
+def record_history(db: Session, rows: List[dict]):
+    # Один INSERT на изменение (или на пачку массового импорта) - в транзакции самого изменения
+    if rows:
+        db.execute(insert(JournalEntryHistory), rows)
+
+
+def entry_history(db: Session, entry_id: int) -> List[dict]:
+    # Снимки свернутых периодов и изменения после них, по порядку версий
+    snapshots = db.scalars(
+        select(JournalEntrySnapshot).where(JournalEntrySnapshot.entry_id == entry_id).order_by(JournalEntrySnapshot.version)
+    ).all()
+    records = db.scalars(
+        select(JournalEntryHistory).where(JournalEntryHistory.entry_id == entry_id).order_by(JournalEntryHistory.version)
+    ).all()
+    return [
+        {"version": s.version, "action": "snapshot", "changed_by": None, "changed_at": s.taken_at, "changes": json.loads(s.state)}
+        for s in snapshots
+    ] + [
+        {"version": r.version, "action": r.action, "changed_by": r.changed_by, "changed_at": r.changed_at, "changes": json.loads(r.diff)}
+        for r in records
+    ]
+
+def state_as_of(db: Session, entry_id: int, as_of: datetime) -> Optional[dict]:
+    # None - записи в этот момент не было (еще не создана или уже удалена)
+    snapshot = db.scalars(
+        select(JournalEntrySnapshot)
+        .where(JournalEntrySnapshot.entry_id == entry_id, JournalEntrySnapshot.taken_at <= as_of)
+        .order_by(JournalEntrySnapshot.taken_at.desc(), JournalEntrySnapshot.version.desc())
+        .limit(1)
+    ).first()
+    current = json.loads(snapshot.state) if snapshot else None
+    version = snapshot.version if snapshot else 0
+    records = db.scalars(
+        select(JournalEntryHistory)
+        .where(
+            JournalEntryHistory.entry_id == entry_id,
+            JournalEntryHistory.version > version,
+            JournalEntryHistory.changed_at <= as_of
+        )
+        .order_by(JournalEntryHistory.version)
+    ).all()
+    if current is None and (not records or records[0].action != "create"):
+        later_snapshot = db.scalar(select(JournalEntrySnapshot.id).where(JournalEntrySnapshot.entry_id == entry_id).limit(1))
+        if later_snapshot is not None:
+            raise HistoryCompacted()
+        return None
+    for record in records:
+        current = apply_diff(current, json.loads(record.diff))
+        version = record.version
+    if current["deleted"]:
+        return None
+    return {**current, "version": version}
+
+
+def compact_history(db: Session, now: Optional[datetime] = None) -> int:
+    # Фоновая задача: изменения старше HISTORY_RETENTION_DAYS сворачиваются в снимки по месяцам.
+    # Запись обрабатывается целиком в своей транзакции; возвращает число свернутых строк
+    cutoff = (now or datetime.utcnow()) - timedelta(days=HISTORY_RETENTION_DAYS)
+    folded = 0
+    while True:
+        entry_ids = db.scalars(
+            select(JournalEntryHistory.entry_id)
+            .where(JournalEntryHistory.changed_at < cutoff)
+            .distinct()
+            .limit(HISTORY_COMPACT_BATCH)
+        ).all()
+        if not entry_ids:
+            return folded
+        for entry_id in entry_ids:
+            folded += compact_entry(db, entry_id, cutoff)
+            db.commit()
+
+def compact_entry(db: Session, entry_id: int, cutoff: datetime) -> int:
+    snapshot = db.scalars(
+        select(JournalEntrySnapshot)
+        .where(JournalEntrySnapshot.entry_id == entry_id)
+        .order_by(JournalEntrySnapshot.version.desc())
+        .limit(1)
+    ).first()
+    current = json.loads(snapshot.state) if snapshot else None
+    records = db.scalars(
+        select(JournalEntryHistory)
+        .where(JournalEntryHistory.entry_id == entry_id, JournalEntryHistory.changed_at < cutoff)
+        .order_by(JournalEntryHistory.version)
+    ).all()
+
+    snapshots = []
+    for index, record in enumerate(records):
+        current = apply_diff(current, json.loads(record.diff))
+        last_in_month = (
+            index == len(records) - 1
+            or month_start(records[index + 1].changed_at) != month_start(record.changed_at)
+        )
+        if last_in_month:
+            snapshots.append({
+                "entry_id": entry_id,
+                "version": record.version,
+                "taken_at": record.changed_at,
+                "state": json.dumps(current, ensure_ascii=False, separators=(",", ":")),
+            })
+    if snapshots:
+        db.execute(insert(JournalEntrySnapshot), snapshots)
+    db.execute(delete(JournalEntryHistory).where(JournalEntryHistory.id.in_([record.id for record in records])))
+    return len(records)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if sys.argv[1:] != ["compact"]:
+        sys.exit("Использование: python history.py compact")
+    db = SessionLocal()
+    try:
+        print(f"Свернуто изменений: {compact_history(db)}")
+    finally:
+        db.close()
@@ -1,17 +1,44 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from models import User, Base
 
 from services import get_password_hash
-from database import SessionLocal, engine
-from auth import router as auth_router
+from hashing import shutdown_executor
+import database
+from database import SessionLocal, engine, tenant_engines, replica_set
+from settings import (
+    ASYNC_DB, ALERTS_ENABLED, ALERT_INTERVAL, OUTBOX_INTERVAL, HEALTH_DB_TIMEOUT, PROFILING_ENABLED, TENANCY,
+    REPLICA_CHECK_INTERVAL, SYNC_PURGE_INTERVAL, CHANGE_LOG_PURGE_INTERVAL, HISTORY_COMPACT_INTERVAL
+)
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
+from profiling import ProfilingMiddleware, install_profiling, install_slow_query_log
+from scheduler import scheduler
+from tenants import TenantMiddleware
+from replicas import ReplicaRoutingMiddleware, check_replicas
+from alerts import run_alert_job
+from notifications import drain_outbox
+from sync import purge_sync_state
+from changes import broker, purge_change_log
+from history import compact_history
+from auth import router as auth_router, load_revoked_families
+from dependencies import user_cache
 
 from routes.entries import router as entries_router
 from routes.classes import router as classes_router, classes_with_students_router
 from routes.students import router as students_router
 from routes.subjects import router as subjects_router
 from routes.shedules import router as schedules_router
+from routes.export import router as export_router
+from routes.reports import router as reports_router
+from routes.search import router as search_router
+from routes.sync import router as sync_router
+from routes.changes import router as changes_router
 
 app = FastAPI()
 
@@ -22,17 +49,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile-File"],
 )
+# Метрики запросов (/metrics): время ответа, запросы в обработке, число и время SQL-запросов
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+install_slow_query_log(engine)
+if database.async_engine is not None:
+    instrument_engine(database.async_engine.sync_engine)
+    install_slow_query_log(database.async_engine.sync_engine)
+# Школа запроса (TENANCY=1): движки школ открываются по требованию и получают те же обработчики
+app.add_middleware(TenantMiddleware)
+tenant_engines.on_create += [instrument_engine, install_slow_query_log]
+# Чтение GET-запросов с реплик (DATABASE_REPLICA_URLS)
+if replica_set is not None:
+    app.add_middleware(ReplicaRoutingMiddleware)
+    for replica in replica_set.engines:
+        instrument_engine(replica)
+        install_slow_query_log(replica)
+# Профилирование по X-Profile / ?profile= включается только явно (PROFILING_ENABLED=1, например на стенде)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 
 # Подключаем роутеры
-app.include_router(auth_router)
-app.include_router(entries_router)
-app.include_router(classes_router)
-app.include_router(students_router)
-app.include_router(subjects_router)
-app.include_router(schedules_router)
-app.include_router(classes_with_students_router)
+routers = [
+    auth_router,
+    entries_router,
+    classes_router,
+    students_router,
+    subjects_router,
+    schedules_router,
+    classes_with_students_router,
+    export_router,
+    reports_router,
+    search_router,
+    sync_router,
+    changes_router,
+]
+if ASYNC_DB:
+    # Асинхронные GET-обработчики регистрируются первыми и перекрывают синхронные с тем же путем,
+    # запись по-прежнему идет через синхронные роутеры
+    from routes.async_routes import routers as async_routers
+    routers = async_routers + routers
+
+for router in routers:
+    if PROFILING_ENABLED:
+        install_profiling(router)
+    app.include_router(router)
 
 
 # Функция для создания таблиц
@@ -74,12 +138,31 @@ def startup_event():
     db = SessionLocal()
     try:
         create_test_user(db)
+        load_revoked_families(db)
     except Exception as e:
         print(f"Ошибка при старте: {e}")
     finally:
         db.close()
 
+    # Уведомления считаются и отправляются в фоне, запросы их не ждут
+    if ALERTS_ENABLED:
+        scheduler.add_job(run_alert_job, ALERT_INTERVAL)
+        scheduler.add_job(drain_outbox, OUTBOX_INTERVAL)
+        scheduler.add_job(purge_sync_state, SYNC_PURGE_INTERVAL)
+        scheduler.add_job(purge_change_log, CHANGE_LOG_PURGE_INTERVAL)
+        scheduler.add_job(compact_history, HISTORY_COMPACT_INTERVAL)
+    if replica_set is not None:
+        scheduler.add_job(check_replicas, REPLICA_CHECK_INTERVAL)
+    if scheduler.jobs:
+        scheduler.start()
+
+
+
 
+@app.on_event("shutdown")
+def shutdown_event():
+    scheduler.stop()
+    shutdown_executor()
 
 
 # Упрощенная функция для создания тестового пользователя
@@ -130,9 +213,49 @@ def create_test_user(db: Session):
 def read_root():
     return {"message": "Веб-журнал преподавателей"}
 
+def pool_stats() -> dict:
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+def probe_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "database": "connected"}
+async def health_check():
+    # Проверка в потоке пула с ограничением по времени: зависшая БД не держит запрос дольше таймаута
+    started = asyncio.get_running_loop().time()
+    try:
+        await asyncio.wait_for(run_in_threadpool(probe_database), timeout=HEALTH_DB_TIMEOUT)
+        database_status = "connected"
+    except asyncio.TimeoutError:
+        database_status = "timeout"
+    except Exception as e:
+        database_status = f"error: {e.__class__.__name__}"
+    elapsed_ms = round((asyncio.get_running_loop().time() - started) * 1000, 2)
+
+    healthy = database_status == "connected"
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "database": database_status,
+            "database_latency_ms": elapsed_ms,
+            "pool": pool_stats(),
+            "user_cache": user_cache.stats(),
+            "change_feed": broker.stats(),
+            **({"tenants": tenant_engines.stats()} if TENANCY else {}),
+            **({"replicas": replica_set.stats()} if replica_set is not None else {})
+        }
+    )
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
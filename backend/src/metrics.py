@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+
+# Метрики в формате Prometheus без внешних зависимостей: время ответа по маршрутам,
+# запросы в обработке и число/время SQL-запросов на один HTTP-запрос.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name: str, help_: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_, labels
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self, kind: str = "counter") -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind}"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self, kind: str = "gauge") -> list:
+        return super().render(kind)
+
+class Histogram:
+    def __init__(self, name: str, help_: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_, labels, buckets
+        # По каждому набору меток: счетчики корзин (последняя - +Inf), сумма
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = format_labels(self.labels + ("le",), label_values + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total:g}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being processed", ("method",))
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed", ("route",))
+DB_TIME = Counter("db_statement_seconds_total", "Time spent in SQL statements", ("route",))
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements per HTTP request", ("route",), STATEMENT_BUCKETS
+)
+
+ALL_METRICS = [REQUESTS, REQUEST_LATENCY, IN_PROGRESS, DB_STATEMENTS, DB_TIME, DB_STATEMENTS_PER_REQUEST]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in ALL_METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# SQL-запросы относятся к HTTP-запросу через contextvar: контекст копируется и в поток пула,
+# где выполняются синхронные обработчики, поэтому изменения видны middleware
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "scope")
+
+    def __init__(self, scope=None):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.scope = scope
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += time.perf_counter() - started
+
+def handle_error(exception_context):
+    # Упавший запрос не доходит до after_cursor_execute, снимаем его отметку времени здесь
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def route_name(scope) -> str:
+    # Шаблон пути (/entries/{entry_id}), а не сам путь - иначе число рядов метрик не ограничено
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    # ASGI-middleware: время считается до отправки последнего байта, включая потоковые ответы
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestStats(scope)
+        token = current_request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_PROGRESS.dec(method)
+            current_request_stats.reset(token)
+            route = route_name(scope)
+            REQUESTS.inc(method, route, status_code)
+            REQUEST_LATENCY.observe(elapsed, method, route)
+            DB_STATEMENTS.inc(route, amount=stats.statements)
+            DB_TIME.inc(route, amount=stats.db_seconds)
+            DB_STATEMENTS_PER_REQUEST.observe(stats.statements, route)
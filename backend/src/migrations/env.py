@@ -4,6 +4,7 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
+import os
 from models import Base  # Замените на путь к вашим моделям
 target_metadata = Base.metadata
 
@@ -11,6 +12,15 @@ target_metadata = Base.metadata
 # access to the values within the .ini file in use.
 config = context.config
 
+# DATABASE_URL из окружения имеет приоритет над alembic.ini (та же переменная, что читает settings.py)
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
+# Школы (TENANCY=1) мигрируются отдельно: alembic -x tenant=<школа> upgrade head или -x tenant=all.
+# create_tenant передает школу через config.attributes. SQLite - файл школы, PostgreSQL - схема школы
+# в той же базе (search_path и своя таблица alembic_version)
+TENANT = config.attributes.get("tenant") or context.get_x_argument(as_dictionary=True).get("tenant")
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -23,6 +33,21 @@ if config.config_file_name is not None:
 # ... etc.
 
 
+def migration_targets():
+    # (url, схема): основная база или базы школ
+    url = config.get_main_option("sqlalchemy.url")
+    if not TENANT:
+        return [(url, None)]
+
+    from database import is_sqlite, tenant_db_path, tenant_schema
+    from tenants import list_tenants
+
+    tenants = list_tenants() if TENANT == "all" else [TENANT]
+    if is_sqlite(url):
+        return [(f"sqlite:///{tenant_db_path(tenant)}", None) for tenant in tenants]
+    return [(url, tenant_schema(tenant)) for tenant in tenants]
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -35,16 +60,19 @@ def run_migrations_offline() -> None:
     script output.
 
     """
-    url = config.get_main_option("sqlalchemy.url")
-    context.configure(
-        url=url,
-        target_metadata=target_metadata,
-        literal_binds=True,
-        dialect_opts={"paramstyle": "named"},
-    )
+    for url, schema in migration_targets():
+        context.configure(
+            url=url,
+            target_metadata=target_metadata,
+            literal_binds=True,
+            dialect_opts={"paramstyle": "named"},
+            version_table_schema=schema,
+        )
 
-    with context.begin_transaction():
-        context.run_migrations()
+        with context.begin_transaction():
+            if schema:
+                context.execute(f'SET search_path TO "{schema}"')
+            context.run_migrations()
 
 
 def run_migrations_online() -> None:
@@ -54,19 +82,24 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
+    for url, schema in migration_targets():
+        # search_path задается при подключении: SQLAlchemy запоминает схему по умолчанию
+        # на первом соединении, и по ней inspect в миграциях ищет таблицы
+        connectable = engine_from_config(
+            {**config.get_section(config.config_ini_section, {}), "sqlalchemy.url": url},
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
+            **({"connect_args": {"options": f"-csearch_path={schema}"}} if schema else {}),
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata, version_table_schema=schema
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+        connectable.dispose()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,98 @@
+"""Add composite index on journal_entries(class_id, subject_id, date)
+
+Revision ID: 4c9e2f7a1d30
+Revises: b31670aa0ef8
+Create Date: 2026-10-17 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c9e2f7a1d30'
+down_revision: Union[str, Sequence[str], None] = 'b31670aa0ef8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def create_missing_tables(inspector) -> None:
+    # Таблицы, которые создавались через create_all и не попали в начальную миграцию: без них
+    # upgrade head на пустой базе не доходит до конца. На существующих базах они уже есть
+    if 'is_active' not in {c['name'] for c in inspector.get_columns('users')}:
+        op.add_column('users', sa.Column('is_active', sa.Boolean(), nullable=True))
+    if not inspector.has_table('classes'):
+        op.create_table('classes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_classes_id'), 'classes', ['id'], unique=False)
+        op.create_index(op.f('ix_classes_name'), 'classes', ['name'], unique=False)
+    if not inspector.has_table('students'):
+        op.create_table('students',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_students_email'), 'students', ['email'], unique=True)
+        op.create_index(op.f('ix_students_first_name'), 'students', ['first_name'], unique=False)
+        op.create_index(op.f('ix_students_id'), 'students', ['id'], unique=False)
+        op.create_index(op.f('ix_students_last_name'), 'students', ['last_name'], unique=False)
+    if not inspector.has_table('schedules'):
+        op.create_table('schedules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('subject_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.Column('day_of_week', sa.Integer(), nullable=True),
+        sa.Column('lesson_number', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_schedules_id'), 'schedules', ['id'], unique=False)
+    if not inspector.has_table('teacher_classes'):
+        op.create_table('teacher_classes',
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], )
+        )
+    if not inspector.has_table('teacher_students'):
+        op.create_table('teacher_students',
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('student_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['student_id'], ['students.id'], )
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    create_missing_tables(inspector)
+
+    # В начальной миграции нет class_id, хотя модель его содержит (таблицы создавались через create_all)
+    columns = {c['name'] for c in inspector.get_columns('journal_entries')}
+    if 'class_id' not in columns:
+        op.add_column('journal_entries', sa.Column('class_id', sa.Integer(), nullable=True))
+
+    op.create_index(
+        'ix_journal_entries_class_subject_date',
+        'journal_entries',
+        ['class_id', 'subject_id', 'date'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_journal_entries_class_subject_date', table_name='journal_entries')
@@ -0,0 +1,156 @@
+"""Move attendance and grades from JSON columns into attendance_marks/grades
+
+Revision ID: 7e1a5c3b9f42
+Revises: 4c9e2f7a1d30
+Create Date: 2026-10-17 11:03:17.551902
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e1a5c3b9f42'
+down_revision: Union[str, Sequence[str], None] = '4c9e2f7a1d30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+journal_entries = sa.table(
+    'journal_entries',
+    sa.column('id', sa.Integer),
+    sa.column('attendance', sa.Text),
+    sa.column('grades', sa.Text),
+)
+attendance_marks = sa.table(
+    'attendance_marks',
+    sa.column('entry_id', sa.Integer),
+    sa.column('student_id', sa.Integer),
+    sa.column('status', sa.String),
+)
+grades = sa.table(
+    'grades',
+    sa.column('entry_id', sa.Integer),
+    sa.column('student_id', sa.Integer),
+    sa.column('value', sa.String),
+    sa.column('kind', sa.String),
+    sa.column('comment', sa.Text),
+)
+
+
+def _load(raw):
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attendance_marks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['entry_id'], ['journal_entries.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attendance_marks_id'), 'attendance_marks', ['id'], unique=False)
+    op.create_index('ix_attendance_marks_entry_student', 'attendance_marks', ['entry_id', 'student_id'], unique=True)
+    op.create_index('ix_attendance_marks_student_status', 'attendance_marks', ['student_id', 'status'], unique=False)
+    op.create_table('grades',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(), nullable=True),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['entry_id'], ['journal_entries.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_grades_id'), 'grades', ['id'], unique=False)
+    op.create_index('ix_grades_entry_student', 'grades', ['entry_id', 'student_id'], unique=True)
+    op.create_index('ix_grades_student_kind', 'grades', ['student_id', 'kind'], unique=False)
+
+    # Переносим данные из JSON-колонок
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('journal_entries')}
+    if 'grades' not in columns:
+        # В начальной миграции колонки grades не было
+        op.add_column('journal_entries', sa.Column('grades', sa.Text(), nullable=True))
+
+    attendance_rows = []
+    grade_rows = []
+    for entry_id, attendance, entry_grades in bind.execute(
+        sa.select(journal_entries.c.id, journal_entries.c.attendance, journal_entries.c.grades)
+    ):
+        for student_id, status in _load(attendance).items():
+            attendance_rows.append({'entry_id': entry_id, 'student_id': int(student_id), 'status': status})
+        for student_id, info in _load(entry_grades).items():
+            if isinstance(info, dict):
+                value, comment, kind = info.get('grade'), info.get('comment'), info.get('kind') or 'lesson'
+            else:
+                value, comment, kind = None if info is None else str(info), None, 'lesson'
+            grade_rows.append({
+                'entry_id': entry_id, 'student_id': int(student_id),
+                'value': value, 'kind': kind, 'comment': comment
+            })
+    if attendance_rows:
+        op.bulk_insert(attendance_marks, attendance_rows)
+    if grade_rows:
+        op.bulk_insert(grades, grade_rows)
+
+    with op.batch_alter_table('journal_entries') as batch_op:
+        batch_op.drop_column('attendance')
+        batch_op.drop_column('grades')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('journal_entries') as batch_op:
+        batch_op.add_column(sa.Column('attendance', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('grades', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    attendance = {}
+    for entry_id, student_id, status in bind.execute(
+        sa.select(attendance_marks.c.entry_id, attendance_marks.c.student_id, attendance_marks.c.status)
+    ):
+        attendance.setdefault(entry_id, {})[str(student_id)] = status
+    entry_grades = {}
+    for entry_id, student_id, value, kind, comment in bind.execute(
+        sa.select(grades.c.entry_id, grades.c.student_id, grades.c.value, grades.c.kind, grades.c.comment)
+    ):
+        info = {'grade': value}
+        if comment is not None:
+            info['comment'] = comment
+        if kind != 'lesson':
+            info['kind'] = kind
+        entry_grades.setdefault(entry_id, {})[str(student_id)] = info
+
+    for entry_id in set(attendance) | set(entry_grades):
+        bind.execute(
+            journal_entries.update()
+            .where(journal_entries.c.id == entry_id)
+            .values(
+                attendance=json.dumps(attendance[entry_id]) if entry_id in attendance else None,
+                grades=json.dumps(entry_grades[entry_id]) if entry_id in entry_grades else None,
+            )
+        )
+
+    op.drop_index('ix_grades_student_kind', table_name='grades')
+    op.drop_index('ix_grades_entry_student', table_name='grades')
+    op.drop_index(op.f('ix_grades_id'), table_name='grades')
+    op.drop_table('grades')
+    op.drop_index('ix_attendance_marks_student_status', table_name='attendance_marks')
+    op.drop_index('ix_attendance_marks_entry_student', table_name='attendance_marks')
+    op.drop_index(op.f('ix_attendance_marks_id'), table_name='attendance_marks')
+    op.drop_table('attendance_marks')
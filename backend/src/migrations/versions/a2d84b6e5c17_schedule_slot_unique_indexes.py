@@ -0,0 +1,43 @@
+"""Add unique slot indexes on schedules
+
+Revision ID: a2d84b6e5c17
+Revises: 7e1a5c3b9f42
+Create Date: 2026-10-17 12:41:09.318224
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2d84b6e5c17'
+down_revision: Union[str, Sequence[str], None] = '7e1a5c3b9f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SLOTS = {
+    'ux_schedules_teacher_slot': ['teacher_id', 'day_of_week', 'lesson_number'],
+    'ux_schedules_class_slot': ['class_id', 'day_of_week', 'lesson_number'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in SLOTS.items():
+        # Пересечения, появившиеся из-за гонок до миграции: остается самый ранний урок в слоте.
+        # Строки с NULL в слоте индекс не проверяет, их не трогаем
+        present = ' AND '.join(f'{column} IS NOT NULL' for column in columns)
+        op.execute(
+            f"DELETE FROM schedules WHERE {present} AND id NOT IN "
+            f"(SELECT min(id) FROM schedules GROUP BY {', '.join(columns)})"
+        )
+        op.create_index(name, 'schedules', columns, unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_schedules_class_slot', table_name='schedules')
+    op.drop_index('ux_schedules_teacher_slot', table_name='schedules')
@@ -0,0 +1,190 @@
+"""Add soft delete and journal entry history
+
+Revision ID: a9d3f5c1e7b4
+Revises: e2d9a6c4b7f1
+Create Date: 2026-10-17 23:31:42.804117
+
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3f5c1e7b4'
+down_revision: Union[str, Sequence[str], None] = 'e2d9a6c4b7f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+journal_entries = sa.table(
+    'journal_entries',
+    sa.column('id', sa.Integer), sa.column('subject_id', sa.Integer), sa.column('class_id', sa.Integer),
+    sa.column('date', sa.DateTime), sa.column('topic', sa.String), sa.column('homework', sa.String),
+    sa.column('updated_at', sa.DateTime), sa.column('version', sa.Integer), sa.column('deleted_at', sa.DateTime),
+)
+attendance_marks = sa.table(
+    'attendance_marks', sa.column('entry_id', sa.Integer), sa.column('student_id', sa.Integer), sa.column('status', sa.String),
+)
+grades = sa.table(
+    'grades',
+    sa.column('entry_id', sa.Integer), sa.column('student_id', sa.Integer), sa.column('value', sa.String),
+    sa.column('comment', sa.String), sa.column('kind', sa.String),
+)
+journal_entry_snapshots = sa.table(
+    'journal_entry_snapshots',
+    sa.column('entry_id', sa.Integer), sa.column('version', sa.Integer),
+    sa.column('taken_at', sa.DateTime), sa.column('state', sa.Text),
+)
+
+
+# Таблицы с мягким удалением в поисковом индексе (search.py): код типа, тип, выражения для title и body.
+# SQL зафиксирован в миграции, чтобы не зависеть от последующих изменений индекса
+SEARCH_SOURCES = [
+    ("journal_entries", 1, "entry", "coalesce({t}.topic, '')", "coalesce({t}.homework, '')"),
+    ("subjects", 3, "subject", "coalesce({t}.name, '')", "''"),
+]
+
+
+def fold_yo(expression: str) -> str:
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+def recreate_search_triggers(active_only: bool) -> None:
+    # Триггеры таблиц с мягким удалением пересоздаются с условием на deleted_at (или без него), строки индекса заполняются заново
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table, code, kind, title, body in SEARCH_SOURCES:
+        for suffix in ("ai", "au", "ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+        new_active = " WHERE new.deleted_at IS NULL" if active_only else ""
+        insert = (
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT new.id * 4 + {code}, '{kind}', new.id, "
+            f"{fold_yo(title.format(t='new'))}, {fold_yo(body.format(t='new'))}{new_active};"
+        )
+        remove = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        op.execute(f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} BEGIN {remove} {insert} END")
+        op.execute(f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {remove} END")
+
+        active = f" WHERE {table}.deleted_at IS NULL" if active_only else ""
+        op.execute(f"DELETE FROM search_index WHERE rowid % 4 = {code}")
+        op.execute(
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT id * 4 + {code}, '{kind}', id, "
+            f"{fold_yo(title.format(t=table))}, {fold_yo(body.format(t=table))} FROM {table}{active}"
+        )
+
+
+def snapshot_existing_entries() -> None:
+    # История начинается со снимка текущего состояния каждой записи (формат history.state)
+    bind = op.get_bind()
+    attendance = defaultdict(dict)
+    for entry_id, student_id, status in bind.execute(sa.select(attendance_marks)):
+        attendance[entry_id][str(student_id)] = status
+    entry_grades = defaultdict(dict)
+    for entry_id, student_id, value, comment, kind in bind.execute(sa.select(grades)):
+        info = {"grade": value}
+        if comment is not None:
+            info["comment"] = comment
+        if kind and kind != "lesson":
+            info["kind"] = kind
+        entry_grades[entry_id][str(student_id)] = info
+
+    rows = []
+    for entry in bind.execute(sa.select(journal_entries)):
+        state = {
+            "subject_id": entry.subject_id,
+            "class_id": entry.class_id,
+            "date": entry.date.isoformat() if entry.date else None,
+            "topic": entry.topic,
+            "homework": entry.homework,
+            "deleted": False,
+            "attendance": attendance[entry.id],
+            "grades": entry_grades[entry.id],
+        }
+        rows.append({
+            "entry_id": entry.id,
+            "version": entry.version,
+            "taken_at": entry.updated_at or datetime.utcnow(),
+            "state": json.dumps(state, ensure_ascii=False, separators=(",", ":")),
+        })
+    if rows:
+        op.bulk_insert(journal_entry_snapshots, rows)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('subjects', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('journal_entries', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table('journal_entry_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('changed_by', sa.Integer(), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.Column('diff', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['changed_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['entry_id'], ['journal_entries.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_journal_entry_history_entry_version', 'journal_entry_history', ['entry_id', 'version'], unique=False)
+    op.create_index(op.f('ix_journal_entry_history_changed_at'), 'journal_entry_history', ['changed_at'], unique=False)
+    op.create_table('journal_entry_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('state', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['entry_id'], ['journal_entries.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_journal_entry_snapshots_entry_taken', 'journal_entry_snapshots', ['entry_id', 'taken_at'], unique=False)
+    # Удаленные записи теперь остаются в journal_entries с deleted_at, отдельная таблица удалений не нужна
+    op.drop_index(op.f('ix_journal_entry_tombstones_deleted_at'), table_name='journal_entry_tombstones')
+    op.drop_table('journal_entry_tombstones')
+    recreate_search_triggers(active_only=True)
+    snapshot_existing_entries()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table('journal_entry_tombstones',
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('entry_id')
+    )
+    op.create_index(op.f('ix_journal_entry_tombstones_deleted_at'), 'journal_entry_tombstones', ['deleted_at'], unique=False)
+    op.drop_index('ix_journal_entry_snapshots_entry_taken', table_name='journal_entry_snapshots')
+    op.drop_table('journal_entry_snapshots')
+    op.drop_index(op.f('ix_journal_entry_history_changed_at'), table_name='journal_entry_history')
+    op.drop_index('ix_journal_entry_history_entry_version', table_name='journal_entry_history')
+    op.drop_table('journal_entry_history')
+
+    # Мягко удаленные записи удаляются окончательно, как до этой миграции
+    op.execute(
+        "INSERT INTO journal_entry_tombstones (entry_id, class_id, deleted_at) "
+        "SELECT id, class_id, deleted_at FROM journal_entries WHERE deleted_at IS NOT NULL"
+    )
+    deleted = "SELECT id FROM journal_entries WHERE deleted_at IS NOT NULL"
+    op.execute(f"DELETE FROM attendance_marks WHERE entry_id IN ({deleted})")
+    op.execute(f"DELETE FROM grades WHERE entry_id IN ({deleted})")
+    op.execute("DELETE FROM journal_entries WHERE deleted_at IS NOT NULL")
+    # Удаленные предметы, на которые больше никто не ссылается; остальные снова становятся видимыми
+    op.execute(
+        "DELETE FROM subjects WHERE deleted_at IS NOT NULL "
+        "AND id NOT IN (SELECT subject_id FROM journal_entries WHERE subject_id IS NOT NULL) "
+        "AND id NOT IN (SELECT subject_id FROM schedules WHERE subject_id IS NOT NULL)"
+    )
+
+    # Сначала триггеры без deleted_at: SQLite не удаляет столбец, на который ссылается триггер.
+    # Без batch-режима: пересоздание таблицы в SQLite удалило бы триггеры поискового индекса
+    recreate_search_triggers(active_only=False)
+    op.drop_column('journal_entries', 'deleted_at')
+    op.drop_column('subjects', 'deleted_at')
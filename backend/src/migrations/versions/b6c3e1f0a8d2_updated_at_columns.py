@@ -0,0 +1,36 @@
+"""Add updated_at to subjects, classes, students and schedules
+
+Revision ID: b6c3e1f0a8d2
+Revises: f7b2d4e9a1c3
+Create Date: 2026-10-17 21:20:11.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6c3e1f0a8d2'
+down_revision: Union[str, Sequence[str], None] = 'f7b2d4e9a1c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['subjects', 'classes', 'students', 'schedules']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        # Без batch-режима: пересоздание таблицы в SQLite удалило бы триггеры поискового индекса
+        op.drop_column(table, 'updated_at')
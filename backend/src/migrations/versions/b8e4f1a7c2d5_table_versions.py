@@ -0,0 +1,32 @@
+"""Add table_versions for conditional GET ETags
+
+Revision ID: b8e4f1a7c2d5
+Revises: a9d3f5c1e7b4
+Create Date: 2026-10-18 10:21:37.512930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f1a7c2d5'
+down_revision: Union[str, Sequence[str], None] = 'a9d3f5c1e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('table_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('deletes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('table_versions')
@@ -0,0 +1,67 @@
+"""Rebuild PostgreSQL search indexes over yo-folded expressions
+
+Revision ID: c2e7a9d4f1b6
+Revises: b8e4f1a7c2d5
+Create Date: 2026-10-18 11:02:14.730561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e7a9d4f1b6'
+down_revision: Union[str, Sequence[str], None] = 'b8e4f1a7c2d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def fold_yo(expression: str) -> str:
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+STUDENT_NAME = "coalesce(last_name, '') || ' ' || coalesce(first_name, '')"
+ENTRY_TEXT = "coalesce(topic, '') || ' ' || coalesce(homework, '')"
+
+# Индекс: (таблица, выражение до миграции)
+TRGM_INDEXES = {
+    'ix_students_name_trgm': ('students', STUDENT_NAME),
+    'ix_classes_name_trgm': ('classes', 'name'),
+    'ix_subjects_name_trgm': ('subjects', 'name'),
+}
+
+
+def create_indexes(fold) -> None:
+    for name, (table, expression) in TRGM_INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON {table} USING gin (({fold(expression)}) gin_trgm_ops)")
+    op.execute(
+        "CREATE INDEX ix_journal_entries_search ON journal_entries "
+        f"USING gin (to_tsvector('russian', {fold(ENTRY_TEXT)}))"
+    )
+
+
+def drop_indexes() -> None:
+    op.execute("DROP INDEX ix_journal_entries_search")
+    for name in TRGM_INDEXES:
+        op.execute(f"DROP INDEX {name}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Поиск в PostgreSQL сравнивает ё как е (search.postgresql_search_select); индексы должны
+    # быть построены по тем же выражениям, иначе планировщик их не использует.
+    # В SQLite ё заменяется при записи в search_index, менять нечего
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    drop_indexes()
+    create_indexes(fold_yo)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    drop_indexes()
+    create_indexes(lambda expression: expression)
@@ -0,0 +1,54 @@
+"""Add journal entry versions, tombstones and sync operations
+
+Revision ID: c4a7e2b9d1f6
+Revises: b6c3e1f0a8d2
+Create Date: 2026-10-17 22:05:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2b9d1f6'
+down_revision: Union[str, Sequence[str], None] = 'b6c3e1f0a8d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('journal_entries', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.create_table('journal_entry_tombstones',
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('entry_id')
+    )
+    op.create_index(op.f('ix_journal_entry_tombstones_deleted_at'), 'journal_entry_tombstones', ['deleted_at'], unique=False)
+    op.create_table('sync_operations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=False),
+    sa.Column('result', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sync_operations_id'), 'sync_operations', ['id'], unique=False)
+    op.create_index(op.f('ix_sync_operations_created_at'), 'sync_operations', ['created_at'], unique=False)
+    op.create_index('ux_sync_operations_user_key', 'sync_operations', ['user_id', 'idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_sync_operations_user_key', table_name='sync_operations')
+    op.drop_index(op.f('ix_sync_operations_created_at'), table_name='sync_operations')
+    op.drop_index(op.f('ix_sync_operations_id'), table_name='sync_operations')
+    op.drop_table('sync_operations')
+    op.drop_index(op.f('ix_journal_entry_tombstones_deleted_at'), table_name='journal_entry_tombstones')
+    op.drop_table('journal_entry_tombstones')
+    # Без batch-режима: пересоздание таблицы в SQLite удалило бы триггеры поискового индекса
+    op.drop_column('journal_entries', 'version')
@@ -0,0 +1,42 @@
+"""Add change log
+
+Revision ID: e2d9a6c4b7f1
+Revises: c4a7e2b9d1f6
+Create Date: 2026-10-17 22:48:09.126730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d9a6c4b7f1'
+down_revision: Union[str, Sequence[str], None] = 'c4a7e2b9d1f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('object_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_change_log_class_seq', 'change_log', ['class_id', 'seq'], unique=False)
+    op.create_index(op.f('ix_change_log_created_at'), 'change_log', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_change_log_created_at'), table_name='change_log')
+    op.drop_index('ix_change_log_class_seq', table_name='change_log')
+    op.drop_table('change_log')
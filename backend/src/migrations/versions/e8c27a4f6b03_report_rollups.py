@@ -0,0 +1,65 @@
+"""Add report rollup tables
+
+Revision ID: e8c27a4f6b03
+Revises: d5f0b8e3a914
+Create Date: 2026-10-17 13:38:21.447910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c27a4f6b03'
+down_revision: Union[str, Sequence[str], None] = 'd5f0b8e3a914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('student_weekly_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('grade_sum', sa.Float(), nullable=False),
+    sa.Column('grade_count', sa.Integer(), nullable=False),
+    sa.Column('marked', sa.Integer(), nullable=False),
+    sa.Column('absences', sa.Integer(), nullable=False),
+    sa.Column('lates', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_student_weekly_stats_id'), 'student_weekly_stats', ['id'], unique=False)
+    op.create_index('ux_student_weekly_stats_key', 'student_weekly_stats', ['student_id', 'subject_id', 'week_start'], unique=True)
+    op.create_table('class_monthly_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('grade_sum', sa.Float(), nullable=False),
+    sa.Column('grade_count', sa.Integer(), nullable=False),
+    sa.Column('marked', sa.Integer(), nullable=False),
+    sa.Column('absences', sa.Integer(), nullable=False),
+    sa.Column('lates', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_class_monthly_stats_id'), 'class_monthly_stats', ['id'], unique=False)
+    op.create_index('ux_class_monthly_stats_key', 'class_monthly_stats', ['class_id', 'subject_id', 'month'], unique=True)
+    # Агрегаты по уже существующим записям: python rollups.py rebuild
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_class_monthly_stats_key', table_name='class_monthly_stats')
+    op.drop_index(op.f('ix_class_monthly_stats_id'), table_name='class_monthly_stats')
+    op.drop_table('class_monthly_stats')
+    op.drop_index('ux_student_weekly_stats_key', table_name='student_weekly_stats')
+    op.drop_index(op.f('ix_student_weekly_stats_id'), table_name='student_weekly_stats')
+    op.drop_table('student_weekly_stats')
@@ -0,0 +1,59 @@
+"""Add entry updated_at, job watermarks and notification outbox
+
+Revision ID: f3a91c6d2e58
+Revises: e8c27a4f6b03
+Create Date: 2026-10-17 14:12:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a91c6d2e58'
+down_revision: Union[str, Sequence[str], None] = 'e8c27a4f6b03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('journal_entries', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # Существующие записи попадут в первый запуск проверки уведомлений
+    op.execute("UPDATE journal_entries SET updated_at = CURRENT_TIMESTAMP")
+    op.create_index(op.f('ix_journal_entries_updated_at'), 'journal_entries', ['updated_at'], unique=False)
+    op.create_table('job_watermarks',
+    sa.Column('job', sa.String(), nullable=False),
+    sa.Column('value', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('job')
+    )
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_notification_outbox_id'), 'notification_outbox', ['id'], unique=False)
+    op.create_index(op.f('ix_notification_outbox_student_id'), 'notification_outbox', ['student_id'], unique=False)
+    op.create_index('ix_notification_outbox_pending', 'notification_outbox', ['sent_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notification_outbox_pending', table_name='notification_outbox')
+    op.drop_index(op.f('ix_notification_outbox_student_id'), table_name='notification_outbox')
+    op.drop_index(op.f('ix_notification_outbox_id'), table_name='notification_outbox')
+    op.drop_table('notification_outbox')
+    op.drop_table('job_watermarks')
+    op.drop_index(op.f('ix_journal_entries_updated_at'), table_name='journal_entries')
+    with op.batch_alter_table('journal_entries') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,99 @@
+"""Add full-text search index
+
+Revision ID: f7b2d4e9a1c3
+Revises: f3a91c6d2e58
+Create Date: 2026-10-17 14:47:03.529871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b2d4e9a1c3'
+down_revision: Union[str, Sequence[str], None] = 'f3a91c6d2e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# SQL зафиксирован здесь, а не берется из search.py: миграция должна выполняться одинаково
+# при любых последующих изменениях индекса. rowid = id * 4 + код типа (student 0, entry 1, class 2, subject 3),
+# ё заменяется на е - токенизатор unicode61 не считает их одной буквой
+def fold_yo(expression: str) -> str:
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+# Таблица, код типа, тип, выражения для title и body (new - строка в триггере)
+SOURCES = [
+    ("students", 0, "student", "coalesce({t}.last_name, '') || ' ' || coalesce({t}.first_name, '')", "coalesce({t}.email, '')"),
+    ("journal_entries", 1, "entry", "coalesce({t}.topic, '')", "coalesce({t}.homework, '')"),
+    ("classes", 2, "class", "coalesce({t}.name, '')", "''"),
+    ("subjects", 3, "subject", "coalesce({t}.name, '')", "''"),
+]
+
+
+def sqlite_search_index() -> list:
+    # prefix='2 3' - отдельные индексы префиксов для подсказок при вводе;
+    # unicode61 без диакритики: регистр и ё/е не важны, в том числе для кириллицы
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    ]
+    for table, code, kind, title, body in SOURCES:
+        insert = (
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT new.id * 4 + {code}, '{kind}', new.id, {fold_yo(title.format(t='new'))}, {fold_yo(body.format(t='new'))};"
+        )
+        remove = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN {remove} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {remove} END",
+        ]
+    # Заполнение по уже существующим данным
+    for table, code, kind, title, body in SOURCES:
+        statements.append(
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT id * 4 + {code}, '{kind}', id, {fold_yo(title.format(t=table))}, {fold_yo(body.format(t=table))} FROM {table}"
+        )
+    return statements
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        # Индексы по выражениям обновляются самим PostgreSQL, триггеры не нужны
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX ix_students_name_trgm ON students "
+            "USING gin ((coalesce(last_name, '') || ' ' || coalesce(first_name, '')) gin_trgm_ops)"
+        )
+        op.execute("CREATE INDEX ix_classes_name_trgm ON classes USING gin (name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_subjects_name_trgm ON subjects USING gin (name gin_trgm_ops)")
+        op.execute(
+            "CREATE INDEX ix_journal_entries_search ON journal_entries "
+            "USING gin (to_tsvector('russian', coalesce(topic, '') || ' ' || coalesce(homework, '')))"
+        )
+        return
+
+    # FTS5-таблица и триггеры, затем заполнение по уже существующим данным
+    for statement in sqlite_search_index():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_journal_entries_search")
+        op.execute("DROP INDEX ix_subjects_name_trgm")
+        op.execute("DROP INDEX ix_classes_name_trgm")
+        op.execute("DROP INDEX ix_students_name_trgm")
+        return
+
+    for table, _, _, _, _ in SOURCES:
+        for suffix in ("ai", "au", "ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Table
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Text, ForeignKey, Boolean, Table, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -35,12 +35,28 @@ class User(Base):
     students = relationship("Student", secondary=teacher_students, back_populates="teachers")
 
 
+class RefreshToken(Base):
+    # Выданные refresh-токены: один ряд на токен, ротация идет внутри семейства (family_id)
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(String, primary_key=True)
+    family_id = Column(String, nullable=False, index=True)
+    username = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked = Column(Boolean, nullable=False, default=False)
+
+
 class Subject(Base):
     __tablename__ = "subjects"
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     teacher_id = Column(Integer, ForeignKey("users.id"))  # Убедитесь, что этот ForeignKey есть
+    # Время изменения строки, по нему и числу строк строится ETag для условных GET (conditional.py)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Удаленный предмет остается в базе: на него ссылаются записи журнала и их история
+    deleted_at = Column(DateTime, nullable=True)
     
     journal_entries = relationship("JournalEntry", back_populates="subject")
     schedules = relationship("Schedule", back_populates="subject")
@@ -52,6 +68,7 @@ class Class(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Отношения
     teachers = relationship("User", secondary=teacher_classes, back_populates="user_classes")
@@ -68,6 +85,7 @@ class Student(Base):
     last_name = Column(String, index=True)
     email = Column(String, unique=True, index=True)
     class_id = Column(Integer, ForeignKey("classes.id"))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Отношения
     class_ = relationship("Class", back_populates="students")
@@ -82,13 +100,198 @@ class JournalEntry(Base):
     class_id = Column(Integer, ForeignKey("classes.id"))
     date = Column(DateTime)
     topic = Column(String)
-    attendance = Column(Text, nullable=True)  # Используем Text для больших JSON
     homework = Column(Text)
-    grades = Column(Text, nullable=True)  # Используем Text для JSON
+    # Время последнего изменения записи или ее отметок, по нему фоновые задачи находят новые изменения
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Номер версии для оптимистичной блокировки: растет при каждом UPDATE, устаревшая запись не перезапишет новую
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Мягкое удаление: запись скрыта из журнала, но остается для истории изменений
+    deleted_at = Column(DateTime, nullable=True)
     
     # Relationships
     subject = relationship("Subject")
     class_ = relationship("Class")
+    attendance_marks = relationship("AttendanceMark", back_populates="entry", cascade="all, delete-orphan")
+    grade_marks = relationship("Grade", back_populates="entry", cascade="all, delete-orphan")
+
+    # Составной индекс под журнал одного класса/предмета с сортировкой по дате
+    __table_args__ = (
+        Index("ix_journal_entries_class_subject_date", "class_id", "subject_id", "date"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class AttendanceMark(Base):
+    __tablename__ = "attendance_marks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("journal_entries.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    status = Column(String, nullable=False)  # present / absent / late ...
+
+    entry = relationship("JournalEntry", back_populates="attendance_marks")
+
+    __table_args__ = (
+        Index("ix_attendance_marks_entry_student", "entry_id", "student_id", unique=True),
+        Index("ix_attendance_marks_student_status", "student_id", "status"),
+    )
+
+
+class Grade(Base):
+    __tablename__ = "grades"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("journal_entries.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    value = Column(String, nullable=True)
+    kind = Column(String, nullable=False, default="lesson")  # урок, контрольная, домашняя работа
+    comment = Column(Text, nullable=True)
+
+    entry = relationship("JournalEntry", back_populates="grade_marks")
+
+    __table_args__ = (
+        Index("ix_grades_entry_student", "entry_id", "student_id", unique=True),
+        Index("ix_grades_student_kind", "student_id", "kind"),
+    )
+
+
+# Агрегаты для отчетов, обновляются приращениями при изменении записей журнала (rollups.py)
+class StudentWeeklyStats(Base):
+    __tablename__ = "student_weekly_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    week_start = Column(Date, nullable=False)  # понедельник недели
+    grade_sum = Column(Float, nullable=False, default=0)
+    grade_count = Column(Integer, nullable=False, default=0)
+    marked = Column(Integer, nullable=False, default=0)  # отметок посещаемости
+    absences = Column(Integer, nullable=False, default=0)
+    lates = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ux_student_weekly_stats_key", "student_id", "subject_id", "week_start", unique=True),
+    )
+
+
+class ClassMonthlyStats(Base):
+    __tablename__ = "class_monthly_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    month = Column(Date, nullable=False)  # первое число месяца
+    grade_sum = Column(Float, nullable=False, default=0)
+    grade_count = Column(Integer, nullable=False, default=0)
+    marked = Column(Integer, nullable=False, default=0)
+    absences = Column(Integer, nullable=False, default=0)
+    lates = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ux_class_monthly_stats_key", "class_id", "subject_id", "month", unique=True),
+    )
+
+
+# Отметка, до которой фоновая задача уже обработала изменения
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+
+    job = Column(String, primary_key=True)
+    value = Column(DateTime, nullable=False)
+
+
+# Число жестких удалений строк таблицы: вместе с max(updated_at) дает версию таблицы для ETag
+# (conditional.py). Добавление и изменение строки меняют updated_at, удаление - только этот счетчик
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    deletes = Column(Integer, nullable=False, default=0)
+
+
+# История изменений записей журнала (history.py): только добавление строк. В diff - лишь изменившиеся поля
+# и отметки отдельных учеников; старые строки фоновая задача сворачивает в снимки состояния
+class JournalEntryHistory(Base):
+    __tablename__ = "journal_entry_history"
+
+    id = Column(Integer, primary_key=True)
+    entry_id = Column(Integer, ForeignKey("journal_entries.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # create / update / delete
+    changed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    diff = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_journal_entry_history_entry_version", "entry_id", "version"),
+    )
+
+
+class JournalEntrySnapshot(Base):
+    __tablename__ = "journal_entry_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    entry_id = Column(Integer, ForeignKey("journal_entries.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)  # время последнего изменения, вошедшего в снимок
+    state = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_journal_entry_snapshots_entry_taken", "entry_id", "taken_at"),
+    )
+
+
+# Результаты уже примененных операций синхронизации: повтор с тем же ключом возвращает сохраненный результат
+class SyncOperation(Base):
+    __tablename__ = "sync_operations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    idempotency_key = Column(String, nullable=False)
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ux_sync_operations_user_key", "user_id", "idempotency_key", unique=True),
+    )
+
+
+# Журнал изменений записей и расписания по порядковому номеру seq: из него клиенты получают
+# изменения других учителей (changes.py). Номера не переиспользуются и после очистки старых строк
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+
+    seq = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # entry / schedule
+    object_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # create / update / delete
+    class_id = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_change_log_class_seq", "class_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Исходящие уведомления: пишутся фоновой задачей и отправляются отдельно (notifications.py)
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    recipient = Column(String, nullable=True)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_pending", "sent_at", "id"),
+    )
 
 
 class Schedule(Base):
@@ -100,7 +303,14 @@ class Schedule(Base):
     class_id = Column(Integer, ForeignKey("classes.id"))
     day_of_week = Column(Integer)  # 0-6 (понедельник-воскресенье)
     lesson_number = Column(Integer)  # Номер урока
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     teacher = relationship("User")
     subject = relationship("Subject", back_populates="schedules")
-    class_ = relationship("Class", back_populates="schedules")
\ No newline at end of file
+    class_ = relationship("Class", back_populates="schedules")
+
+    # Учитель и класс не могут быть заняты двумя уроками одновременно
+    __table_args__ = (
+        Index("ux_schedules_teacher_slot", "teacher_id", "day_of_week", "lesson_number", unique=True),
+        Index("ux_schedules_class_slot", "class_id", "day_of_week", "lesson_number", unique=True),
+    )
\ No newline at end of file
@@ -0,0 +1,90 @@
+import json
+import smtplib
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import NotificationOutbox
+from settings import (
+    NOTIFICATION_SENDER, NOTIFICATION_FILE, SMTP_HOST, SMTP_PORT, SMTP_FROM,
+    OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS
+)
+
+
+# Отправители уведомлений. Новый канал (SMS, мессенджер) - класс с методом send(message),
+# зарегистрированный в SENDERS и выбранный через NOTIFICATION_SENDER.
+
+class FileSender:
+    # Локальная замена почты: каждое уведомление - строка JSON в файле
+    def __init__(self, path: str = NOTIFICATION_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message: NotificationOutbox):
+        line = json.dumps({
+            "id": message.id,
+            "to": message.recipient,
+            "subject": message.subject,
+            "body": message.body,
+            "created_at": message.created_at.isoformat()
+        }, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class SmtpSender:
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, sender: str = SMTP_FROM):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, message: NotificationOutbox):
+        if not message.recipient:
+            raise ValueError("No recipient address")
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message.recipient
+        email["Subject"] = message.subject
+        email.set_content(message.body)
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(email)
+
+SENDERS = {"file": FileSender, "smtp": SmtpSender}
+
+def get_sender():
+    return SENDERS[NOTIFICATION_SENDER]()
+
+
+def drain_outbox(db: Session, sender=None, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    # Отправляет неотправленные уведомления пачками; ошибка одного не останавливает остальные
+    sender = sender or get_sender()
+    sent = 0
+    last_id = 0
+    while True:
+        # Каждое сообщение пробуем не больше одного раза за вызов, повтор - на следующем запуске
+        batch = db.scalars(
+            select(NotificationOutbox)
+            .where(
+                NotificationOutbox.sent_at.is_(None),
+                NotificationOutbox.attempts < OUTBOX_MAX_ATTEMPTS,
+                NotificationOutbox.id > last_id
+            )
+            .order_by(NotificationOutbox.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return sent
+        last_id = batch[-1].id
+        for message in batch:
+            message.attempts += 1
+            try:
+                sender.send(message)
+            except Exception as e:
+                message.last_error = str(e)
+            else:
+                message.sent_at = datetime.utcnow()
+                message.last_error = None
+                sent += 1
+        db.commit()
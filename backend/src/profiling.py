@@ -0,0 +1,197 @@
+import cProfile
+import inspect
+import json
+import logging
+import os
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from metrics import current_request_stats, route_name
+from settings import SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_LOG_FILE, PROFILE_DIR
+
+
+# Диагностика на стенде без передеплоя: журнал медленных SQL-запросов с планом выполнения
+# и профилирование отдельного HTTP-запроса по заголовку X-Profile или параметру ?profile=.
+
+slow_query_logger = logging.getLogger("slow_query")
+
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+
+
+def parameters_shape(parameters, executemany: bool = False) -> str:
+    # Типы и количество параметров без самих значений: в них могут быть персональные данные
+    if executemany:
+        return f"{len(parameters)} x {parameters_shape(parameters[0])}" if parameters else "[]"
+    if isinstance(parameters, dict):
+        values = parameters.values()
+    elif isinstance(parameters, (list, tuple)):
+        values = parameters
+    else:
+        return type(parameters).__name__
+    types = sorted({type(value).__name__ for value in values})
+    return f"{len(values)} params: {', '.join(types)}" if values else "no params"
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters) -> Optional[str]:
+    prefix = EXPLAIN_PREFIXES.get(dialect)
+    if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    # Отдельный курсор того же DBAPI-соединения: результат основного запроса не затрагивается.
+    # Соединение берется из Connection, а не из курсора: у курсоров асинхронных драйверов
+    # (aiosqlite, asyncpg) нет атрибута connection
+    explain_cursor = None
+    try:
+        explain_cursor = dbapi_connection.cursor()
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        if explain_cursor is not None:
+            explain_cursor.close()
+    return "\n".join(str(row[-1]) for row in rows)
+
+def current_route() -> str:
+    stats = current_request_stats.get()
+    return route_name(stats.scope) if stats is not None and stats.scope is not None else "background"
+
+def install_slow_query_log(engine, threshold_ms: float = SLOW_QUERY_MS):
+    if threshold_ms < 0:
+        return
+    if SLOW_QUERY_LOG_FILE and not slow_query_logger.handlers:
+        slow_query_logger.addHandler(logging.FileHandler(SLOW_QUERY_LOG_FILE, encoding="utf-8"))
+        slow_query_logger.setLevel(logging.INFO)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        if elapsed_ms < threshold_ms:
+            return
+        record = {
+            "duration_ms": round(elapsed_ms, 2),
+            "route": current_route(),
+            "sql": statement,
+            "parameters": parameters_shape(parameters, executemany),
+        }
+        if SLOW_QUERY_EXPLAIN and not executemany:
+            record["plan"] = explain(conn.connection.dbapi_connection, conn.dialect.name, statement, parameters)
+        slow_query_logger.warning("slow query %s", json.dumps(record, ensure_ascii=False))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("slow_query_start"):
+            conn.info["slow_query_start"].pop()
+
+
+# Профилирование запроса. Синхронные обработчики выполняются в пуле потоков, а cProfile видит
+# только свой поток, поэтому профилировщик запускается вокруг самого обработчика маршрута.
+# pyinstrument используется, если он установлен и запрошен явно (X-Profile: pyinstrument).
+
+class RequestProfile:
+    def __init__(self, mode: str):
+        self.mode = mode
+        extension = "html" if mode == "pyinstrument" else "prof"
+        self.filename = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.{extension}"
+        self.started = False
+
+    @property
+    def path(self) -> str:
+        return os.path.join(PROFILE_DIR, self.filename)
+
+    def start(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.started = True
+        if self.mode == "pyinstrument":
+            from pyinstrument import Profiler
+
+            self.profiler = Profiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.mode == "pyinstrument":
+            self.profiler.stop()
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+def profiled_endpoint(call):
+    if inspect.iscoroutinefunction(call):
+        @wraps(call)
+        async def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            profile.start()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.stop()
+    else:
+        @wraps(call)
+        def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return call(*args, **kwargs)
+            profile.start()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profile.stop()
+    return wrapper
+
+def install_profiling(router):
+    # Вызывается до include_router: подключенный роутер строит обработчики из route.endpoint
+    for route in router.routes:
+        if isinstance(route, APIRoute):
+            route.endpoint = profiled_endpoint(route.endpoint)
+            route.dependant.call = route.endpoint
+
+def requested_profile_mode(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.decode("latin-1").strip().lower() or None
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+    return values[0].lower() if values else None
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        mode = requested_profile_mode(scope) if scope["type"] == "http" else None
+        if not mode or mode in ("0", "false"):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile("pyinstrument" if mode == "pyinstrument" else "cprofile")
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            # Заголовок только если обработчик маршрута действительно профилировался (не /health, не 404)
+            if message["type"] == "http.response.start" and profile.started:
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", profile.filename.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
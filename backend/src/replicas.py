@@ -0,0 +1,86 @@
+import hashlib
+import sqlite3
+import sys
+import time
+
+from sqlalchemy.engine import make_url
+
+from cache import TTLCache
+from database import SQLALCHEMY_DATABASE_URL, is_sqlite, read_only_request, replica_set
+from settings import DATABASE_REPLICA_URLS, READ_AFTER_WRITE_SECONDS
+
+
+# Маршрутизация чтения на реплики. GET/HEAD (и OPTIONS) читают с реплики, остальные методы - с основной базы.
+# Клиент, который только что писал, READ_AFTER_WRITE_SECONDS читает с основной базы и видит свою запись,
+# даже если реплика отстает. Отметка хранится в памяти процесса.
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+recent_writers = TTLCache(maxsize=100_000, ttl=READ_AFTER_WRITE_SECONDS)
+
+def client_key(scope) -> str:
+    # Клиент - его токен (у каждого входа свой), без токена - адрес
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return hashlib.blake2b(value, digest_size=16).hexdigest()
+    client = scope.get("client")
+    return client[0] if client else ""
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = client_key(scope)
+        reading = scope["method"] in READ_METHODS
+        if not reading:
+            recent_writers.set(key, True)
+        token = read_only_request.set(reading and recent_writers.get(key) is None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            read_only_request.reset(token)
+            # Окно отсчитывается и от конца записи: долгий запрос не должен его исчерпать
+            if not reading:
+                recent_writers.set(key, True)
+
+def check_replicas(db):
+    # Задача планировщика: сессия ему не нужна, проверяются сами реплики
+    if replica_set is not None:
+        replica_set.check()
+
+
+# Локальная проверка без внешних сервисов: реплики - копии файла SQLite, обновляемые этой командой.
+# sqlite3 backup копирует согласованный снимок даже во время записи в основную базу.
+
+def sqlite_path(url: str) -> str:
+    return make_url(url).database
+
+def sync_sqlite_replicas():
+    source = sqlite3.connect(sqlite_path(SQLALCHEMY_DATABASE_URL))
+    try:
+        for url in DATABASE_REPLICA_URLS:
+            target = sqlite3.connect(sqlite_path(url))
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] != "sync" or len(args) > 2:
+        sys.exit("Использование: python replicas.py sync [интервал в секундах]")
+    if not is_sqlite(SQLALCHEMY_DATABASE_URL) or not all(is_sqlite(url) for url in DATABASE_REPLICA_URLS):
+        sys.exit("Копирование поддерживается только для SQLite; реплики PostgreSQL настраиваются репликацией")
+    while True:
+        sync_sqlite_replicas()
+        print(f"Реплики обновлены: {len(DATABASE_REPLICA_URLS)}")
+        if len(args) == 1:
+            break
+        time.sleep(float(args[1]))
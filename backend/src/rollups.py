@@ -0,0 +1,143 @@
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
+
+from gradebook import grade_score
+from models import JournalEntry, StudentWeeklyStats, ClassMonthlyStats
+
+
+# Агрегаты для отчетов ведутся приращениями: при изменении записи журнала из агрегатов
+# вычитается ее старый вклад и прибавляется новый. Отчет читает несколько строк агрегатов,
+# а не сканирует journal_entries. rebuild_rollups пересчитывает все с нуля (python rollups.py rebuild).
+
+ROLLUP_COUNTERS = ("grade_sum", "grade_count", "marked", "absences", "lates")
+WEEKLY_KEY = ("student_id", "subject_id", "week_start")
+MONTHLY_KEY = ("class_id", "subject_id", "month")
+
+DIALECT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def week_start(value: datetime) -> date:
+    day = value.date() if isinstance(value, datetime) else value
+    return day - timedelta(days=day.weekday())
+
+def month_start(value: datetime) -> date:
+    day = value.date() if isinstance(value, datetime) else value
+    return day.replace(day=1)
+
+def snapshot(class_id: int, subject_id: int, date_: datetime, attendance: dict, grades: dict) -> dict:
+    # Вклад одной записи: attendance {student_id: status}, grades {student_id: value}
+    return {
+        "class_id": class_id,
+        "subject_id": subject_id,
+        "date": date_,
+        "attendance": dict(attendance),
+        "grades": dict(grades)
+    }
+
+def entry_snapshot(entry: JournalEntry) -> dict:
+    return snapshot(
+        entry.class_id,
+        entry.subject_id,
+        entry.date,
+        {mark.student_id: mark.status for mark in entry.attendance_marks},
+        {grade.student_id: grade.value for grade in entry.grade_marks}
+    )
+
+
+class RollupDeltas:
+    def __init__(self):
+        self.weekly = defaultdict(lambda: [0] * len(ROLLUP_COUNTERS))
+        self.monthly = defaultdict(lambda: [0] * len(ROLLUP_COUNTERS))
+
+    def add(self, item: Optional[dict], sign: int = 1):
+        if item is None or item["date"] is None:
+            return
+        week = week_start(item["date"])
+        monthly = self.monthly[(item["class_id"], item["subject_id"], month_start(item["date"]))]
+        attendance, grades = item["attendance"], item["grades"]
+        for student_id in attendance.keys() | grades.keys():
+            score = grade_score(grades.get(student_id))
+            status = attendance.get(student_id)
+            counters = (
+                score or 0,
+                score is not None,
+                status is not None,
+                status == "absent",
+                status == "late"
+            )
+            weekly = self.weekly[(student_id, item["subject_id"], week)]
+            for i, value in enumerate(counters):
+                weekly[i] += sign * value
+                monthly[i] += sign * value
+
+    def rows(self, deltas: dict, key_columns: tuple) -> list:
+        return [
+            {**dict(zip(key_columns, key)), **dict(zip(ROLLUP_COUNTERS, values))}
+            for key, values in deltas.items() if any(values)
+        ]
+
+
+def upsert_counters(db: Session, model, key_columns: tuple, rows: list):
+    # INSERT ... ON CONFLICT DO UPDATE SET counter = counter + excluded.counter: без чтения и гонок
+    if not rows:
+        return
+    stmt = DIALECT_INSERTS[db.get_bind().dialect.name](model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in ROLLUP_COUNTERS}
+    )
+    db.execute(stmt, rows)
+
+def apply_deltas(db: Session, deltas: RollupDeltas):
+    upsert_counters(db, StudentWeeklyStats, WEEKLY_KEY, deltas.rows(deltas.weekly, WEEKLY_KEY))
+    upsert_counters(db, ClassMonthlyStats, MONTHLY_KEY, deltas.rows(deltas.monthly, MONTHLY_KEY))
+
+def record_entry_change(db: Session, before: Optional[dict], after: Optional[dict]):
+    # Вызывается в той же транзакции, что и изменение записи; коммит делает вызывающий код
+    deltas = RollupDeltas()
+    deltas.add(before, -1)
+    deltas.add(after, 1)
+    apply_deltas(db, deltas)
+
+def record_entries_added(db: Session, items: Iterable[dict]):
+    deltas = RollupDeltas()
+    for item in items:
+        deltas.add(item)
+    apply_deltas(db, deltas)
+
+def rebuild_rollups(db: Session, batch_size: int = 1000) -> int:
+    db.execute(delete(StudentWeeklyStats))
+    db.execute(delete(ClassMonthlyStats))
+    deltas = RollupDeltas()
+    count = 0
+    entries = db.scalars(
+        select(JournalEntry)
+        .options(selectinload(JournalEntry.attendance_marks), selectinload(JournalEntry.grade_marks))
+        .where(JournalEntry.deleted_at.is_(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for entry in entries:
+        deltas.add(entry_snapshot(entry))
+        count += 1
+    apply_deltas(db, deltas)
+    db.commit()
+    return count
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("Использование: python rollups.py rebuild")
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Агрегаты пересчитаны, записей журнала: {rebuild_rollups(db)}")
+    finally:
+        db.close()
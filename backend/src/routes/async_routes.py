@@ -0,0 +1,134 @@
+# Асинхронные версии читающих эндпоинтов (включаются при ASYNC_DB=1).
+# Запросы берутся из crud.py, ответы строятся теми же функциями, что и в синхронных роутерах.
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Optional
+
+import crud
+from conditional import conditional_get_async
+from database import get_async_db
+from dependencies import get_current_user_async, CurrentUser
+from gradebook import build_gradebook
+from models import Class, JournalEntry, JournalEntryHistory, JournalEntrySnapshot, Schedule, Student, Subject
+from schemas import ClassResponse, ClassWithStudents, GradebookResponse, JournalEntryResponse, ScheduleResponse, StudentResponse, SubjectResponse
+from routes.entries import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, entry_as_of, entry_response
+from routes.classes import class_with_students_response
+from serialization import entry_rows, fast_json, schedule_rows, student_rows
+
+
+entries_router = APIRouter(prefix="/entries", tags=["entries"])
+
+@entries_router.get("/", response_model=List[JournalEntryResponse], dependencies=[Depends(conditional_get_async(JournalEntry, Subject, Class))])
+async def get_entries(
+    response: Response,
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    after = decode_cursor(cursor) if cursor else None
+
+    rows = (await db.execute(crud.entries_page_select(
+        class_id=class_id,
+        subject_id=subject_id,
+        date_from=date_from,
+        date_to=date_to,
+        after=after,
+        limit=limit + 1,
+        base=crud.entry_rows_select()
+    ))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+
+    attendance, grades = [], []
+    if rows:
+        entry_ids = [row.id for row in rows]
+        attendance = (await db.execute(crud.attendance_rows_select(entry_ids))).all()
+        grades = (await db.execute(crud.grade_rows_select(entry_ids))).all()
+    return fast_json(entry_rows(rows, attendance, grades), response)
+
+@entries_router.get("/{entry_id}", response_model=JournalEntryResponse, dependencies=[Depends(conditional_get_async(JournalEntry, Subject, Class, JournalEntryHistory, JournalEntrySnapshot))])
+async def get_entry(
+    entry_id: int,
+    as_of: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if as_of is not None:
+        # Сборка состояния из истории - несколько небольших запросов, выполняем их синхронной частью сессии
+        return await db.run_sync(entry_as_of, entry_id, as_of)
+    entry = (await db.scalars(crud.entry_select(entry_id))).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+
+    return entry_response(entry)
+
+
+classes_router = APIRouter(tags=["classes"])
+
+@classes_router.get("/classes/", response_model=List[ClassResponse], dependencies=[Depends(conditional_get_async(Class))])
+async def get_classes(current_user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(crud.classes_select())).all()
+
+@classes_router.get("/classes-with-students", response_model=List[ClassWithStudents], dependencies=[Depends(conditional_get_async(Class, Student))])
+async def get_classes_with_students(current_user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    classes = (await db.scalars(crud.classes_with_students_select())).all()
+    return [class_with_students_response(class_) for class_ in classes]
+
+@classes_router.get("/classes/{class_id}/gradebook", response_model=GradebookResponse, dependencies=[Depends(conditional_get_async(JournalEntry, Student))])
+async def get_gradebook(
+    class_id: int,
+    subject_id: int,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    current_user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(crud.gradebook_select(class_id, subject_id, date_from, date_to))).all()
+    if not rows and await db.get(Class, class_id) is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    return build_gradebook(class_id, subject_id, rows)
+
+
+students_router = APIRouter(prefix="/students", tags=["entries"])
+
+@students_router.get("/", response_model=List[StudentResponse], dependencies=[Depends(conditional_get_async(Student, Class))])
+async def get_students(response: Response, current_user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(crud.student_rows_select())).all()
+    return fast_json(student_rows(rows), response)
+
+
+subjects_router = APIRouter(prefix="/subjects", tags=["entries"])
+
+@subjects_router.get("/", response_model=List[SubjectResponse], dependencies=[Depends(conditional_get_async(Subject))])
+async def get_subjects(current_user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    subjects = (await db.scalars(crud.subjects_select(current_user.id))).all()
+    return [SubjectResponse(id=s.id, name=s.name) for s in subjects]
+
+
+schedules_router = APIRouter(prefix="/schedules", tags=["schedules"])
+
+@schedules_router.get("/", response_model=List[ScheduleResponse], dependencies=[Depends(conditional_get_async(Schedule, Subject, Class))])
+async def get_my_schedules(response: Response, current_user: CurrentUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(crud.schedule_rows_select(current_user.id))).all()
+    return fast_json(schedule_rows(rows), response)
+
+@schedules_router.get("/class/{class_id}", response_model=List[ScheduleResponse], dependencies=[Depends(conditional_get_async(Schedule, Subject, Class))])
+async def get_class_schedule(
+    class_id: int,
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(crud.schedule_rows_select(current_user.id, class_id))).all()
+    return fast_json(schedule_rows(rows), response)
+
+
+routers = [entries_router, classes_router, students_router, subjects_router, schedules_router]
@@ -0,0 +1,72 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+import changes
+from database import get_db
+from dependencies import get_current_user, CurrentUser
+from serialization import FastJSONResponse, dumps
+from settings import CHANGE_FEED_BATCH
+
+
+# Изменения записей журнала и расписания для клиентов, которые держат данные у себя:
+# вместо повторной загрузки /entries/ клиент получает только изменившиеся id и перечитывает их
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+@router.get("")
+async def get_changes(
+    after: int = Query(0, ge=0),
+    class_id: Optional[int] = None,
+    limit: int = Query(CHANGE_FEED_BATCH, ge=1, le=CHANGE_FEED_BATCH),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # Опрос без постоянного соединения: изменения после seq=after
+    first, last = await run_in_threadpool(changes.seq_bounds)
+    if changes.needs_reset(after, first):
+        return FastJSONResponse({"reset": True, "changes": [], "last_seq": last})
+    # Неполная страница - выдано все до горизонта журнала, следующий опрос продолжит с него
+    rows, horizon = await run_in_threadpool(changes.read_changes, after, class_id, limit)
+    last_seq = rows[-1]["seq"] if len(rows) == limit else max(after, horizon)
+    return FastJSONResponse({"reset": False, "changes": rows, "last_seq": last_seq})
+
+@router.get("/stream")
+async def stream_changes(
+    class_id: Optional[int] = None,
+    after: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Соединение с БД (если get_current_user его брал) возвращаем в пул сразу:
+    # поток может висеть часами, а журнал читает общая задача рассылки
+    db.close()
+
+    # Server-Sent Events: браузер сам переподключается и присылает Last-Event-ID - последний полученный seq
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+    first, last = await run_in_threadpool(changes.seq_bounds)
+    reset = after is not None and changes.needs_reset(after, first)
+    start = last if after is None or reset else after
+
+    async def events():
+        if reset:
+            yield f"id: {start}\nevent: reset\ndata: {{}}\n\n"
+        subscription = changes.broker.subscribe(class_id, start)
+        try:
+            async for change in subscription.events():
+                if change is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"id: {change['seq']}\nevent: change\ndata: {dumps(change).decode()}\n\n"
+        finally:
+            changes.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
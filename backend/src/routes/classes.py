@@ -1,18 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
+import crud
+from conditional import conditional_get
 from database import get_db
-from dependencies import get_current_user
-from models import User, Class, Student
-from schemas import  ClassCreate, ClassResponse, ClassWithStudents, StudentResponse
+from dependencies import get_current_user, CurrentUser
+from gradebook import build_gradebook
+from models import Class, JournalEntry, Student
+from schemas import  ClassCreate, ClassResponse, ClassWithStudents, GradebookResponse, StudentResponse
 
 
 router = APIRouter(prefix="/classes", tags=["entries"])
 @router.post("/", response_model=ClassResponse)
 def create_class(
     class_data: ClassCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     existing_class = db.query(Class).filter(Class.name == class_data.name).first()
@@ -25,34 +29,48 @@ def create_class(
     db.refresh(new_class)
     return new_class
 
-@router.get("/", response_model=List[ClassResponse])
-def get_classes(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/", response_model=List[ClassResponse], dependencies=[Depends(conditional_get(Class))])
+def get_classes(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     classes = db.query(Class).all()
     return classes
 
+# Сетка ученик x урок для экрана журнала: один запрос вместо выгрузки всех записей на клиент
+@router.get("/{class_id}/gradebook", response_model=GradebookResponse, dependencies=[Depends(conditional_get(JournalEntry, Student))])
+def get_gradebook(
+    class_id: int,
+    subject_id: int,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    rows = db.execute(crud.gradebook_select(class_id, subject_id, date_from, date_to)).all()
+    if not rows and db.get(Class, class_id) is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    return build_gradebook(class_id, subject_id, rows)
+
 
 classes_with_students_router = APIRouter(tags=["classes"])
 
+
+def class_with_students_response(class_: Class) -> ClassWithStudents:
+    return ClassWithStudents(
+        id=class_.id,
+        name=class_.name,
+        students=[StudentResponse(
+            id=student.id,
+            first_name=student.first_name,
+            last_name=student.last_name,
+            email=student.email,
+            class_id=student.class_id,
+            class_name=class_.name
+        ) for student in class_.students]
+    )
+
 # Endpoint для получения классов с учениками
-@classes_with_students_router.get("/classes-with-students", response_model=List[ClassWithStudents])
-def get_classes_with_students(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    classes = db.query(Class).all()
+@classes_with_students_router.get("/classes-with-students", response_model=List[ClassWithStudents], dependencies=[Depends(conditional_get(Class, Student))])
+def get_classes_with_students(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    classes = crud.list_classes_with_students(db)
     
-    result = []
-    for class_ in classes:
-        students_list = db.query(Student).filter(Student.class_id == class_.id).all()
-        
-        class_data = ClassWithStudents(
-            id=class_.id,
-            name=class_.name,
-            students=[StudentResponse(
-                id=student.id,
-                first_name=student.first_name,
-                last_name=student.last_name,
-                email=student.email,
-                class_id=student.class_id,
-                class_name=class_.name
-            ) for student in students_list]
-        )
-        result.append(class_data)
-    return result
\ No newline at end of file
+    return [class_with_students_response(class_) for class_ in classes]
\ No newline at end of file
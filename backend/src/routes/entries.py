@@ -1,163 +1,321 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+import base64
+import codecs
+import csv
 import json
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
+import crud
+import history
+from conditional import conditional_get
+from serialization import entry_rows, fast_json
 from database import get_db
-from dependencies import get_current_user
-from models import User, JournalEntry, Subject, Class
-from schemas import JournalEntryCreate, JournalEntryResponse
+from dependencies import get_current_user, CurrentUser
+from models import JournalEntry, JournalEntryHistory, JournalEntrySnapshot, Subject, Class
+from schemas import JournalEntryCreate, JournalEntryResponse, BulkImportResult, BulkRowError, EntryHistoryRecord
+from settings import BULK_CHUNK_SIZE, BULK_MAX_JSON_BYTES, BULK_MAX_ROWS
 router = APIRouter(prefix="/entries", tags=["entries"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(entry: JournalEntry) -> str:
+    # Курсор непрозрачен для клиента: base64 от "date|id" последней записи страницы
+    raw = f"{entry.date.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def entry_response(entry: JournalEntry) -> JournalEntryResponse:
+    # Посещаемость и оценки собираются из attendance_marks/grades, контракт API прежний
+    return JournalEntryResponse(
+        id=entry.id,
+        subject_id=entry.subject_id,
+        subject_name=entry.subject.name if entry.subject else "",
+        class_id=entry.class_id,
+        class_name=entry.class_.name if entry.class_ else "",
+        date=entry.date,
+        topic=entry.topic,
+        attendance=crud.entry_attendance(entry),
+        homework=entry.homework,
+        grades=crud.entry_grades(entry),
+        version=entry.version
+    )
+
+def entry_as_of(db: Session, entry_id: int, as_of: datetime) -> JournalEntryResponse:
+    # Состояние из истории; названия предмета и класса - текущие (предмет мог быть удален позже)
+    try:
+        state = history.state_as_of(db, entry_id, as_of)
+    except history.HistoryCompacted:
+        raise HTTPException(status_code=410, detail="History for this time is no longer available")
+    if state is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    subject = db.get(Subject, state["subject_id"])
+    class_ = db.get(Class, state["class_id"])
+    return JournalEntryResponse(
+        id=entry_id,
+        subject_id=state["subject_id"],
+        subject_name=subject.name if subject else "",
+        class_id=state["class_id"],
+        class_name=class_.name if class_ else "",
+        date=state["date"],
+        topic=state["topic"],
+        attendance=state["attendance"],
+        homework=state["homework"],
+        grades=state["grades"],
+        version=state["version"]
+    )
+
+
 @router.post("/", response_model=JournalEntryResponse)
 def create_entry(
     entry: JournalEntryCreate, 
-    current_user: User = Depends(get_current_user), 
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     try:
         # Проверяем существование предмета и класса
-        subject = db.query(Subject).filter(Subject.id == entry.subject_id).first()
-        if not subject:
+        if not crud.active_subject_ids(db, {entry.subject_id}):
             raise HTTPException(status_code=404, detail="Subject not found")
         
         class_ = db.query(Class).filter(Class.id == entry.class_id).first()
         if not class_:
             raise HTTPException(status_code=404, detail="Class not found")
         
-        # Создаем запись с сериализацией JSON
-        new_entry = JournalEntry(
-            subject_id=entry.subject_id,
-            class_id=entry.class_id,
-            date=entry.date,
-            topic=entry.topic,
-            attendance=json.dumps(entry.attendance) if entry.attendance else None,
-            homework=entry.homework,
-            grades=json.dumps(entry.grades) if entry.grades else None  # ИСПРАВЛЕНО: сериализуем grades
-        )
-        db.add(new_entry)
+        new_entry = crud.create_entry(db, entry, current_user.id)
         db.commit()
-        db.refresh(new_entry)
         
-        # Создаем ответ
-        return JournalEntryResponse(
-            id=new_entry.id,
-            subject_id=new_entry.subject_id,
-            subject_name=subject.name,
-            class_id=new_entry.class_id,
-            class_name=class_.name,
-            date=new_entry.date,
-            topic=new_entry.topic,
-            attendance=json.loads(new_entry.attendance) if new_entry.attendance else {},
-            homework=new_entry.homework,
-            grades=json.loads(new_entry.grades) if new_entry.grades else {}  # ИСПРАВЛЕНО: десериализуем grades
-        )
+        return entry_response(crud.get_entry(db, new_entry.id))
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating entry: {str(e)}")
 
-@router.get("/", response_model=List[JournalEntryResponse])
+async def iter_body_lines(request: Request):
+    # Читаем тело по частям и отдаем строки по мере поступления, не собирая весь текст в одну строку
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+def too_many_rows() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Too many rows, maximum is {BULK_MAX_ROWS}")
+
+async def read_json_body(request: Request) -> bytes:
+    # Размер проверяется по заголовку и по мере чтения (у chunked-запроса заголовка нет)
+    too_large = HTTPException(status_code=413, detail=f"Body too large, maximum is {BULK_MAX_JSON_BYTES} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > BULK_MAX_JSON_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BULK_MAX_JSON_BYTES:
+            raise too_large
+    return bytes(body)
+
+async def iter_csv_records(request: Request):
+    # Запись CSV может занимать несколько строк (перевод строки внутри кавычек); она закончена,
+    # когда число кавычек четное - экранированная кавычка "" четность не меняет
+    record, quotes = "", 0
+    async for line in iter_body_lines(request):
+        record += line
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield record
+            record, quotes = "", 0
+    if record:
+        # Незакрытая кавычка в конце тела: запись разбирается как есть, как в csv.DictReader
+        yield record
+
+async def read_bulk_rows(request: Request):
+    # Поддерживаются JSON-массив, NDJSON (по объекту на строку) и CSV с заголовком.
+    # В CSV колонки attendance и grades содержат JSON-объекты.
+    # NDJSON и CSV читаются построчно, и чтение прерывается на строке BULK_MAX_ROWS + 1
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    rows = []
+
+    if content_type == "application/json":
+        try:
+            data = json.loads(await read_json_body(request))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of entries")
+        if len(data) > BULK_MAX_ROWS:
+            raise too_many_rows()
+        rows = list(enumerate(data, start=1))
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        row = 0
+        async for line in iter_body_lines(request):
+            if not line.strip():
+                continue
+            row += 1
+            if row > BULK_MAX_ROWS:
+                raise too_many_rows()
+            try:
+                rows.append((row, json.loads(line)))
+            except ValueError:
+                rows.append((row, ValueError("Invalid JSON line")))
+    elif content_type == "text/csv":
+        header, row = None, 0
+        async for text in iter_csv_records(request):
+            values = next(csv.reader([text]), [])
+            if not values:
+                continue
+            if header is None:
+                header = values
+                continue
+            row += 1
+            if row > BULK_MAX_ROWS:
+                raise too_many_rows()
+            record = dict(zip(header, values))
+            try:
+                for field in ("attendance", "grades"):
+                    record[field] = json.loads(record[field]) if record.get(field) else {}
+                rows.append((row, record))
+            except ValueError:
+                rows.append((row, ValueError("Invalid JSON in attendance/grades column")))
+    else:
+        raise HTTPException(status_code=415, detail="Supported content types: application/json, application/x-ndjson, text/csv")
+
+    return rows
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_create_entries(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    items = []
+    errors = {}
+    for row, data in await read_bulk_rows(request):
+        if isinstance(data, Exception):
+            errors[row] = str(data)
+            continue
+        try:
+            items.append((row, JournalEntryCreate.model_validate(data)))
+        except ValidationError as e:
+            errors[row] = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+    # Работа с БД синхронная, выполняем ее в пуле потоков
+    created, db_errors = await run_in_threadpool(crud.bulk_create_entries, db, items, BULK_CHUNK_SIZE, current_user.id)
+    errors.update(db_errors)
+
+    return BulkImportResult(
+        created=len(created),
+        failed=len(errors),
+        ids=[created[row] for row in sorted(created)],
+        errors=[BulkRowError(row=row, error=errors[row]) for row in sorted(errors)]
+    )
+
+@router.get("/", response_model=List[JournalEntryResponse], dependencies=[Depends(conditional_get(JournalEntry, Subject, Class))])
 def get_entries(
-    current_user: User = Depends(get_current_user), 
+    response: Response,
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    entries = db.query(JournalEntry).all()
-    result = []
-    
-    for entry in entries:
-        subject_name = entry.subject.name if entry.subject else ""
-        class_name = entry.class_.name if entry.class_ else ""
-        
-        result.append(JournalEntryResponse(
-            id=entry.id,
-            subject_id=entry.subject_id,
-            subject_name=subject_name,
-            class_id=entry.class_id,
-            class_name=class_name,
-            date=entry.date,
-            topic=entry.topic,
-            attendance=json.loads(entry.attendance) if entry.attendance else {},
-            homework=entry.homework,
-            grades=json.loads(entry.grades) if entry.grades else {}  # ИСПРАВЛЕНО: десериализуем grades
-        ))
-    
-    return result
+    after = decode_cursor(cursor) if cursor else None
+
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    rows, attendance, grades = crud.list_entry_rows(
+        db,
+        class_id=class_id,
+        subject_id=subject_id,
+        date_from=date_from,
+        date_to=date_to,
+        after=after,
+        limit=limit + 1
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+
+    return fast_json(entry_rows(rows, attendance, grades), response)
 
-@router.get("/{entry_id}", response_model=JournalEntryResponse)
+@router.get("/{entry_id}", response_model=JournalEntryResponse, dependencies=[Depends(conditional_get(JournalEntry, Subject, Class, JournalEntryHistory, JournalEntrySnapshot))])
 def get_entry(
     entry_id: int, 
-    current_user: User = Depends(get_current_user), 
+    as_of: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    entry = db.query(JournalEntry).filter(JournalEntry.id == entry_id).first()
+    if as_of is not None:
+        return entry_as_of(db, entry_id, as_of)
+    entry = crud.get_entry(db, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    subject_name = entry.subject.name if entry.subject else ""
-    class_name = entry.class_.name if entry.class_ else ""
-    
-    return JournalEntryResponse(
-        id=entry.id,
-        subject_id=entry.subject_id,
-        subject_name=subject_name,
-        class_id=entry.class_id,
-        class_name=class_name,
-        date=entry.date,
-        topic=entry.topic,
-        attendance=json.loads(entry.attendance) if entry.attendance else {},
-        homework=entry.homework,
-        grades=json.loads(entry.grades) if entry.grades else {}  # ИСПРАВЛЕНО: десериализуем grades
-    )
+    return entry_response(entry)
+
+@router.get("/{entry_id}/history", response_model=List[EntryHistoryRecord])
+def get_entry_history(
+    entry_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # История доступна и для удаленной записи
+    if db.get(JournalEntry, entry_id) is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return history.entry_history(db, entry_id)
 
 @router.put("/{entry_id}", response_model=JournalEntryResponse)
 def update_entry(
     entry_id: int, 
     updated_entry: JournalEntryCreate, 
-    current_user: User = Depends(get_current_user), 
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    entry = db.query(JournalEntry).filter(JournalEntry.id == entry_id).first()
+    entry = crud.get_entry(db, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    if entry.subject_id != updated_entry.subject_id and not crud.active_subject_ids(db, {updated_entry.subject_id}):
+        raise HTTPException(status_code=404, detail="Subject not found")
+    try:
+        crud.update_entry(db, entry, updated_entry, current_user.id)
+        db.commit()
+    except StaleDataError:
+        # Запись успели изменить в параллельном запросе (version уже другая)
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Entry was modified concurrently")
     
-    # Обновляем поля
-    entry.subject_id = updated_entry.subject_id
-    entry.class_id = updated_entry.class_id
-    entry.date = updated_entry.date
-    entry.topic = updated_entry.topic
-    entry.attendance = json.dumps(updated_entry.attendance) if updated_entry.attendance else None
-    entry.homework = updated_entry.homework
-    entry.grades = json.dumps(updated_entry.grades) if updated_entry.grades else None  # ИСПРАВЛЕНО: сериализуем grades
-    
-    db.commit()
-    db.refresh(entry)
-    
-    subject_name = entry.subject.name if entry.subject else ""
-    class_name = entry.class_.name if entry.class_ else ""
-    
-    return JournalEntryResponse(
-        id=entry.id,
-        subject_id=entry.subject_id,
-        subject_name=subject_name,
-        class_id=entry.class_id,
-        class_name=class_name,
-        date=entry.date,
-        topic=entry.topic,
-        attendance=json.loads(entry.attendance) if entry.attendance else {},
-        homework=entry.homework,
-        grades=json.loads(entry.grades) if entry.grades else {}  # ИСПРАВЛЕНО: десериализуем grades
-    )
+    return entry_response(crud.get_entry(db, entry_id))
 
 @router.delete("/{entry_id}")
 def delete_entry(
     entry_id: int, 
-    current_user: User = Depends(get_current_user), 
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    entry = db.query(JournalEntry).filter(JournalEntry.id == entry_id).first()
+    entry = crud.get_entry(db, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    db.delete(entry)
+    crud.delete_entry(db, entry, current_user.id)
     db.commit()
     return {"message": "Entry deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Optional
+
+from database import current_sessionmaker
+from dependencies import get_current_user, CurrentUser
+from exporters import NUMERIC_COLUMNS, REPORT_COLUMNS, iter_report_rows, stream_csv, stream_xlsx
+
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def stream_report(report: str, fmt: str, filters: dict):
+    # Своя сессия живет ровно столько, сколько идет выгрузка
+    db = current_sessionmaker()()
+    try:
+        rows = iter_report_rows(db, report, filters)
+        if fmt == "xlsx":
+            yield from stream_xlsx(rows, numeric_columns=NUMERIC_COLUMNS.get(report, ()))
+        else:
+            yield from stream_csv(rows)
+    finally:
+        db.close()
+
+@router.get("/{report}")
+def export_report(
+    report: str,
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if report not in REPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    filters = {"class_id": class_id, "subject_id": subject_id, "date_from": date_from, "date_to": date_to}
+    filename = f"{report}_{datetime.now():%Y%m%d}.{format}"
+    return StreamingResponse(
+        stream_report(report, format, filters),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+
+from database import get_db
+from dependencies import get_current_user, CurrentUser
+from models import ClassMonthlyStats, StudentWeeklyStats
+from rollups import month_start, week_start
+from schemas import ClassMonthlyReport, StudentWeeklyReport
+
+
+# Отчеты об успеваемости и посещаемости читают готовые агрегаты, а не записи журнала
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+
+def rollup_fields(stats) -> dict:
+    return {
+        "subject_id": stats.subject_id,
+        "grade_count": stats.grade_count,
+        "average": round(stats.grade_sum / stats.grade_count, 2) if stats.grade_count else None,
+        "marked": stats.marked,
+        "absences": stats.absences,
+        "lates": stats.lates,
+        "attendance_rate": round(1 - stats.absences / stats.marked, 3) if stats.marked else None
+    }
+
+@router.get("/classes", response_model=List[ClassMonthlyReport])
+def get_class_report(
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Строки, обнулившиеся после удаления записей, в отчет не попадают
+    stmt = (
+        select(ClassMonthlyStats)
+        .where((ClassMonthlyStats.grade_count > 0) | (ClassMonthlyStats.marked > 0))
+        .order_by(ClassMonthlyStats.class_id, ClassMonthlyStats.subject_id, ClassMonthlyStats.month)
+    )
+    if class_id is not None:
+        stmt = stmt.where(ClassMonthlyStats.class_id == class_id)
+    if subject_id is not None:
+        stmt = stmt.where(ClassMonthlyStats.subject_id == subject_id)
+    if date_from is not None:
+        stmt = stmt.where(ClassMonthlyStats.month >= month_start(date_from))
+    if date_to is not None:
+        stmt = stmt.where(ClassMonthlyStats.month <= month_start(date_to))
+
+    return [
+        ClassMonthlyReport(class_id=stats.class_id, month=stats.month, **rollup_fields(stats))
+        for stats in db.scalars(stmt)
+    ]
+
+@router.get("/students/{student_id}", response_model=List[StudentWeeklyReport])
+def get_student_report(
+    student_id: int,
+    subject_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    stmt = (
+        select(StudentWeeklyStats)
+        .where(
+            StudentWeeklyStats.student_id == student_id,
+            (StudentWeeklyStats.grade_count > 0) | (StudentWeeklyStats.marked > 0)
+        )
+        .order_by(StudentWeeklyStats.subject_id, StudentWeeklyStats.week_start)
+    )
+    if subject_id is not None:
+        stmt = stmt.where(StudentWeeklyStats.subject_id == subject_id)
+    if date_from is not None:
+        stmt = stmt.where(StudentWeeklyStats.week_start >= week_start(date_from))
+    if date_to is not None:
+        stmt = stmt.where(StudentWeeklyStats.week_start <= week_start(date_to))
+
+    return [
+        StudentWeeklyReport(student_id=stats.student_id, week_start=stats.week_start, **rollup_fields(stats))
+        for stats in db.scalars(stmt)
+    ]
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database import get_db
+from dependencies import get_current_user, CurrentUser
+from schemas import SearchResult
+from search import SEARCH_KINDS, search
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+# Поиск по ученикам, темам и домашним заданиям, классам и предметам; подходит для подсказок при вводе
+@router.get("/", response_model=List[SearchResult])
+def search_journal(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern=f"^({'|'.join(SEARCH_KINDS)})$"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return [
+        SearchResult(kind=kind_, id=ref_id, title=title, snippet=snippet)
+        for kind_, ref_id, title, snippet, _ in search(db, q, kind, limit)
+    ]
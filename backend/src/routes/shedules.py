@@ -1,25 +1,106 @@
 # routers/schedules.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from datetime import date, timedelta
 from typing import List
 
-from database import get_db
-from dependencies import get_current_user
-from models import User, Schedule, Subject, Class
+import crud
+from changes import change_rows, record_change, record_changes
+from cache import TTLCache
+from conditional import conditional_get, conditional_response, make_etag
+from database import get_db, current_tenant
+from dependencies import get_current_user, CurrentUser
+from models import Schedule, Subject, Class
 from schemas import ScheduleCreate, ScheduleResponse, WeekSchedule, DaySchedule
+from serialization import fast_json, schedule_rows
+from settings import WEEK_CACHE_SIZE, WEEK_CACHE_TTL
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
 
+
+def schedule_response(schedule: Schedule) -> ScheduleResponse:
+    return ScheduleResponse(
+        id=schedule.id,
+        subject_id=schedule.subject_id,
+        subject_name=schedule.subject.name if schedule.subject else "",
+        class_id=schedule.class_id,
+        class_name=schedule.class_.name if schedule.class_ else "",
+        day_of_week=schedule.day_of_week,
+        lesson_number=schedule.lesson_number
+    )
+
+
+# Недельное расписание меняется редко, а читается постоянно, поэтому готовый JSON
+# хранится в кэше по учителю и по классу и сбрасывается при изменении расписания.
+
+DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+week_cache = TTLCache(maxsize=WEEK_CACHE_SIZE, ttl=WEEK_CACHE_TTL)
+
+def current_week_start() -> date:
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+def build_week(schedules, week_start: date) -> WeekSchedule:
+    days = [DaySchedule(day_of_week=i, day_name=name, lessons=[]) for i, name in enumerate(DAY_NAMES)]
+    for schedule in sorted(schedules, key=lambda s: s.lesson_number or 0):
+        if schedule.day_of_week is not None and 0 <= schedule.day_of_week < len(days):
+            days[schedule.day_of_week].lessons.append(schedule_response(schedule))
+    return WeekSchedule(
+        start_date=week_start.isoformat(),
+        end_date=(week_start + timedelta(days=6)).isoformat(),
+        days=days
+    )
+
+def cached_week(key, load_schedules):
+    # id учителей и классов повторяются в разных школах
+    key = (current_tenant.get(), *key)
+    week_start = current_week_start()
+    cached = week_cache.get(key)
+    if cached is not None and cached[0] == week_start:
+        return cached[1], cached[2]
+
+    generation = week_cache.generation
+    body = build_week(load_schedules(), week_start).model_dump_json().encode()
+    etag = make_etag(body)
+    week_cache.set(key, (week_start, body, etag), generation=generation)
+    return body, etag
+
+def invalidate_week(teacher_id: int, *class_ids: int):
+    tenant = current_tenant.get()
+    week_cache.invalidate((tenant, "teacher", teacher_id))
+    for class_id in class_ids:
+        week_cache.invalidate((tenant, "class", class_id))
+
+
+@contextmanager
+def schedule_conflicts_as_400(db: Session):
+    # Уникальные индексы (teacher_id, day_of_week, lesson_number) и (class_id, day_of_week, lesson_number)
+    # отсекают конфликты атомарно, без предварительного SELECT
+    try:
+        yield
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="На это время уже создано расписание"
+        )
+
+
 @router.post("/", response_model=ScheduleResponse)
 def create_schedule(
     schedule: ScheduleCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Проверяем существование предмета
     subject = db.query(Subject).filter(
         Subject.id == schedule.subject_id,
-        Subject.teacher_id == current_user.id
+        Subject.teacher_id == current_user.id,
+        Subject.deleted_at.is_(None)
     ).first()
     if not subject:
         raise HTTPException(status_code=404, detail="Предмета не существует")
@@ -29,21 +110,7 @@ def create_schedule(
     if not class_:
         raise HTTPException(status_code=404, detail="Такого класса не существует")
     
-    # Проверяем, нет ли уже расписания на это время
-    existing_schedule = db.query(Schedule).filter(
-        Schedule.teacher_id == current_user.id,
-        Schedule.day_of_week == schedule.day_of_week,
-        Schedule.lesson_number == schedule.lesson_number,
-        Schedule.class_id == schedule.class_id
-    ).first()
-    
-    if existing_schedule:
-        raise HTTPException(
-            status_code=400,
-            detail="На это время уже создано расписание"
-        )
-    
-    # Создаем расписание
+    # Создаем расписание, конфликты по времени ловит уникальный индекс
     new_schedule = Schedule(
         teacher_id=current_user.id,
         subject_id=schedule.subject_id,
@@ -53,8 +120,12 @@ def create_schedule(
     )
     
     db.add(new_schedule)
-    db.commit()
+    with schedule_conflicts_as_400(db):
+        db.flush()
+        record_change(db, "schedule", new_schedule.id, "create", new_schedule.class_id)
+        db.commit()
     db.refresh(new_schedule)
+    invalidate_week(current_user.id, new_schedule.class_id)
     
     # Создаем ответ
     return ScheduleResponse(
@@ -69,150 +140,148 @@ def create_schedule(
         lesson_number=new_schedule.lesson_number
     )
 
-@router.get("/", response_model=List[ScheduleResponse])
+@router.get("/", response_model=List[ScheduleResponse], dependencies=[Depends(conditional_get(Schedule, Subject, Class))])
 def get_my_schedules(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    schedules = db.query(Schedule).filter(Schedule.teacher_id == current_user.id).all()
-    
-    result = []
-    for schedule in schedules:
-        subject_name = schedule.subject.name if schedule.subject else ""
-        class_name = schedule.class_.name if schedule.class_ else ""
-        teacher_name = current_user.username
-        
-        result.append(ScheduleResponse(
-            id=schedule.id,
-            teacher_id=schedule.teacher_id,
-            teacher_name=teacher_name,
-            subject_id=schedule.subject_id,
-            subject_name=subject_name,
-            class_id=schedule.class_id,
-            class_name=class_name,
-            day_of_week=schedule.day_of_week,
-            lesson_number=schedule.lesson_number
-        ))
+    rows = db.execute(crud.schedule_rows_select(current_user.id)).all()
     
-    return result
+    return fast_json(schedule_rows(rows), response)
 
 @router.get("/week", response_model=WeekSchedule)
 def get_week_schedule(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    schedules = db.query(Schedule).filter(Schedule.teacher_id == current_user.id).all()
-    
-    # Создаем структуру недельного расписания
-    week_schedule = WeekSchedule(
-        monday=DaySchedule(lessons=[]),
-        tuesday=DaySchedule(lessons=[]),
-        wednesday=DaySchedule(lessons=[]),
-        thursday=DaySchedule(lessons=[]),
-        friday=DaySchedule(lessons=[]),
-        saturday=DaySchedule(lessons=[]),
-        sunday=DaySchedule(lessons=[])
-    )
-    
-    days_mapping = {
-        0: week_schedule.monday.lessons,
-        1: week_schedule.tuesday.lessons,
-        2: week_schedule.wednesday.lessons,
-        3: week_schedule.thursday.lessons,
-        4: week_schedule.friday.lessons,
-        5: week_schedule.saturday.lessons,
-        6: week_schedule.sunday.lessons
-    }
-    
-    for schedule in schedules:
-        subject_name = schedule.subject.name if schedule.subject else ""
-        class_name = schedule.class_.name if schedule.class_ else ""
-        
-        schedule_response = ScheduleResponse(
-            id=schedule.id,
-            teacher_id=schedule.teacher_id,
-            teacher_name=current_user.username,
-            subject_id=schedule.subject_id,
-            subject_name=subject_name,
-            class_id=schedule.class_id,
-            class_name=class_name,
-            day_of_week=schedule.day_of_week,
-            lesson_number=schedule.lesson_number
-        )
-        
-        if schedule.day_of_week in days_mapping:
-            days_mapping[schedule.day_of_week].append(schedule_response)
-    
-    # Сортируем уроки по номеру для каждого дня
-    for day_lessons in days_mapping.values():
-        day_lessons.sort(key=lambda x: x.lesson_number)
-    
-    return week_schedule
+    body, etag = cached_week(("teacher", current_user.id), lambda: crud.list_schedules(db, current_user.id))
+    return conditional_response(request, body, etag)
+
+@router.get("/class/{class_id}/week", response_model=WeekSchedule)
+def get_class_week_schedule(
+    class_id: int,
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    body, etag = cached_week(("class", class_id), lambda: crud.list_class_schedules(db, class_id))
+    return conditional_response(request, body, etag)
 
-@router.get("/class/{class_id}", response_model=List[ScheduleResponse])
+@router.get("/class/{class_id}", response_model=List[ScheduleResponse], dependencies=[Depends(conditional_get(Schedule, Subject, Class))])
 def get_class_schedule(
     class_id: int,
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    schedules = db.query(Schedule).filter(
-        Schedule.teacher_id == current_user.id,
-        Schedule.class_id == class_id
-    ).all()
-    
-    result = []
-    for schedule in schedules:
-        subject_name = schedule.subject.name if schedule.subject else ""
-        class_name = schedule.class_.name if schedule.class_ else ""
-        
-        result.append(ScheduleResponse(
-            id=schedule.id,
-            teacher_id=schedule.teacher_id,
-            teacher_name=current_user.username,
-            subject_id=schedule.subject_id,
-            subject_name=subject_name,
-            class_id=schedule.class_id,
-            class_name=class_name,
-            day_of_week=schedule.day_of_week,
-            lesson_number=schedule.lesson_number
-        ))
+    rows = db.execute(crud.schedule_rows_select(current_user.id, class_id)).all()
     
-    return result
+    return fast_json(schedule_rows(rows), response)
+
+@router.put("/bulk", response_model=List[ScheduleResponse])
+def replace_week_schedule(
+    lessons: List[ScheduleCreate],
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Заменяет всю неделю учителя одной транзакцией.
+    # Все проверки делаются в памяти по сетке день×урок, к БД - фиксированное число запросов.
+    subject_ids = {lesson.subject_id for lesson in lessons}
+    class_ids = {lesson.class_id for lesson in lessons}
+    subjects = {
+        subject.id: subject for subject in db.scalars(
+            select(Subject).where(Subject.id.in_(subject_ids), Subject.teacher_id == current_user.id, Subject.deleted_at.is_(None))
+        )
+    } if subject_ids else {}
+    classes = {
+        class_.id: class_ for class_ in db.scalars(select(Class).where(Class.id.in_(class_ids)))
+    } if class_ids else {}
+
+    # Занятые слоты классов у других учителей
+    class_grid = {
+        (class_id, day, number): teacher_id for class_id, day, number, teacher_id in db.execute(
+            select(Schedule.class_id, Schedule.day_of_week, Schedule.lesson_number, Schedule.teacher_id)
+            .where(Schedule.class_id.in_(class_ids), Schedule.teacher_id != current_user.id)
+        )
+    } if class_ids else {}
+    teacher_grid = {}
+
+    errors = []
+    for index, lesson in enumerate(lessons):
+        slot = (lesson.day_of_week, lesson.lesson_number)
+        if lesson.subject_id not in subjects:
+            errors.append({"index": index, "error": "Предмета не существует"})
+        elif lesson.class_id not in classes:
+            errors.append({"index": index, "error": "Такого класса не существует"})
+        elif not 0 <= lesson.day_of_week < len(DAY_NAMES) or lesson.lesson_number < 1:
+            errors.append({"index": index, "error": "Неверный день недели или номер урока"})
+        elif slot in teacher_grid:
+            errors.append({"index": index, "error": f"Пересекается с уроком {teacher_grid[slot]}"})
+        elif (lesson.class_id, *slot) in class_grid:
+            errors.append({"index": index, "error": "У класса на это время урок другого учителя"})
+        else:
+            teacher_grid[slot] = index
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
 
-@router.get("/{schedule_id}", response_model=ScheduleResponse)
+    old_schedules = db.execute(
+        select(Schedule.id, Schedule.class_id).where(Schedule.teacher_id == current_user.id)
+    ).all()
+    old_class_ids = {class_id for _, class_id in old_schedules}
+    db.execute(delete(Schedule).where(Schedule.teacher_id == current_user.id))
+    with schedule_conflicts_as_400(db):
+        new_ids = db.scalars(
+            insert(Schedule).returning(Schedule.id, sort_by_parameter_order=True),
+            [{
+                "teacher_id": current_user.id,
+                "subject_id": lesson.subject_id,
+                "class_id": lesson.class_id,
+                "day_of_week": lesson.day_of_week,
+                "lesson_number": lesson.lesson_number
+            } for lesson in lessons]
+        ).all() if lessons else []
+        # Неделя заменяется целиком: для ленты изменений это удаление старых уроков и создание новых
+        rows = []
+        for schedule_id, class_id in old_schedules:
+            rows += change_rows("schedule", schedule_id, "delete", class_id)
+        for schedule_id, lesson in zip(new_ids, lessons):
+            rows += change_rows("schedule", schedule_id, "create", lesson.class_id)
+        record_changes(db, rows)
+        db.commit()
+    invalidate_week(current_user.id, *(old_class_ids | class_ids))
+
+    return sorted((
+        ScheduleResponse(
+            id=schedule_id,
+            subject_id=lesson.subject_id,
+            subject_name=subjects[lesson.subject_id].name,
+            class_id=lesson.class_id,
+            class_name=classes[lesson.class_id].name,
+            day_of_week=lesson.day_of_week,
+            lesson_number=lesson.lesson_number
+        ) for schedule_id, lesson in zip(new_ids, lessons)
+    ), key=lambda s: (s.day_of_week, s.lesson_number))
+
+@router.get("/{schedule_id}", response_model=ScheduleResponse, dependencies=[Depends(conditional_get(Schedule, Subject, Class))])
 def get_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    schedule = db.query(Schedule).filter(
-        Schedule.id == schedule_id,
-        Schedule.teacher_id == current_user.id
-    ).first()
+    schedule = crud.get_schedule(db, schedule_id, current_user.id)
     
     if not schedule:
         raise HTTPException(status_code=404, detail="Расписание не найдено")
     
-    subject_name = schedule.subject.name if schedule.subject else ""
-    class_name = schedule.class_.name if schedule.class_ else ""
-    
-    return ScheduleResponse(
-        id=schedule.id,
-        teacher_id=schedule.teacher_id,
-        teacher_name=current_user.username,
-        subject_id=schedule.subject_id,
-        subject_name=subject_name,
-        class_id=schedule.class_id,
-        class_name=class_name,
-        day_of_week=schedule.day_of_week,
-        lesson_number=schedule.lesson_number
-    )
+    return schedule_response(schedule)
 
 @router.put("/{schedule_id}", response_model=ScheduleResponse)
 def update_schedule(
     schedule_id: int,
     updated_schedule: ScheduleCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     schedule = db.query(Schedule).filter(
@@ -226,7 +295,8 @@ def update_schedule(
     # Проверяем существование предмета
     subject = db.query(Subject).filter(
         Subject.id == updated_schedule.subject_id,
-        Subject.teacher_id == current_user.id
+        Subject.teacher_id == current_user.id,
+        Subject.deleted_at.is_(None)
     ).first()
     if not subject:
         raise HTTPException(status_code=404, detail="Предмет существует")
@@ -236,29 +306,19 @@ def update_schedule(
     if not class_:
         raise HTTPException(status_code=404, detail="Класс не найден")
     
-    # Проверяем конфликты расписания (исключая текущую запись)
-    existing_schedule = db.query(Schedule).filter(
-        Schedule.teacher_id == current_user.id,
-        Schedule.day_of_week == updated_schedule.day_of_week,
-        Schedule.lesson_number == updated_schedule.lesson_number,
-        Schedule.class_id == updated_schedule.class_id,
-        Schedule.id != schedule_id
-    ).first()
-    
-    if existing_schedule:
-        raise HTTPException(
-            status_code=400,
-            detail="Schedule already exists for this time and class"
-        )
-    
-    # Обновляем расписание
+    # Обновляем расписание, конфликты по времени ловит уникальный индекс
+    previous_class_id = schedule.class_id
     schedule.subject_id = updated_schedule.subject_id
     schedule.class_id = updated_schedule.class_id
     schedule.day_of_week = updated_schedule.day_of_week
     schedule.lesson_number = updated_schedule.lesson_number
     
-    db.commit()
+    with schedule_conflicts_as_400(db):
+        db.flush()
+        record_change(db, "schedule", schedule.id, "update", schedule.class_id, previous_class_id=previous_class_id)
+        db.commit()
     db.refresh(schedule)
+    invalidate_week(current_user.id, previous_class_id, schedule.class_id)
     
     return ScheduleResponse(
         id=schedule.id,
@@ -275,7 +335,7 @@ def update_schedule(
 @router.delete("/{schedule_id}")
 def delete_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     schedule = db.query(Schedule).filter(
@@ -286,7 +346,10 @@ def delete_schedule(
     if not schedule:
         raise HTTPException(status_code=404, detail="Расписание не найдено")
     
+    class_id = schedule.class_id
+    record_change(db, "schedule", schedule.id, "delete", class_id)
     db.delete(schedule)
     db.commit()
+    invalidate_week(current_user.id, class_id)
     
     return {"message": "Удалено"}
\ No newline at end of file
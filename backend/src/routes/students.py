@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List
 
+import crud
+from conditional import conditional_get
 from database import get_db
-from dependencies import get_current_user
-from models import User, Class, Student
+from dependencies import get_current_user, CurrentUser
+from models import Class, Student
 from schemas import  StudentCreate, StudentResponse
+from serialization import fast_json, student_rows
 
 
 router = APIRouter(prefix="/students", tags=["entries"])
@@ -14,7 +17,7 @@ router = APIRouter(prefix="/students", tags=["entries"])
 @router.post("/", response_model=StudentResponse)
 def create_student(
     student: StudentCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     class_ = db.query(Class).filter(Class.id == student.class_id).first()
@@ -43,27 +46,12 @@ def create_student(
     )
     return student_response
 
-@router.get("/", response_model=List[StudentResponse])
+@router.get("/", response_model=List[StudentResponse], dependencies=[Depends(conditional_get(Student, Class))])
 def get_students(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    students = db.query(Student).all()
+    rows = db.execute(crud.student_rows_select()).all()
     
-    result = []
-    for student in students:
-        class_name = ""
-        if student.class_id:
-            class_ = db.query(Class).filter(Class.id == student.class_id).first()
-            class_name = class_.name if class_ else ""
-        
-        student_response = StudentResponse(
-            id=student.id,
-            first_name=student.first_name,
-            last_name=student.last_name,
-            email=student.email,
-            class_id=student.class_id,
-            class_name=class_name
-        )
-        result.append(student_response)
-    return result
\ No newline at end of file
+    return fast_json(student_rows(rows), response)
\ No newline at end of file
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List
 
+import crud
+from conditional import conditional_get
 from database import get_db
-from dependencies import get_current_user
-from models import User, Subject
+from dependencies import get_current_user, CurrentUser
+from models import Subject
 from schemas import  SubjectCreate, SubjectResponse
+from routes.shedules import week_cache
 
 
 router = APIRouter(prefix="/subjects", tags=["entries"])
@@ -14,12 +18,13 @@ router = APIRouter(prefix="/subjects", tags=["entries"])
 @router.post("/", response_model=SubjectResponse)
 def create_subject(
     subject: SubjectCreate, 
-    current_user: User = Depends(get_current_user), 
+    current_user: CurrentUser = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     existing_subject = db.query(Subject).filter(
         Subject.name == subject.name,
-        Subject.teacher_id == current_user.id
+        Subject.teacher_id == current_user.id,
+        Subject.deleted_at.is_(None)
     ).first()
     
     if existing_subject:
@@ -38,28 +43,32 @@ def create_subject(
         teacher_id=new_subject.teacher_id
     )
 
-@router.get("/", response_model=List[SubjectResponse])
+@router.get("/", response_model=List[SubjectResponse], dependencies=[Depends(conditional_get(Subject))])
 def get_subjects(
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    subjects = db.query(Subject).filter(Subject.teacher_id == current_user.id).all()
+    subjects = db.scalars(crud.subjects_select(current_user.id)).all()
     return [SubjectResponse(id=s.id, name=s.name, teacher_id=s.teacher_id) for s in subjects]
 
 @router.delete("/{subject_id}")
 def delete_subject(
     subject_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     subject = db.query(Subject).filter(
         Subject.id == subject_id,
-        Subject.teacher_id == current_user.id
+        Subject.teacher_id == current_user.id,
+        Subject.deleted_at.is_(None)
     ).first()
     
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
-    db.delete(subject)
+    # Мягкое удаление: записи журнала и их история по-прежнему ссылаются на предмет
+    subject.deleted_at = datetime.utcnow()
     db.commit()
+    # Название предмета есть в кэшированных неделях
+    week_cache.clear()
     return {"message": "Subject deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+import sync
+from database import get_db
+from dependencies import get_current_user, CurrentUser
+from schemas import SyncRequest, SyncResponse
+from serialization import fast_json
+from settings import SYNC_MAX_OPERATIONS
+
+
+# Пакетная синхронизация для клиентов без стабильной сети (подробнее - в sync.py)
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.post("", response_model=SyncResponse)
+def sync_journal(
+    request: SyncRequest,
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if len(request.operations) > SYNC_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"Too many operations, maximum is {SYNC_MAX_OPERATIONS}")
+
+    # Токен проверяется до применения операций: с устаревшим токеном пакет не применяется
+    after = sync.parse_since(db, request.since)
+    try:
+        results, conflicts = sync.apply_operations(db, current_user.id, request.operations)
+        db.commit()
+    except StaleDataError:
+        # Запись изменили между чтением и записью пакета; пакет не применен, повтор безопасен
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Entry was modified concurrently, retry sync")
+    except IntegrityError:
+        # Тот же пакет уже применяется параллельным запросом (повтор после таймаута)
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Operations are being applied by another request, retry sync")
+
+    delta = sync.changes_since(db, after, request.class_id, conflicts)
+    return fast_json({"results": [result.model_dump() for result in results], **delta}, response)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from services import get_password_hash
 from database import get_db
-from dependencies import get_current_user
+from dependencies import get_current_user, CurrentUser
 from models import User
 from schemas import  UserCreate, UserResponse
 from fastapi.security import OAuth2PasswordRequestForm
@@ -56,7 +56,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     }
 
 @router.get("/users/me/", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return UserResponse(
         id=current_user.id,
         username=current_user.username,
@@ -0,0 +1,60 @@
+import logging
+import threading
+
+from database import current_sessionmaker
+from tenants import job_tenants, tenant_context
+
+
+logger = logging.getLogger(__name__)
+
+
+# Периодические задачи в фоновом потоке процесса. Обработчики запросов их не ждут:
+# задача берет свою сессию БД, ошибки пишутся в лог и не останавливают цикл.
+# При нескольких процессах сервера задачи стоит включать только в одном (ALERTS_ENABLED).
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
+        self._stop = threading.Event()
+        self._threads = []
+
+    def add_job(self, func, interval: float):
+        # func(db) получает новую сессию на каждый запуск
+        self.jobs.append((func, interval))
+
+    def _run(self, func, interval: float):
+        while not self._stop.wait(interval):
+            # При TENANCY=1 задача выполняется по очереди для каждой школы, ошибка одной не мешает остальным
+            for tenant in job_tenants():
+                with tenant_context(tenant):
+                    self._run_once(func, tenant)
+
+    def _run_once(self, func, tenant):
+        try:
+            db = current_sessionmaker()()
+        except Exception:
+            logger.exception("Background job %s: cannot open database (school: %s)", func.__name__, tenant)
+            return
+        try:
+            func(db)
+        except Exception:
+            db.rollback()
+            logger.exception("Background job %s failed (school: %s)", func.__name__, tenant)
+        finally:
+            db.close()
+
+    def start(self):
+        self._stop.clear()
+        for func, interval in self.jobs:
+            thread = threading.Thread(target=self._run, args=(func, interval), name=func.__name__, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+
+
+scheduler = Scheduler()
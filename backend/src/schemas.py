@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import List, Literal, Optional, Dict, Any
 
 class ClassCreate(BaseModel):
     name: str
@@ -25,6 +25,9 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes  = True
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class SubjectCreate(BaseModel):
     name: str
 
@@ -40,9 +43,9 @@ class JournalEntryCreate(BaseModel):
     class_id: int
     date: datetime
     topic: str
-    attendance: Dict[str, str] = {}  # Значение по умолчанию
+    attendance: Dict[int, str] = {}  # student_id -> статус
     homework: str
-    grades: Dict[str, Any] = {}      # Значение по умолчанию
+    grades: Dict[int, Any] = {}      # student_id -> {"grade": ..., "comment": ...}
 
     
 class JournalEntryResponse(BaseModel):
@@ -56,10 +59,55 @@ class JournalEntryResponse(BaseModel):
     grades: Dict[str, Any]
     subject_name: Optional[str] = None
     class_name: Optional[str] = None
+    version: int = 1
 
     class Config:
         from_attributes = True
 
+class EntryHistoryRecord(BaseModel):
+    version: int
+    action: str  # create / update / delete; snapshot - свернутое состояние на конец месяца
+    changed_by: Optional[int] = None
+    changed_at: datetime
+    changes: Dict[str, Any]  # изменившиеся поля; в attendance/grades null - отметку убрали
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    ids: List[int] = []
+    errors: List[BulkRowError] = []
+
+# Офлайн-синхронизация (sync.py): операции клиента и ответ с изменениями сервера
+class SyncOperationRequest(BaseModel):
+    key: str = Field(min_length=1, max_length=128)  # ключ идемпотентности, создается клиентом
+    op: Literal["create", "update", "delete"]
+    entry_id: Optional[int] = None
+    base_version: Optional[int] = None  # версия записи, которую изменял клиент
+    entry: Optional[JournalEntryCreate] = None
+
+class SyncOperationResult(BaseModel):
+    key: str
+    status: str  # applied / conflict / not_found / invalid
+    entry_id: Optional[int] = None
+    version: Optional[int] = None
+    error: Optional[str] = None
+
+class SyncRequest(BaseModel):
+    operations: List[SyncOperationRequest] = []
+    since: Optional[str] = None  # токен из прошлого ответа; без него - все записи
+    class_id: Optional[int] = None
+
+class SyncResponse(BaseModel):
+    results: List[SyncOperationResult]
+    changes: List[JournalEntryResponse]
+    deleted: List[int]
+    token: str
+    has_more: bool = False
+
 class StudentCreate(BaseModel):
     first_name: str
     last_name: str
@@ -85,6 +133,29 @@ class ClassWithStudents(BaseModel):
     class Config:
         from_attributes = True
 
+# Журнал класса в колоночном виде: grades[i][j] и attendance[i][j] - ученик students.id[i] на уроке lessons.id[j]
+class GradebookStudents(BaseModel):
+    id: List[int]
+    name: List[str]
+
+class GradebookLessons(BaseModel):
+    id: List[int]
+    date: List[datetime]
+
+class GradebookStats(BaseModel):
+    average: List[Optional[float]]
+    count: List[int]
+    attendance_rate: List[Optional[float]]
+
+class GradebookResponse(BaseModel):
+    class_id: int
+    subject_id: int
+    students: GradebookStudents
+    lessons: GradebookLessons
+    grades: List[List[Optional[str]]]
+    attendance: List[List[Optional[str]]]
+    stats: GradebookStats
+
 class StudentWithSubjects(BaseModel):
     id: int
     first_name: str
@@ -123,4 +194,28 @@ class DaySchedule(BaseModel):
 class WeekSchedule(BaseModel):
     start_date: str
     end_date: str
-    days: List[DaySchedule] = []
\ No newline at end of file
+    days: List[DaySchedule] = []
+
+# Отчеты по агрегатам (rollups.py)
+class RollupReport(BaseModel):
+    subject_id: int
+    grade_count: int
+    average: Optional[float] = None
+    marked: int
+    absences: int
+    lates: int
+    attendance_rate: Optional[float] = None
+
+class ClassMonthlyReport(RollupReport):
+    class_id: int
+    month: date
+
+class StudentWeeklyReport(RollupReport):
+    student_id: int
+    week_start: date
+
+class SearchResult(BaseModel):
+    kind: str  # student / entry / class / subject
+    id: int
+    title: str
+    snippet: str
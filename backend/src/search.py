@@ -0,0 +1,212 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import and_, bindparam, event, func, literal, select, text, union_all
+from sqlalchemy.orm import Session
+
+from models import Base, Student, JournalEntry, Class, Subject
+
+
+# Полнотекстовый поиск по ученикам, темам и домашним заданиям, классам и предметам.
+# SQLite: FTS5-таблица search_index, синхронизируется триггерами. rowid = id * 4 + код типа,
+# поэтому триггер удаляет строку индекса по rowid без сканирования.
+# PostgreSQL: триграммные и tsvector-индексы по выражениям (миграция f7b2d4e9a1c3), триггеры не нужны.
+
+SEARCH_KINDS = {"student": 0, "entry": 1, "class": 2, "subject": 3}
+
+# Источники индекса: тип, таблица, выражения для title и body
+SEARCH_SOURCES = [
+    ("student", "students", "coalesce({t}.last_name, '') || ' ' || coalesce({t}.first_name, '')", "coalesce({t}.email, '')"),
+    ("entry", "journal_entries", "coalesce({t}.topic, '')", "coalesce({t}.homework, '')"),
+    ("class", "classes", "coalesce({t}.name, '')", "''"),
+    ("subject", "subjects", "coalesce({t}.name, '')", "''"),
+]
+
+# Таблицы с мягким удалением: удаленные строки в индекс не попадают
+SOFT_DELETE_TABLES = {"journal_entries", "subjects"}
+
+def active_condition(table: str, alias: str) -> str:
+    return f" WHERE {alias}.deleted_at IS NULL" if table in SOFT_DELETE_TABLES else ""
+
+# Токенизатор unicode61 не считает ё вариантом е, поэтому ё заменяется и в индексе, и в запросе
+def fold_yo(expression: str) -> str:
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+def sqlite_search_ddl() -> List[str]:
+    statements = [
+        # prefix='2 3' - отдельные индексы префиксов для подсказок при вводе;
+        # unicode61 без диакритики: регистр и ё/е не важны, в том числе для кириллицы
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    ]
+    for kind, table, title, body in SEARCH_SOURCES:
+        code = SEARCH_KINDS[kind]
+        insert = (
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT new.id * 4 + {code}, '{kind}', new.id, "
+            f"{fold_yo(title.format(t='new'))}, {fold_yo(body.format(t='new'))}"
+            f"{active_condition(table, 'new')};"
+        )
+        remove = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN {remove} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {remove} END",
+        ]
+    return statements
+
+def sqlite_search_rebuild() -> List[str]:
+    statements = ["DELETE FROM search_index"]
+    for kind, table, title, body in SEARCH_SOURCES:
+        statements.append(
+            f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT id * 4 + {SEARCH_KINDS[kind]}, '{kind}', id, "
+            f"{fold_yo(title.format(t=table))}, {fold_yo(body.format(t=table))} FROM {table}"
+            f"{active_condition(table, table)}"
+        )
+    return statements
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    # create_all создает индекс вместе с таблицами и заполняет его, если индекса еще не было
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'search_index'").first()
+    if exists:
+        return
+    for statement in sqlite_search_ddl() + sqlite_search_rebuild():
+        connection.exec_driver_sql(statement)
+
+
+# Совпадение в названии весит больше, чем в тексте (веса столбцов kind, ref_id, title, body)
+SEARCH_RANK = "bm25(search_index, 0.0, 0.0, 10.0, 1.0)"
+
+# Ранжирование bm25 стоит пропорционально числу совпадений. Для частых коротких префиксов
+# ранжируются только RANK_CANDIDATES самых новых совпадений (по rowid FTS5 ищет без перебора).
+# Ограничение действует отдельно для каждого типа: иначе тысячи новых записей журнала вытеснили бы
+# учеников, классы и предметы (у них маленькие id) еще до ранжирования.
+RANK_CANDIDATES = 300
+
+def search_terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower().replace("ё", "е"))
+
+def make_snippet(title: str, body: str, terms: List[str], width: int = 80) -> str:
+    # Фрагмент текста вокруг первого найденного слова; если слово только в названии - само название
+    folded = (body or "").lower()
+    positions = [i for i in (folded.find(term) for term in terms) if i >= 0]
+    if not positions:
+        return title
+    start = max(min(positions) - width // 4, 0)
+    return ("…" if start else "") + body[start:start + width] + ("…" if start + width < len(body) else "")
+
+def rowid_ceilings(db: Session) -> dict:
+    # Наибольший rowid каждого типа: поиск учеников, классов и предметов (у них маленькие id)
+    # не перебирает совпадения среди более новых записей журнала
+    tables = {kind: table for kind, table, _, _ in SEARCH_SOURCES}
+    row = db.execute(text("SELECT " + ", ".join(f"(SELECT max(id) FROM {tables[kind]})" for kind in SEARCH_KINDS))).one()
+    return {kind: None if max_id is None else max_id * 4 + code for (kind, code), max_id in zip(SEARCH_KINDS.items(), row)}
+
+def kind_filter(kind: str) -> str:
+    # Тип проверяется по rowid (id * 4 + код): столбец kind пришлось бы читать для каждого совпадения
+    return f"search_index MATCH :match AND rowid <= :ceiling_{kind} AND rowid % 4 = {SEARCH_KINDS[kind]}"
+
+def search_sqlite(db: Session, terms: List[str], kind: Optional[str], limit: int):
+    # Каждое слово ищется как префикс, все слова должны встретиться ("иван пет" найдет "Петров Иван")
+    ceilings = rowid_ceilings(db)
+    kinds = [k for k in ([kind] if kind else SEARCH_KINDS) if ceilings[k] is not None]
+    if not kinds:
+        return []
+    params = {"match": " ".join(f'"{term}"*' for term in terms), "limit": limit, "offset": RANK_CANDIDATES - 1}
+    params.update((f"ceiling_{k}", ceilings[k]) for k in kinds)
+    where = {k: kind_filter(k) for k in kinds}
+
+    # Нижняя граница кандидатов - отдельно для каждого типа, всё одним запросом. Тип, у которого
+    # строк меньше RANK_CANDIDATES, ранжируется целиком
+    large = [k for k in kinds if ceilings[k] // 4 >= RANK_CANDIDATES]
+    if large:
+        floors = db.execute(text("SELECT " + ", ".join(
+            f"(SELECT rowid FROM search_index WHERE {where[k]} ORDER BY rowid DESC LIMIT 1 OFFSET :offset)" for k in large
+        )), params).one()
+        for k, floor in zip(large, floors):
+            if floor is not None:
+                where[k] += f" AND rowid >= :floor_{k}"
+                params[f"floor_{k}"] = floor
+
+    # bm25 считается по статистике всего индекса, поэтому оценки разных типов сравнимы.
+    # При сортировке хранятся только rowid и оценка; текст читается потом для найденных строк
+    ranked = db.execute(text(" UNION ALL ".join(
+        f"SELECT * FROM (SELECT rowid, {SEARCH_RANK} AS score FROM search_index WHERE {where[k]} ORDER BY score LIMIT :limit)"
+        for k in kinds
+    ) + " ORDER BY score LIMIT :limit"), params).all()
+    if not ranked:
+        return []
+    rows = {
+        row.rowid: row
+        for row in db.execute(
+            text("SELECT rowid, kind, ref_id, title, body FROM search_index WHERE rowid IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": [rowid for rowid, _ in ranked]}
+        )
+    }
+    return [
+        (rows[rowid].kind, rows[rowid].ref_id, rows[rowid].title,
+         make_snippet(rows[rowid].title, rows[rowid].body, terms), score)
+        for rowid, score in ranked
+    ]
+
+def fold_yo_expression(expression):
+    # fold_yo для выражений SQLAlchemy; индексы PostgreSQL построены по тем же выражениям (миграция c2e7a9d4f1b6)
+    return func.replace(func.replace(expression, "ё", "е"), "Ё", "Е")
+
+def like_patterns(terms: List[str]) -> List[str]:
+    # Подчеркивание входит в \w, а в LIKE это подстановочный символ
+    return ["%" + term.replace("_", "\\_") + "%" for term in terms]
+
+def contains_all(expression, terms: List[str]):
+    # Каждое слово - отдельное условие, порядок слов не важен ("иван пет" найдет "Петров Иван")
+    return and_(*(expression.ilike(pattern, escape="\\") for pattern in like_patterns(terms)))
+
+def postgresql_search_select(terms: List[str], kind: Optional[str], limit: int):
+    phrase = " ".join(terms)
+    tsquery = func.to_tsquery("russian", " & ".join(f"{term}:*" for term in terms))
+    student_name = func.coalesce(Student.last_name, "") + " " + func.coalesce(Student.first_name, "")
+    student_key = fold_yo_expression(student_name)
+    class_key = fold_yo_expression(Class.name)
+    subject_key = fold_yo_expression(Subject.name)
+    entry_text = func.to_tsvector(
+        "russian", fold_yo_expression(func.coalesce(JournalEntry.topic, "") + " " + func.coalesce(JournalEntry.homework, ""))
+    )
+
+    queries = {
+        "student": select(
+            literal("student").label("kind"), Student.id, student_name, func.coalesce(Student.email, ""),
+            (-func.similarity(student_key, phrase)).label("rank")
+        ).where(contains_all(student_key, terms)),
+        "entry": select(
+            literal("entry").label("kind"), JournalEntry.id, func.coalesce(JournalEntry.topic, ""),
+            func.left(func.coalesce(JournalEntry.homework, ""), 200), (-func.ts_rank(entry_text, tsquery)).label("rank")
+        ).where(entry_text.op("@@")(tsquery), JournalEntry.deleted_at.is_(None)),
+        "class": select(
+            literal("class").label("kind"), Class.id, Class.name, literal(""),
+            (-func.similarity(class_key, phrase)).label("rank")
+        ).where(contains_all(class_key, terms)),
+        "subject": select(
+            literal("subject").label("kind"), Subject.id, Subject.name, literal(""),
+            (-func.similarity(subject_key, phrase)).label("rank")
+        ).where(contains_all(subject_key, terms), Subject.deleted_at.is_(None)),
+    }
+    selected = [queries[kind]] if kind else list(queries.values())
+    combined = union_all(*selected).subquery()
+    return select(combined).order_by(combined.c.rank).limit(limit)
+
+def search_postgresql(db: Session, terms: List[str], kind: Optional[str], limit: int):
+    return db.execute(postgresql_search_select(terms, kind, limit)).all()
+
+def search(db: Session, q: str, kind: Optional[str] = None, limit: int = 20):
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        return search_postgresql(db, terms, kind, limit)
+    return search_sqlite(db, terms, kind, limit)
@@ -0,0 +1,93 @@
+import json
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List
+
+from fastapi import Response
+
+from crud import grade_info
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Быстрые ответы для больших списков: строки собираются сразу из кортежей SQL-результата
+# и сериализуются orjson без второй проверки через response_model. Данные берутся из своей БД,
+# поэтому проверка не нужна; формат совпадает со схемами *Response (их поля и порядок ключей).
+# Без orjson работает стандартный json, медленнее, но с тем же результатом.
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def fast_json(content: Any, response: Response) -> FastJSONResponse:
+    # Возвращенный Response FastAPI отдает как есть, поэтому заголовки, выставленные
+    # обработчиком и зависимостями (ETag, X-Next-Cursor), переносим сами
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+
+def entry_rows(rows, attendance_rows, grade_rows) -> List[Dict[str, Any]]:
+    attendance = defaultdict(dict)
+    for entry_id, student_id, status in attendance_rows:
+        attendance[entry_id][str(student_id)] = status
+    grades = defaultdict(dict)
+    for entry_id, student_id, value, comment, kind in grade_rows:
+        grades[entry_id][str(student_id)] = grade_info(value, comment, kind)
+    return [
+        {
+            "id": row.id,
+            "subject_id": row.subject_id,
+            "class_id": row.class_id,
+            "date": row.date,
+            "topic": row.topic,
+            "attendance": attendance.get(row.id, {}),
+            "homework": row.homework,
+            "grades": grades.get(row.id, {}),
+            "subject_name": row.subject_name or "",
+            "class_name": row.class_name or "",
+            "version": row.version,
+        }
+        for row in rows
+    ]
+
+def student_rows(rows) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "email": row.email,
+            "class_id": row.class_id,
+            "class_name": row.class_name or "",
+        }
+        for row in rows
+    ]
+
+def schedule_rows(rows) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": row.id,
+            "class_id": row.class_id,
+            "subject_id": row.subject_id,
+            "day_of_week": row.day_of_week,
+            "lesson_number": row.lesson_number,
+            "classroom": None,
+            "class_name": row.class_name or "",
+            "subject_name": row.subject_name or "",
+        }
+        for row in rows
+    ]
@@ -0,0 +1,109 @@
+import os
+
+# Все настройки читаются из переменных окружения, значения по умолчанию подходят для локальной разработки
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'journal.db')}")
+
+# Пул соединений (QueuePool). Для SQLite важен в основном busy_timeout, для PostgreSQL - размер пула
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # секунды
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))    # секунды
+
+# PRAGMA для SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536"))
+
+# Асинхронный режим для читающих эндпоинтов
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+
+# Кэш пользователей, прошедших проверку токена
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # секунды
+
+# Массовый импорт записей журнала
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "20000"))
+# JSON-массив разбирается целиком, поэтому тело больше этого размера отклоняется до разбора
+BULK_MAX_JSON_BYTES = int(os.getenv("BULK_MAX_JSON_BYTES", str(32 * 1024 * 1024)))
+
+# Кэш недельного расписания
+WEEK_CACHE_SIZE = int(os.getenv("WEEK_CACHE_SIZE", "2048"))
+WEEK_CACHE_TTL = float(os.getenv("WEEK_CACHE_TTL", "3600"))  # секунды
+
+# Пул процессов для bcrypt: 0 воркеров - хеширование прямо в потоке запроса
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+
+# Refresh-токены
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REVOKED_TOKENS_BLOOM_CAPACITY = int(os.getenv("REVOKED_TOKENS_BLOOM_CAPACITY", "200000"))
+
+# Фоновые уведомления о низкой успеваемости и пропусках
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1") == "1"
+ALERT_INTERVAL = float(os.getenv("ALERT_INTERVAL", "300"))  # секунды между запусками
+ALERT_WINDOW_DAYS = int(os.getenv("ALERT_WINDOW_DAYS", "30"))
+ALERT_MIN_AVERAGE = float(os.getenv("ALERT_MIN_AVERAGE", "3.0"))
+ALERT_MIN_GRADES = int(os.getenv("ALERT_MIN_GRADES", "3"))  # средний балл считается от стольких оценок
+ALERT_MAX_ABSENCES = int(os.getenv("ALERT_MAX_ABSENCES", "3"))
+ALERT_COOLDOWN_HOURS = int(os.getenv("ALERT_COOLDOWN_HOURS", "24"))
+
+# Отправка уведомлений: file - запись в файл, smtp - через SMTP (для отладки: python -m aiosmtpd -n -l localhost:1025)
+NOTIFICATION_SENDER = os.getenv("NOTIFICATION_SENDER", "file")
+NOTIFICATION_FILE = os.getenv("NOTIFICATION_FILE", os.path.join(BASE_DIR, "notifications.log"))
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_FROM = os.getenv("SMTP_FROM", "journal@localhost")
+OUTBOX_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", "60"))  # секунды
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Проверка БД в /health
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))  # секунды
+
+# Журнал медленных SQL-запросов (отрицательный порог - выключен) и профилирование отдельных запросов
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# Несколько школ в одном процессе (TENANCY=1): школа берется из claim "school" в JWT или заголовка X-School.
+# SQLite - отдельный файл на школу в TENANT_DB_DIR, PostgreSQL - отдельная схема school_<id>
+TENANCY = os.getenv("TENANCY", "0") == "1"
+TENANT_DB_DIR = os.getenv("TENANT_DB_DIR", os.path.join(BASE_DIR, "schools"))
+TENANT_SCHEMA_PREFIX = os.getenv("TENANT_SCHEMA_PREFIX", "school_")
+TENANT_ENGINE_CACHE_SIZE = int(os.getenv("TENANT_ENGINE_CACHE_SIZE", "64"))  # открытых движков школ
+
+# Реплики для чтения: GET-запросы читают с них по кругу, запись и чтение сразу после записи - с основной базы.
+# Через запятую; локально - копии SQLite, обновляемые командой python replicas.py sync
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_RETRY_AFTER = float(os.getenv("REPLICA_RETRY_AFTER", "30"))  # секунды без запросов к упавшей реплике
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "10"))  # секунды между проверками
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))  # чтение с основной базы после записи
+
+# Офлайн-синхронизация журнала (POST /sync)
+SYNC_MAX_OPERATIONS = int(os.getenv("SYNC_MAX_OPERATIONS", "500"))  # операций в одном запросе
+SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", "1000"))  # записей в одном ответе, остальные - следующим запросом
+SYNC_RETENTION_DAYS = int(os.getenv("SYNC_RETENTION_DAYS", "30"))  # хранение ключей операций
+SYNC_PURGE_INTERVAL = float(os.getenv("SYNC_PURGE_INTERVAL", "3600"))  # секунды
+
+# Лента изменений (GET /changes/stream): журнал change_log и рассылка подписчикам внутри процесса
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "2"))  # секунды; изменения других процессов
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))  # секунды между пустыми сообщениями
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "256"))  # изменений в очереди одного подписчика
+CHANGE_FEED_BATCH = int(os.getenv("CHANGE_FEED_BATCH", "500"))  # строк журнала за один запрос
+# Секунды ожидания строки, пропущенной в нумерации seq. Строка, закоммиченная позже чем через столько
+# после следующей за ней, подписчикам уже не достанется: значение должно быть больше самой долгой транзакции записи
+CHANGE_FEED_GAP_GRACE = float(os.getenv("CHANGE_FEED_GAP_GRACE", "10"))
+# Журнал изменений - еще и токены офлайн-синхронизации (sync.py): по умолчанию хранится столько же, сколько ключи операций
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", str(SYNC_RETENTION_DAYS)))
+CHANGE_LOG_PURGE_INTERVAL = float(os.getenv("CHANGE_LOG_PURGE_INTERVAL", "3600"))  # секунды
+
+# История изменений записей журнала (history.py): построчные изменения хранятся HISTORY_RETENTION_DAYS,
+# более старые сворачиваются в снимки состояния - по одному на запись за месяц
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "180"))
+HISTORY_COMPACT_INTERVAL = float(os.getenv("HISTORY_COMPACT_INTERVAL", "86400"))  # секунды
+HISTORY_COMPACT_BATCH = int(os.getenv("HISTORY_COMPACT_BATCH", "500"))  # записей журнала за один проход
@@ -0,0 +1,189 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+import changes
+import crud
+from models import ChangeLog, JournalEntry, SyncOperation, Class
+from schemas import SyncOperationRequest, SyncOperationResult
+from serialization import entry_rows
+from settings import SYNC_MAX_CHANGES, SYNC_RETENTION_DAYS
+
+
+# Офлайн-синхронизация. Клиент копит изменения без сети и отправляет их пакетом: у каждой операции
+# свой ключ идемпотентности, у изменения и удаления - версия записи, которую клиент видел (base_version).
+# Пакет применяется одной транзакцией; результат каждой операции сохраняется под ее ключом,
+# поэтому повтор того же пакета после обрыва связи ничего не дублирует.
+# В ответ клиент получает записи, измененные после его токена, и id удаленных - без загрузки всего журнала.
+# Токен - seq журнала изменений (change_log, changes.py), до которого клиент получил все. Журнал читается
+# до горизонта, как в ленте изменений: запись, закоммиченная позже соседних, не теряется из-за часов.
+
+
+def encode_token(seq: int, after_id: Optional[int] = None) -> str:
+    # Токен непрозрачен для клиента: base64 от seq, а на страницах первой загрузки - "seq|id" последней записи
+    raw = str(seq) if after_id is None else f"{seq}|{after_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_token(token: str) -> Tuple[int, Optional[int]]:
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    seq, _, after_id = raw.partition("|")
+    if seq.isdigit() and (not after_id or after_id.isdigit()):
+        return int(seq), int(after_id) if after_id else None
+    try:
+        # Токен прежнего формата ("updated_at|id"): клиенту нужно загрузить журнал заново
+        datetime.fromisoformat(seq)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    raise HTTPException(status_code=410, detail="Sync token expired, sync again without since")
+
+
+def operation_error(operation: SyncOperationRequest) -> Optional[str]:
+    if operation.op in ("update", "delete") and (operation.entry_id is None or operation.base_version is None):
+        return f"{operation.op} requires entry_id and base_version"
+    if operation.op in ("create", "update") and operation.entry is None:
+        return f"{operation.op} requires entry"
+    return None
+
+def apply_operations(db: Session, user_id: int, operations: List[SyncOperationRequest]) -> Tuple[List[SyncOperationResult], List[int]]:
+    # Возвращает результаты по порядку операций и id записей с конфликтом: их текущее состояние
+    # попадает в ответ, даже если изменено раньше токена клиента
+    keys = {operation.key for operation in operations}
+    done = {
+        row.idempotency_key: SyncOperationResult.model_validate_json(row.result)
+        for row in db.scalars(select(SyncOperation).where(
+            SyncOperation.user_id == user_id, SyncOperation.idempotency_key.in_(keys)
+        ))
+    } if keys else {}
+
+    # Ссылки и изменяемые записи проверяются одним запросом на множество id, как в массовом импорте
+    entries = [operation.entry for operation in operations if operation.entry is not None]
+    subject_ids = {entry.subject_id for entry in entries}
+    class_ids = {entry.class_id for entry in entries}
+    existing_subjects = crud.active_subject_ids(db, subject_ids)
+    existing_classes = set(db.scalars(select(Class.id).where(Class.id.in_(class_ids)))) if class_ids else set()
+    entry_ids = {operation.entry_id for operation in operations if operation.entry_id is not None}
+    current = {
+        entry.id: entry
+        for entry in db.scalars(crud.entries_select().where(JournalEntry.id.in_(entry_ids), JournalEntry.deleted_at.is_(None)))
+    } if entry_ids else {}
+
+    results = []
+    conflicts = []
+    for operation in operations:
+        if operation.key in done:
+            results.append(done[operation.key])
+            continue
+
+        result = SyncOperationResult(key=operation.key, status="applied", entry_id=operation.entry_id)
+        error = operation_error(operation)
+        entry = current.get(operation.entry_id)
+        if error:
+            result.status, result.error = "invalid", error
+        elif operation.entry is not None and operation.entry.subject_id not in existing_subjects:
+            result.status, result.error = "invalid", "Subject not found"
+        elif operation.entry is not None and operation.entry.class_id not in existing_classes:
+            result.status, result.error = "invalid", "Class not found"
+        elif operation.op == "create":
+            entry = crud.create_entry(db, operation.entry, user_id)
+            result.entry_id, result.version = entry.id, entry.version
+        elif entry is None:
+            result.status = "not_found"
+        elif entry.version != operation.base_version:
+            # Запись изменили после того, как клиент ее получил: клиент решает сам, что оставить
+            result.status, result.version = "conflict", entry.version
+            conflicts.append(entry.id)
+        elif operation.op == "update":
+            crud.update_entry(db, entry, operation.entry, user_id)
+            result.version = entry.version
+        else:
+            crud.delete_entry(db, entry, user_id)
+            del current[entry.id]
+
+        done[operation.key] = result
+        results.append(result)
+        db.add(SyncOperation(user_id=user_id, idempotency_key=operation.key, result=result.model_dump_json()))
+
+    return results, conflicts
+
+
+def parse_since(db: Session, since: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    after = decode_token(since) if since else None
+    if after is not None and changes.needs_reset(after[0], changes.log_bounds(db)[0]):
+        # Строки журнала после токена уже удалены очисткой: надежнее загрузить журнал заново
+        raise HTTPException(status_code=410, detail="Sync token expired, sync again without since")
+    return after
+
+def initial_page(db: Session, stmt, seq: int, after_id: int) -> Dict[str, Any]:
+    # Первая загрузка - все записи постранично по id; потом клиент продолжает с seq, взятого
+    # до первой страницы: записи, измененные во время загрузки, придут следующей дельтой
+    rows = db.execute(
+        stmt.where(JournalEntry.id > after_id, JournalEntry.deleted_at.is_(None)).order_by(JournalEntry.id).limit(SYNC_MAX_CHANGES + 1)
+    ).all()
+    has_more = len(rows) > SYNC_MAX_CHANGES
+    if has_more:
+        rows = rows[:SYNC_MAX_CHANGES]
+    return {"rows": rows, "deleted": [], "token": encode_token(seq, rows[-1].id if has_more else None), "has_more": has_more}
+
+def delta_page(db: Session, stmt, after: int, class_id: Optional[int]) -> Dict[str, Any]:
+    # Строки журнала после токена до горизонта; у перенесенной в другой класс записи в журнале
+    # старого класса есть удаление, поэтому фильтр по классу не пропускает уход записи
+    horizon = changes.settled_seq(db, after)
+    log = select(ChangeLog.seq, ChangeLog.object_id).where(
+        ChangeLog.kind == "entry", ChangeLog.seq > after, ChangeLog.seq <= horizon
+    )
+    if class_id is not None:
+        log = log.where(ChangeLog.class_id == class_id)
+    logged = db.execute(log.order_by(ChangeLog.seq).limit(SYNC_MAX_CHANGES + 1)).all()
+    has_more = len(logged) > SYNC_MAX_CHANGES
+    if has_more:
+        logged = logged[:SYNC_MAX_CHANGES]
+
+    entry_ids = list(dict.fromkeys(object_id for _, object_id in logged))
+    rows = db.execute(stmt.where(JournalEntry.id.in_(entry_ids), JournalEntry.deleted_at.is_(None)).order_by(JournalEntry.id)).all() if entry_ids else []
+    present = {row.id for row in rows}
+    return {
+        "rows": rows,
+        # Удаленные и перенесенные в другой класс
+        "deleted": [entry_id for entry_id in entry_ids if entry_id not in present],
+        "token": encode_token(logged[-1].seq if has_more else horizon),
+        "has_more": has_more,
+    }
+
+def changes_since(
+    db: Session,
+    after: Optional[Tuple[int, Optional[int]]],
+    class_id: Optional[int],
+    include_ids: List[int]
+) -> Dict[str, Any]:
+    stmt = crud.entry_rows_select()
+    if class_id is not None:
+        stmt = stmt.where(JournalEntry.class_id == class_id)
+    if after is None:
+        page = initial_page(db, stmt, changes.log_bounds(db)[1], 0)
+    elif after[1] is not None:
+        page = initial_page(db, stmt, after[0], after[1])
+    else:
+        page = delta_page(db, stmt, after[0], class_id)
+
+    rows = page.pop("rows")
+    seen = {row.id for row in rows}
+    missing = [entry_id for entry_id in include_ids if entry_id not in seen]
+    if missing:
+        rows += db.execute(stmt.where(JournalEntry.id.in_(missing), JournalEntry.deleted_at.is_(None))).all()
+
+    return {"changes": entry_rows(rows, *crud.entry_marks_rows(db, [row.id for row in rows])), **page}
+
+
+def purge_sync_state(db: Session, now: Optional[datetime] = None) -> int:
+    # Фоновая задача: ключи операций старше SYNC_RETENTION_DAYS больше не нужны
+    cutoff = (now or datetime.utcnow()) - timedelta(days=SYNC_RETENTION_DAYS)
+    removed = db.execute(delete(SyncOperation).where(SyncOperation.created_at < cutoff)).rowcount
+    db.commit()
+    return removed
@@ -0,0 +1,114 @@
+import os
+import sys
+from contextlib import contextmanager
+from typing import List, Optional
+
+from alembic import command as alembic_command
+from alembic.config import Config
+from jose import JWTError, jwt
+from sqlalchemy import inspect, text
+
+from database import (
+    TENANT_ID_PATTERN, current_tenant, engine, is_sqlite, tenant_db_path, tenant_engine, tenant_schema,
+    SQLALCHEMY_DATABASE_URL
+)
+from dependencies import SECRET_KEY, ALGORITHM
+import search  # создает полнотекстовый индекс вместе с таблицами
+from models import Base
+from settings import TENANCY, TENANT_DB_DIR, TENANT_SCHEMA_PREFIX
+
+
+# Выбор школы для запроса. Школа из подписанного токена (claim "school") важнее заголовка:
+# X-School нужен только до входа - для /auth/token, /auth/register и /auth/refresh.
+
+def bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" else None
+    return None
+
+def tenant_from_scope(scope) -> Optional[str]:
+    token = bearer_token(scope)
+    if token:
+        try:
+            # Срок действия не проверяем: истекший токен все равно указывает на свою школу,
+            # а сам запрос отклонит get_current_user
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+        except JWTError:
+            claims = {}
+        if claims.get("school"):
+            return claims["school"]
+    for name, value in scope["headers"]:
+        if name == b"x-school":
+            tenant = value.decode("latin-1").strip().lower()
+            return tenant if TENANT_ID_PATTERN.match(tenant) else None
+    return None
+
+class TenantMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_tenant.set(tenant_from_scope(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+
+
+@contextmanager
+def tenant_context(tenant: Optional[str]):
+    token = current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+def list_tenants() -> List[str]:
+    if is_sqlite(SQLALCHEMY_DATABASE_URL):
+        if not os.path.isdir(TENANT_DB_DIR):
+            return []
+        return sorted(name[:-3] for name in os.listdir(TENANT_DB_DIR) if name.endswith(".db"))
+    prefix = TENANT_SCHEMA_PREFIX
+    return sorted(schema[len(prefix):] for schema in inspect(engine).get_schema_names() if schema.startswith(prefix))
+
+def job_tenants() -> List[Optional[str]]:
+    # Фоновые задачи проходят по всем школам; без TENANCY - один проход по основной базе
+    return list_tenants() if TENANCY else [None]
+
+def alembic_config(tenant: str) -> Config:
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+    config.attributes["tenant"] = tenant
+    return config
+
+def create_tenant(tenant: str):
+    if not TENANT_ID_PATTERN.match(tenant):
+        raise ValueError("Идентификатор школы: строчные латинские буквы, цифры и _")
+    if is_sqlite(SQLALCHEMY_DATABASE_URL):
+        os.makedirs(TENANT_DB_DIR, exist_ok=True)
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{tenant_schema(tenant)}"'))
+    tenant_bind, owned = tenant_engine(tenant, must_exist=False)
+    # Схема соответствует последней миграции: помечаем базу школы как head, иначе следующие
+    # миграции (alembic -x tenant=all upgrade head) начали бы с первой
+    Base.metadata.create_all(tenant_bind)
+    if owned:
+        tenant_bind.dispose()
+    alembic_command.stamp(alembic_config(tenant), "head")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1:2]
+    if command == ["list"]:
+        print("\n".join(list_tenants()))
+    elif command == ["create"] and len(sys.argv) == 3:
+        create_tenant(sys.argv[2])
+        print(f"Школа {sys.argv[2]} создана: {tenant_db_path(sys.argv[2]) if is_sqlite(SQLALCHEMY_DATABASE_URL) else tenant_schema(sys.argv[2])}")
+    else:
+        sys.exit("Использование: python tenants.py list | python tenants.py create <школа>")
@@ -0,0 +1,54 @@
+import os
+import sys
+
+# Модули приложения импортируются из src как верхнеуровневые; фоновые задачи в тестах не нужны
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ALERTS_ENABLED", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database
+import dependencies
+import models
+
+
+@pytest.fixture
+def engine():
+    # Отдельная база в памяти на каждый тест; StaticPool - одно соединение для всех потоков
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client(engine, db):
+    import main
+
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    def get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    user = models.User(username="teacher", email="teacher@example.com", hashed_password="x", is_active=True)
+    db.add(user)
+    db.commit()
+    main.app.dependency_overrides[database.get_db] = get_db
+    main.app.dependency_overrides[dependencies.get_current_user] = lambda: dependencies.CurrentUser.from_user(user)
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
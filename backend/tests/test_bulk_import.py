@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from models import Class, Subject
+from routes import entries
+
+
+@pytest.fixture
+def lesson(db):
+    school_class = Class(name="5А")
+    subject = Subject(name="Математика")
+    db.add_all([school_class, subject])
+    db.commit()
+    return {"subject_id": subject.id, "class_id": school_class.id, "date": "2025-09-01T09:00:00", "homework": "№ 1"}
+
+def item(lesson, number: int) -> dict:
+    return {**lesson, "topic": f"Тема {number}"}
+
+def csv_body(lesson, topics) -> str:
+    header = "subject_id,class_id,date,topic,homework,attendance,grades\n"
+    return header + "".join(
+        f'{lesson["subject_id"]},{lesson["class_id"]},{lesson["date"]},"{topic}",дз,"{{""1"": ""present""}}",\n'
+        for topic in topics
+    )
+
+def read_rows(content_type: str, chunks, headers=()):
+    # read_bulk_rows напрямую: TestClient отдает приложению тело целиком, а здесь видно,
+    # сколько частей тела успели прочитать до ответа
+    consumed = []
+    parts = iter(chunks)
+
+    async def receive():
+        chunk = next(parts, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        consumed.append(chunk)
+        return {"type": "http.request", "body": chunk.encode(), "more_body": True}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/entries/bulk", "query_string": b"",
+        "headers": [(b"content-type", content_type.encode()), *headers],
+    }
+    try:
+        return asyncio.run(entries.read_bulk_rows(Request(scope, receive))), consumed
+    except HTTPException as e:
+        return e.status_code, consumed
+
+
+def test_imports_json_ndjson_and_csv(client, lesson):
+    response = client.post("/entries/bulk", json=[item(lesson, 1), {"topic": "без полей"}])
+    assert response.json()["created"] == 1 and response.json()["errors"][0]["row"] == 2
+
+    ndjson = json.dumps(item(lesson, 2)) + "\n\n{broken\n"
+    response = client.post("/entries/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["created"] == 1
+    assert response.json()["errors"] == [{"row": 2, "error": "Invalid JSON line"}]
+
+    # Запятая, перевод строки и кавычка внутри поля в кавычках
+    body = "﻿" + csv_body(lesson, ["тема, с запятой", 'многострочная\nтема с ""кавычкой""'])
+    response = client.post("/entries/bulk", content=body.encode(), headers={"Content-Type": "text/csv"})
+    assert response.json()["created"] == 2, response.text
+    topics = {entry["topic"] for entry in client.get("/entries/?limit=10").json()}
+    assert {"тема, с запятой", 'многострочная\nтема с "кавычкой"'} <= topics
+
+def test_ndjson_stops_reading_after_row_limit(lesson, monkeypatch):
+    monkeypatch.setattr(entries, "BULK_MAX_ROWS", 2)
+    status, consumed = read_rows("application/x-ndjson", [json.dumps(item(lesson, i)) + "\n" for i in range(50)])
+    assert status == 413
+    assert len(consumed) == 3
+
+def test_csv_stops_reading_after_row_limit(lesson, monkeypatch):
+    monkeypatch.setattr(entries, "BULK_MAX_ROWS", 2)
+    lines = csv_body(lesson, [f"тема\n{i}" for i in range(50)]).splitlines(keepends=True)
+    status, consumed = read_rows("text/csv", lines)
+    assert status == 413
+    # Заголовок и три записи по две строки
+    assert len(consumed) == 7
+
+def test_csv_unterminated_quote_at_end(lesson):
+    rows, _ = read_rows("text/csv", [csv_body(lesson, ["тема"]), '1,1,2025-09-01,"без конца'])
+    assert [record["topic"] for _, record in rows] == ["тема", "без конца"]
+
+def test_json_row_limit(client, lesson, monkeypatch):
+    monkeypatch.setattr(entries, "BULK_MAX_ROWS", 2)
+    assert client.post("/entries/bulk", json=[item(lesson, i) for i in range(3)]).status_code == 413
+
+def test_json_body_size_limit(client, lesson, monkeypatch):
+    monkeypatch.setattr(entries, "BULK_MAX_JSON_BYTES", 1000)
+    rows = [item(lesson, i) for i in range(50)]
+    assert client.post("/entries/bulk", json=rows).status_code == 413
+
+    # Без Content-Length тело читается, пока не превысит предел
+    text = json.dumps(rows)
+    chunks = [text[i:i + 100] for i in range(0, len(text), 100)]
+    status, consumed = read_rows("application/json", chunks)
+    assert status == 413
+    assert len(consumed) == 11
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import changes
+from models import ChangeLog, Class, Subject
+from routes.changes import stream_changes
+
+
+@pytest.fixture(autouse=True)
+def change_log(engine, monkeypatch):
+    # Журнал читается через current_sessionmaker, а не через get_db; рассылка - своя на каждый тест
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(changes, "current_sessionmaker", lambda: SessionLocal)
+    monkeypatch.setattr(changes, "broker", changes.ChangeBroker())
+    monkeypatch.setattr(changes, "CHANGE_FEED_GAP_GRACE", 10)
+
+def add_changes(db, *seqs, class_id: int = 1, age: float = 0):
+    created_at = datetime.utcnow() - timedelta(seconds=age)
+    db.add_all([
+        ChangeLog(seq=seq, kind="entry", object_id=seq, action="update", class_id=class_id, created_at=created_at)
+        for seq in seqs
+    ])
+    db.commit()
+
+def poll(client, after: int, class_id: int = None) -> dict:
+    params = {"after": after, **({"class_id": class_id} if class_id else {})}
+    response = client.get("/changes", params=params)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {"seqs": [change["seq"] for change in body["changes"]], "last_seq": body["last_seq"], "reset": body["reset"]}
+
+async def read_events(count: int, **params) -> list:
+    # Тело потока SSE без HTTP-клиента: поток не заканчивается, а TestClient ждет конца ответа
+    response = await stream_changes(
+        class_id=params.get("class_id"), after=params.get("after"), last_event_id=params.get("last_event_id"),
+        current_user=None, db=changes.current_sessionmaker()()
+    )
+    events = []
+
+    async def collect():
+        async for chunk in response.body_iterator:
+            if chunk.startswith(":"):
+                continue
+            fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+            events.append((fields["event"], int(fields["id"])))
+            if len(events) == count:
+                return
+            if "on_event" in params:
+                await params["on_event"](len(events))
+
+    try:
+        await asyncio.wait_for(collect(), 5)
+    finally:
+        await response.body_iterator.aclose()
+    return events
+
+
+def test_poll_reads_to_horizon(client, db):
+    add_changes(db, 1, 2, 3)
+    assert poll(client, 0) == {"seqs": [1, 2, 3], "last_seq": 3, "reset": False}
+    assert poll(client, 3) == {"seqs": [], "last_seq": 3, "reset": False}
+
+def test_gap_is_waited_for_until_it_fills(client, db):
+    # seq 2 выдан транзакции, которая еще не закоммитила: 3 уже виден, но выдавать его рано
+    add_changes(db, 1, 3)
+    assert poll(client, 0) == {"seqs": [1], "last_seq": 1, "reset": False}
+    add_changes(db, 2)
+    assert poll(client, 1) == {"seqs": [2, 3], "last_seq": 3, "reset": False}
+
+def test_gap_older_than_grace_is_skipped(client, db):
+    add_changes(db, 1)
+    add_changes(db, 3, age=60)
+    assert poll(client, 0) == {"seqs": [1, 3], "last_seq": 3, "reset": False}
+    # Ограничение CHANGE_FEED_GAP_GRACE: строка, закоммиченная после этого, клиенту не достается
+    add_changes(db, 2)
+    assert poll(client, 3)["seqs"] == []
+
+def test_class_filter_advances_past_other_classes(client, db):
+    add_changes(db, 1, class_id=1)
+    add_changes(db, 2, 3, class_id=2)
+    assert poll(client, 0, class_id=1) == {"seqs": [1], "last_seq": 3, "reset": False}
+    assert poll(client, 0, class_id=2) == {"seqs": [2, 3], "last_seq": 3, "reset": False}
+
+def test_entry_moved_between_classes(client, db):
+    classes = [Class(name="5А"), Class(name="6Б")]
+    subject = Subject(name="Математика")
+    db.add_all([*classes, subject])
+    db.commit()
+    body = {"subject_id": subject.id, "class_id": classes[0].id, "date": "2025-09-01T09:00:00", "topic": "т", "homework": "д"}
+    entry_id = client.post("/entries/", json=body).json()["id"]
+    client.put(f"/entries/{entry_id}", json={**body, "class_id": classes[1].id})
+
+    def actions(class_id):
+        response = client.get("/changes", params={"after": 0, "class_id": class_id}).json()
+        return [(change["action"], change["id"]) for change in response["changes"]]
+
+    # Для подписчиков старого класса запись удалена, для нового - появилась
+    assert actions(classes[0].id) == [("create", entry_id), ("delete", entry_id)]
+    assert actions(classes[1].id) == [("update", entry_id)]
+
+def test_reset_after_purge(client, db):
+    add_changes(db, 1, 2, 3, age=30 * 86400)
+    add_changes(db, 4)
+    assert changes.purge_change_log(db) == 3
+    assert poll(client, 0) == {"seqs": [], "last_seq": 4, "reset": True}
+    assert poll(client, 3) == {"seqs": [4], "last_seq": 4, "reset": False}
+
+def test_stream_resumes_from_last_event_id(db):
+    add_changes(db, 1, 2, 3)
+
+    async def commit_new(received):
+        # Новое изменение после подписки приходит через рассылку, а не из журнала
+        if received == 2:
+            session = changes.current_sessionmaker()()
+            changes.record_change(session, "entry", 99, "update", 1)
+            session.commit()
+            session.close()
+
+    events = asyncio.run(read_events(3, last_event_id="1", on_event=commit_new))
+    assert events == [("change", 2), ("change", 3), ("change", 4)]
+    assert changes.broker.feeds == {}
+
+def test_stream_resets_after_purge_and_filters_class(db):
+    add_changes(db, 1, 2, age=30 * 86400)
+    add_changes(db, 3, 4)
+    changes.purge_change_log(db)
+
+    async def commit_new(received):
+        session = changes.current_sessionmaker()()
+        changes.record_change(session, "entry", 98, "update", 2)
+        changes.record_change(session, "entry", 99, "update", 1)
+        session.commit()
+        session.close()
+
+    # Строки после seq 0 удалены: сначала reset с горизонтом журнала, затем только изменения класса 1
+    events = asyncio.run(read_events(2, last_event_id="0", class_id=1, on_event=commit_new))
+    assert events == [("reset", 4), ("change", 6)]
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import delete, event, select
+
+from models import Class, Schedule, Subject, User
+
+
+@pytest.fixture
+def lessons(db, client):
+    teacher_id = db.scalar(select(User.id).where(User.username == "teacher"))
+    school_class = Class(name="5А")
+    subject = Subject(name="Математика", teacher_id=teacher_id)
+    db.add_all([school_class, subject])
+    db.commit()
+    return [
+        client.post("/schedules/", json={
+            "class_id": school_class.id, "subject_id": subject.id, "day_of_week": 0, "lesson_number": number
+        }).json()["id"]
+        for number in (1, 2)
+    ]
+
+def etag(client, url: str) -> str:
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.headers["etag"]
+
+def test_not_modified_until_write(client, lessons):
+    tag = etag(client, "/schedules/")
+    assert client.get("/schedules/", headers={"If-None-Match": tag}).status_code == 304
+
+def test_hard_delete_changes_etag(client, lessons):
+    # Удаляется не самая новая строка: max(updated_at) не меняется, меняется счетчик удалений
+    tag = etag(client, "/schedules/")
+    assert client.delete(f"/schedules/{lessons[0]}").status_code == 200
+    response = client.get("/schedules/", headers={"If-None-Match": tag})
+    assert response.status_code == 200
+    assert [lesson["id"] for lesson in response.json()] == lessons[1:]
+    assert client.get("/schedules/", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+def test_bulk_delete_changes_etag(db, client, lessons):
+    tag = etag(client, "/schedules/")
+    db.execute(delete(Schedule).where(Schedule.id == lessons[0]))
+    db.commit()
+    assert client.get("/schedules/", headers={"If-None-Match": tag}).status_code == 200
+
+def test_version_check_does_not_count_rows(engine, client, lessons):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+
+    tag = etag(client, "/schedules/")
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert client.get("/schedules/", headers={"If-None-Match": tag}).status_code == 304
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert statements and not any("count(" in statement for statement in statements)
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import hashing
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Пул потоков вместо процессов и один слот: задача ждет, пока тест ее не отпустит
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hashing, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(hashing, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(hashing, "get_executor", lambda: executor)
+    yield
+    executor.shutdown(wait=True)
+
+def slot_is_free() -> bool:
+    try:
+        hashing.acquire_slot()
+    except HTTPException as e:
+        assert e.status_code == 503
+        return False
+    hashing._slots.release()
+    return True
+
+
+def test_slot_is_held_until_job_finishes_after_cancel(pool):
+    started, finish = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        finish.wait(5)
+        return "hash"
+
+    async def login():
+        task = asyncio.ensure_future(hashing.run_in_pool_async(job))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        # Клиент отключился: запрос отменен, а задача в пуле продолжает работать
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(login())
+    assert not slot_is_free()
+    finish.set()
+    hashing.get_executor().submit(lambda: None).result(5)
+    assert slot_is_free()
+
+def test_slot_released_after_result_and_error(pool):
+    assert hashing.run_in_pool(str.upper, "a") == "A"
+    assert slot_is_free()
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(hashing.run_in_pool_async(divmod, 1, 0))
+    assert slot_is_free()
@@ -0,0 +1,100 @@
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+import pytest
+
+import history
+from models import Class, JournalEntryHistory, JournalEntrySnapshot, Student, Subject
+
+
+BASE = history.state(1, 1, datetime(2025, 9, 1, 9), "Дроби", "№ 1", {"1": "present", "2": "absent"}, {"1": "5"})
+
+@pytest.fixture
+def lesson(db):
+    school_class = Class(name="5А")
+    subject = Subject(name="Математика")
+    db.add_all([school_class, subject])
+    db.flush()
+    students = [
+        Student(first_name="Иван", last_name="Петров", email="petrov@example.com", class_id=school_class.id),
+        Student(first_name="Анна", last_name="Смирнова", email="smirnova@example.com", class_id=school_class.id),
+    ]
+    db.add_all(students)
+    db.commit()
+    return {"subject_id": subject.id, "class_id": school_class.id, "date": "2025-01-10T09:00:00", "homework": "№ 1"}
+
+def write_history(client, db, lesson, changed_at) -> int:
+    # Создание, два изменения и удаление; время каждой версии переносится в прошлое,
+    # как если бы изменения делали в разные месяцы
+    attendance = {"1": "present", "2": "absent"}
+    entry_id = client.post("/entries/", json={**lesson, "topic": "Дроби", "attendance": attendance}).json()["id"]
+    client.put(f"/entries/{entry_id}", json={**lesson, "topic": "Дроби", "attendance": attendance, "grades": {"1": "5"}})
+    client.put(f"/entries/{entry_id}", json={**lesson, "topic": "Проценты", "attendance": {"1": "present"}, "grades": {"1": "4"}})
+    client.delete(f"/entries/{entry_id}")
+    for version, at in enumerate(changed_at, start=1):
+        db.query(JournalEntryHistory).filter_by(entry_id=entry_id, version=version).update({"changed_at": at})
+    db.commit()
+    return entry_id
+
+def as_of(client, entry_id: int, at: datetime):
+    response = client.get(f"/entries/{entry_id}", params={"as_of": at.isoformat()})
+    if response.status_code != 200:
+        return response.status_code
+    body = response.json()
+    return body["version"], body["topic"], body["attendance"], body["grades"]
+
+
+@pytest.mark.parametrize("before, after", [
+    (None, BASE),
+    (BASE, BASE),
+    (BASE, {**BASE, "topic": "Проценты", "deleted": True}),
+    # Отметки убраны, добавлены и изменены у разных учеников
+    (BASE, {**BASE, "attendance": {"1": "present", "3": "late"}, "grades": {"1": "4", "2": "3"}}),
+    (BASE, {**BASE, "attendance": {}, "grades": {}}),
+])
+def test_apply_diff_restores_state(before, after):
+    original = deepcopy(before)
+    assert history.apply_diff(before, history.diff(before, after)) == after
+    # Исходное состояние не меняется: apply_diff копирует отметки
+    assert before == original
+
+def test_diff_keeps_only_changed_fields():
+    after = {**BASE, "topic": "Проценты", "attendance": {"1": "present"}, "grades": {"1": "5", "2": "4"}}
+    assert history.diff(BASE, after) == {"topic": "Проценты", "attendance": {"2": None}, "grades": {"2": "4"}}
+    assert history.diff(BASE, BASE) == {}
+
+def test_state_as_of_before_and_after_compaction(client, db, lesson):
+    changed_at = [datetime(2025, 1, 10), datetime(2025, 1, 20), datetime(2025, 2, 5), datetime(2025, 3, 1)]
+    entry_id = write_history(client, db, lesson, changed_at)
+    moments = {
+        datetime(2025, 1, 15): (1, "Дроби", {"1": "present", "2": "absent"}, {}),
+        datetime(2025, 1, 25): (2, "Дроби", {"1": "present", "2": "absent"}, {"1": {"grade": "5"}}),
+        datetime(2025, 2, 20): (3, "Проценты", {"1": "present"}, {"1": {"grade": "4"}}),
+        datetime(2025, 3, 5): 404,  # удалена
+    }
+    assert as_of(client, entry_id, datetime(2025, 1, 1)) == 404  # еще не создана
+    assert {at: as_of(client, entry_id, at) for at in moments} == moments
+
+    # Январь и февраль сворачиваются в снимки на конец каждого месяца, март остается построчно
+    now = datetime(2025, 2, 10) + timedelta(days=history.HISTORY_RETENTION_DAYS)
+    assert history.compact_history(db, now) == 3
+    snapshots = db.query(JournalEntrySnapshot.version).filter_by(entry_id=entry_id).order_by(JournalEntrySnapshot.version).all()
+    assert [version for version, in snapshots] == [2, 3]
+    assert history.compact_history(db, now) == 0
+
+    # Внутри свернутого месяца видно только состояние на его конец; раньше первого снимка - 410
+    assert as_of(client, entry_id, datetime(2025, 1, 15)) == 410
+    assert as_of(client, entry_id, datetime(2025, 1, 1)) == 410
+    for at in (datetime(2025, 1, 25), datetime(2025, 2, 20), datetime(2025, 3, 5)):
+        assert as_of(client, entry_id, at) == moments[at]
+
+    records = client.get(f"/entries/{entry_id}/history").json()
+    assert [(record["version"], record["action"]) for record in records] == [(2, "snapshot"), (3, "snapshot"), (4, "delete")]
+
+def test_compacted_history_raises(db, client, lesson):
+    entry_id = write_history(client, db, lesson, [datetime(2025, 1, 10)] * 3 + [datetime(2025, 3, 1)])
+    history.compact_history(db, datetime(2025, 2, 1) + timedelta(days=history.HISTORY_RETENTION_DAYS))
+    with pytest.raises(history.HistoryCompacted):
+        history.state_as_of(db, entry_id, datetime(2025, 1, 5))
+    assert history.state_as_of(db, entry_id, datetime(2025, 1, 10))["version"] == 3
+    assert history.state_as_of(db, entry_id, datetime(2025, 3, 1)) is None
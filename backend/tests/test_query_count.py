@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import AttendanceMark, Class, Grade, JournalEntry, Schedule, Student, Subject
+
+
+LIST_ROUTES = ["/entries/", "/students/", "/classes/", "/classes-with-students", "/schedules/", "/schedules/class/1"]
+
+
+def add_rows(db, start: int, count: int):
+    # Класс, предмет, ученик, урок с отметками и строка расписания на каждое значение
+    for i in range(start, start + count):
+        school_class = Class(name=f"{i + 1}А")
+        subject = Subject(name=f"Предмет {i}")
+        db.add_all([school_class, subject])
+        db.flush()
+        student = Student(first_name=f"Имя{i}", last_name=f"Фамилия{i}", email=f"s{i}@example.com", class_id=school_class.id)
+        entry = JournalEntry(
+            subject_id=subject.id, class_id=school_class.id, date=datetime(2025, 9, 1) + timedelta(days=i),
+            topic=f"Тема {i}", homework=f"Задание {i}"
+        )
+        db.add_all([student, entry])
+        db.flush()
+        db.add_all([
+            AttendanceMark(entry_id=entry.id, student_id=student.id, status="present"),
+            Grade(entry_id=entry.id, student_id=student.id, value="5"),
+            Schedule(subject_id=subject.id, class_id=1, day_of_week=i % 7, lesson_number=i // 7 + 1),
+        ])
+    db.commit()
+
+def count_statements(engine, client, url: str) -> int:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", LIST_ROUTES)
+def test_list_statement_count_does_not_grow_with_rows(engine, db, client, url):
+    add_rows(db, 0, 2)
+    few = count_statements(engine, client, url)
+    add_rows(db, 2, 30)
+    many = count_statements(engine, client, url)
+    assert many == few
+
+def test_entries_list_returns_all_rows_in_constant_statements(engine, db, client):
+    add_rows(db, 0, 3)
+    few = count_statements(engine, client, "/entries/")
+    add_rows(db, 3, 40)
+    many = count_statements(engine, client, "/entries/?limit=100")
+    assert many == few
+    entries = client.get("/entries/?limit=100").json()
+    assert len(entries) == 43
+    assert all(entry["subject_name"] and entry["class_name"] for entry in entries)
+    assert all(entry["grades"] and entry["attendance"] for entry in entries)
@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from gradebook import grade_score
+from models import Class, ClassMonthlyStats, Student, StudentWeeklyStats, Subject
+from rollups import ROLLUP_COUNTERS, rebuild_rollups
+
+
+MONDAY = date(2025, 9, 1)
+
+
+@pytest.fixture
+def school(db):
+    school_class = Class(name="5А")
+    subject = Subject(name="Математика")
+    db.add_all([school_class, subject])
+    db.flush()
+    students = [
+        Student(first_name=f"Имя{i}", last_name=f"Фамилия{i}", email=f"s{i}@example.com", class_id=school_class.id)
+        for i in range(2)
+    ]
+    db.add_all(students)
+    db.commit()
+    return school_class.id, subject.id, [student.id for student in students]
+
+def entry_body(school, grades: dict, attendance: dict = None, day: int = 2) -> dict:
+    class_id, subject_id, _ = school
+    return {
+        "subject_id": subject_id, "class_id": class_id, "date": f"2025-09-0{day}T09:00:00",
+        "topic": "Дроби", "homework": "№ 1", "attendance": attendance or {}, "grades": grades,
+    }
+
+def weekly(db) -> dict:
+    # Нулевые строки остаются после вычитания вклада и в отчетах не отличаются от отсутствующих
+    rows = db.execute(select(StudentWeeklyStats)).scalars().all()
+    result = {}
+    for row in rows:
+        counters = tuple(getattr(row, name) for name in ROLLUP_COUNTERS)
+        if any(counters):
+            result[(row.student_id, row.subject_id, row.week_start)] = counters
+    db.expire_all()
+    return result
+
+def monthly(db) -> dict:
+    rows = db.execute(select(ClassMonthlyStats)).scalars().all()
+    result = {
+        (row.class_id, row.subject_id, row.month): tuple(getattr(row, name) for name in ROLLUP_COUNTERS)
+        for row in rows if any(getattr(row, name) for name in ROLLUP_COUNTERS)
+    }
+    db.expire_all()
+    return result
+
+
+@pytest.mark.parametrize("value, score", [("5", 5.0), ("4,5", 4.5), ("зачет", None), ("nan", None), ("inf", None), (None, None)])
+def test_grade_score(value, score):
+    assert grade_score(value) == score
+
+def test_create_accepts_numeric_and_dict_grades(db, client, school):
+    _, subject_id, (first, second) = school
+    response = client.post("/entries/", json=entry_body(
+        school, {str(first): {"grade": 5}, str(second): 4}, {str(first): "present", str(second): "absent"}
+    ))
+    assert response.status_code == 200, response.text
+    assert response.json()["grades"][str(first)] == {"grade": "5"}
+    assert weekly(db) == {
+        (first, subject_id, MONDAY): (5.0, 1, 1, 0, 0),
+        (second, subject_id, MONDAY): (4.0, 1, 1, 1, 0),
+    }
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "зачет"])
+def test_non_finite_and_text_grades_do_not_count(db, client, school, value):
+    _, subject_id, (first, _) = school
+    response = client.post("/entries/", json=entry_body(school, {str(first): {"grade": value}}, {str(first): "late"}))
+    assert response.status_code == 200, response.text
+    assert weekly(db) == {(first, subject_id, MONDAY): (0.0, 0, 1, 0, 1)}
+
+def test_update_and_delete_apply_deltas(db, client, school):
+    class_id, subject_id, (first, second) = school
+    entry_id = client.post("/entries/", json=entry_body(school, {str(first): "5"}, {str(first): "present"})).json()["id"]
+
+    response = client.put(f"/entries/{entry_id}", json=entry_body(
+        school, {str(first): "3", str(second): {"grade": 4}}, {str(first): "absent"}
+    ))
+    assert response.status_code == 200, response.text
+    assert weekly(db) == {
+        (first, subject_id, MONDAY): (3.0, 1, 1, 1, 0),
+        (second, subject_id, MONDAY): (4.0, 1, 0, 0, 0),
+    }
+    assert monthly(db) == {(class_id, subject_id, MONDAY): (7.0, 2, 1, 1, 0)}
+
+    assert client.delete(f"/entries/{entry_id}").status_code == 200
+    assert weekly(db) == {}
+    assert monthly(db) == {}
+
+def test_incremental_rollups_match_rebuild(db, client, school):
+    _, _, (first, second) = school
+    ids = [
+        client.post("/entries/", json=entry_body(
+            school, {str(first): grade, str(second): {"grade": "4,5"}}, {str(first): "present", str(second): status}, day
+        )).json()["id"]
+        for grade, status, day in [("5", "late", 2), ("2", "absent", 3), ("зачет", "present", 8), ("nan", "absent", 9)]
+    ]
+    client.put(f"/entries/{ids[1]}", json=entry_body(school, {str(second): 3}, {str(first): "absent"}, 3))
+    client.delete(f"/entries/{ids[2]}")
+    response = client.post("/entries/bulk", json=[entry_body(school, {str(first): 4}, {str(second): "late"}, 4)])
+    assert response.json()["created"] == 1
+
+    incremental = weekly(db), monthly(db)
+    rebuild_rollups(db)
+    assert (weekly(db), monthly(db)) == incremental
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from models import Class, Student, Subject
+from search import like_patterns, postgresql_search_select, search_terms
+
+
+@pytest.fixture
+def people(db):
+    school_class = Class(name="5Ё")
+    db.add_all([school_class, Subject(name="Алгебра")])
+    db.flush()
+    db.add_all([
+        Student(first_name="Иван", last_name="Петров", email="petrov@example.com", class_id=school_class.id),
+        Student(first_name="Пётр", last_name="Ёлкин", email="elkin@example.com", class_id=school_class.id),
+        Student(first_name="Иван", last_name="Сидоров", email="sidorov@example.com", class_id=school_class.id),
+    ])
+    db.commit()
+
+def titles(client, q: str, kind: str = None) -> list:
+    params = {"q": q, **({"kind": kind} if kind else {})}
+    response = client.get("/search/", params=params)
+    assert response.status_code == 200, response.text
+    # В индексе SQLite названия хранятся с ё, замененной на е
+    return sorted(result["title"].replace("ё", "е").replace("Ё", "Е") for result in response.json())
+
+
+@pytest.mark.parametrize("q, terms", [
+    ("иван пет", ["иван", "пет"]),
+    ("  Пётр,  ЁЛКИН ", ["петр", "елкин"]),
+    ("5-Ё", ["5", "е"]),
+    ("", []),
+])
+def test_search_terms_split_and_fold(q, terms):
+    assert search_terms(q) == terms
+
+def test_like_patterns_escape_underscore():
+    assert like_patterns(["иван", "a_b"]) == ["%иван%", "%a\\_b%"]
+
+@pytest.mark.parametrize("q, expected", [
+    ("иван пет", ["Петров Иван"]),
+    ("пет иван", ["Петров Иван"]),
+    ("иван", ["Петров Иван", "Сидоров Иван"]),
+    ("петр", ["Елкин Петр", "Петров Иван"]),
+    ("ёлкин пётр", ["Елкин Петр"]),
+])
+def test_sqlite_matches_every_term_in_any_order(client, people, q, expected):
+    assert titles(client, q, "student") == expected
+
+def test_postgresql_query_has_one_condition_per_term():
+    # Без сервера: проверяется собранный SQL, у каждого слова свое условие по свернутому ё
+    compiled = postgresql_search_select(search_terms("Иван Пёт"), None, 20).compile(dialect=postgresql.dialect())
+    sql, params = str(compiled), list(compiled.params.values())
+    assert sql.count(" ILIKE ") == 6  # по условию на слово у учеников, классов и предметов
+    assert params.count("%иван%") == 3 and params.count("%пет%") == 3
+    assert "иван:* & пет:*" in params
+    assert not any("ё" in str(value) for value in params if value not in ("ё", "Ё"))
+    assert sql.count("replace(replace(") >= 4
@@ -0,0 +1,142 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+import changes
+import sync
+from models import ChangeLog, Class, JournalEntry, Subject
+
+
+@pytest.fixture
+def lesson(db):
+    classes = [Class(name="5А"), Class(name="6Б")]
+    subject = Subject(name="Математика")
+    db.add_all([*classes, subject])
+    db.commit()
+    return {"subject_id": subject.id, "class_id": classes[0].id, "date": "2025-09-01T09:00:00", "homework": "№ 1"}
+
+def create(key: str, lesson, topic: str, **fields) -> dict:
+    return {"key": key, "op": "create", "entry": {**lesson, "topic": topic, **fields}}
+
+def post_sync(client, operations=(), since=None, class_id=None, status=200) -> dict:
+    response = client.post("/sync", json={"operations": list(operations), "since": since, "class_id": class_id})
+    assert response.status_code == status, response.text
+    return response.json()
+
+def topics(body) -> list:
+    return sorted(entry["topic"] for entry in body["changes"])
+
+def add_late_entry(db, lesson, topic: str, seq: int, age: float = 0) -> int:
+    # Запись с явным seq в журнале изменений: так видно, в каком порядке транзакции получили
+    # номера и в каком закоммитили
+    stamped = datetime.utcnow() - timedelta(seconds=age)
+    entry = JournalEntry(
+        subject_id=lesson["subject_id"], class_id=lesson["class_id"], date=datetime(2025, 9, 1),
+        topic=topic, homework="", updated_at=stamped
+    )
+    db.add(entry)
+    db.flush()
+    db.add(ChangeLog(seq=seq, kind="entry", object_id=entry.id, action="create", class_id=entry.class_id, created_at=stamped))
+    db.commit()
+    return entry.id
+
+
+def test_replayed_batch_is_applied_once(client, lesson):
+    operations = [create("op-1", lesson, "Дроби"), create("op-2", lesson, "Проценты")]
+    first = post_sync(client, operations)
+    # Ответ потерян, клиент повторяет тот же пакет
+    second = post_sync(client, operations)
+    assert second["results"] == first["results"]
+    assert [result["status"] for result in first["results"]] == ["applied", "applied"]
+    assert topics(post_sync(client)) == ["Дроби", "Проценты"]
+
+def test_conflict_returns_current_state(client, lesson):
+    entry_id = post_sync(client, [create("op-1", lesson, "Дроби")])["results"][0]["entry_id"]
+    token = post_sync(client)["token"]
+    update = {"key": "op-2", "op": "update", "entry_id": entry_id, "base_version": 1, "entry": {**lesson, "topic": "Дроби, часть 2"}}
+    assert post_sync(client, [update], since=token)["results"][0]["version"] == 2
+
+    # Второе устройство меняло ту же запись с версии 1: конфликт и текущее состояние в ответе
+    stale = {**update, "key": "op-3", "entry": {**lesson, "topic": "Другое"}}
+    body = post_sync(client, [stale], since=post_sync(client, since=token)["token"])
+    assert body["results"][0] == {"key": "op-3", "status": "conflict", "entry_id": entry_id, "version": 2, "error": None}
+    assert topics(body) == ["Дроби, часть 2"]
+
+def test_missing_entry_and_invalid_operation(client, lesson):
+    results = post_sync(client, [
+        {"key": "op-1", "op": "delete", "entry_id": 999, "base_version": 1},
+        {"key": "op-2", "op": "update", "entry_id": 999},
+    ])["results"]
+    assert [result["status"] for result in results] == ["not_found", "invalid"]
+
+def test_delta_has_changes_and_deleted(client, lesson):
+    applied = post_sync(client, [create("op-1", lesson, "Дроби"), create("op-2", lesson, "Проценты")])["results"]
+    token = post_sync(client)["token"]
+    body = post_sync(client, [
+        {"key": "op-3", "op": "delete", "entry_id": applied[0]["entry_id"], "base_version": 1},
+        create("op-4", lesson, "Уравнения"),
+    ], since=token)
+    assert topics(body) == ["Уравнения"]
+    assert body["deleted"] == [applied[0]["entry_id"]]
+    assert post_sync(client, since=body["token"])["changes"] == []
+
+def test_entry_moved_out_of_class_is_deleted_for_it(client, lesson, db):
+    entry_id = post_sync(client, [create("op-1", lesson, "Дроби")])["results"][0]["entry_id"]
+    old_class = lesson["class_id"]
+    token = post_sync(client, class_id=old_class)["token"]
+    new_class = db.query(Class.id).filter(Class.id != old_class).scalar()
+    move = {"key": "op-2", "op": "update", "entry_id": entry_id, "base_version": 1, "entry": {**lesson, "topic": "Дроби", "class_id": new_class}}
+    body = post_sync(client, [move], since=token, class_id=old_class)
+    assert body["changes"] == [] and body["deleted"] == [entry_id]
+
+def test_paging_with_has_more(client, lesson, monkeypatch):
+    post_sync(client, [create(f"op-{i}", lesson, f"Тема {i}") for i in range(5)])
+    monkeypatch.setattr(sync, "SYNC_MAX_CHANGES", 2)
+
+    def pages(since=None):
+        seen = []
+        while True:
+            body = post_sync(client, since=since)
+            seen.append(topics(body))
+            since = body["token"]
+            if not body["has_more"]:
+                return seen, since
+
+    # Первая загрузка постранично по id, затем дельта по журналу тоже постранично
+    loaded, token = pages()
+    assert loaded == [["Тема 0", "Тема 1"], ["Тема 2", "Тема 3"], ["Тема 4"]]
+    post_sync(client, [create(f"op-{i}", lesson, f"Тема {i}") for i in range(5, 8)])
+    delta, _ = pages(token)
+    assert delta == [["Тема 5", "Тема 6"], ["Тема 7"]]
+
+def test_late_commit_is_delivered(client, lesson, db):
+    post_sync(client, [create("op-1", lesson, "Дроби")])
+    token = post_sync(client)["token"]
+    last_seq = db.query(ChangeLog.seq).order_by(ChangeLog.seq.desc()).limit(1).scalar()
+
+    # Транзакция с seq last_seq + 1 еще не закоммитила, а следующая уже видна: выдавать ее рано
+    add_late_entry(db, lesson, "Проценты", last_seq + 2)
+    body = post_sync(client, since=token)
+    assert body["changes"] == []
+
+    # Запись закоммичена позже и с временем изменения час назад - по часам она была бы пропущена
+    add_late_entry(db, lesson, "Уравнения", last_seq + 1, age=3600)
+    assert topics(post_sync(client, since=body["token"])) == ["Проценты", "Уравнения"]
+
+def test_expired_and_invalid_tokens(client, lesson, db):
+    post_sync(client, [create("op-1", lesson, "Дроби")])
+    token = post_sync(client)["token"]
+    post_sync(client, [create("op-2", lesson, "Проценты"), create("op-3", lesson, "Степени")])
+
+    # Строки журнала после токена удалены очисткой: пакет не применяется, клиент загружает все заново
+    db.query(ChangeLog).update({ChangeLog.created_at: datetime.utcnow() - timedelta(days=60)})
+    db.commit()
+    assert changes.purge_change_log(db) > 0
+    post_sync(client, [create("op-4", lesson, "Уравнения")], since=token, status=410)
+    assert "Уравнения" not in topics(post_sync(client))
+
+    # Токен прежнего формата (время|id) тоже требует полной загрузки, мусор - ошибка запроса
+    old = base64.urlsafe_b64encode(b"2025-09-01T09:00:00|5").decode()
+    post_sync(client, since=old, status=410)
+    post_sync(client, since="не токен", status=400)
@@ -1,10 +1,15 @@
 import axios from 'axios';
 
-const API_BASE_URL = 'http://localhost:8080';
+export const API_BASE_URL = 'http://localhost:8080';
+
+// Школа для входа, если сервер обслуживает несколько школ (TENANCY=1); после входа она берется из токена
+const SCHOOL: string | undefined = import.meta.env.VITE_SCHOOL;
+export const schoolHeaders: Record<string, string> = SCHOOL ? { 'X-School': SCHOOL } : {};
 
 const api = axios.create({
   baseURL: API_BASE_URL,
-  timeout: 10000
+  timeout: 10000,
+  headers: schoolHeaders
 });
 
 // Добавляем токен к запросам
@@ -16,12 +21,44 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
-// Обрабатываем ошибки авторизации
+// Один общий запрос обновления на все параллельные 401
+let refreshRequest: Promise<string> | null = null;
+
+const refreshAccessToken = (refreshToken: string): Promise<string> => {
+  if (!refreshRequest) {
+    refreshRequest = axios
+      .post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken }, { headers: schoolHeaders })
+      .then((response) => {
+        localStorage.setItem('access_token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token as string;
+      })
+      .finally(() => {
+        refreshRequest = null;
+      });
+  }
+  return refreshRequest;
+};
+
+// Обрабатываем ошибки авторизации: сначала пробуем обновить токен, без повторного ввода пароля
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (error.response?.status === 401 && refreshToken && original && !original._retry) {
+      original._retry = true;
+      try {
+        const token = await refreshAccessToken(refreshToken);
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch {
+        // refresh-токен истек или отозван - нужен обычный вход
+      }
+    }
     if (error.response?.status === 401) {
       localStorage.removeItem('access_token');
+      localStorage.removeItem('refresh_token');
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -0,0 +1,68 @@
+import { API_BASE_URL, schoolHeaders } from './api';
+import { ChangeEvent } from '../types';
+
+// Подписка на изменения класса через Server-Sent Events. EventSource не умеет передавать
+// заголовок Authorization, поэтому поток читается через fetch. После обрыва подписка
+// переподключается и продолжает с последнего полученного seq (Last-Event-ID).
+
+const RECONNECT_DELAY_MS = 3000;
+
+export interface ChangeHandlers {
+  onChange: (change: ChangeEvent) => void;
+  // Сервер уже удалил часть пропущенных изменений: данные класса нужно загрузить заново
+  onReset?: () => void;
+}
+
+export const subscribeChanges = (classId: number | undefined, handlers: ChangeHandlers): (() => void) => {
+  const controller = new AbortController();
+  let lastSeq: string | undefined;
+
+  const handleBlock = (block: string) => {
+    let event = 'message';
+    let data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('id:')) lastSeq = line.slice(3).trim();
+      else if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    }
+    if (event === 'change') handlers.onChange(JSON.parse(data));
+    else if (event === 'reset') handlers.onReset?.();
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const headers: Record<string, string> = { ...schoolHeaders };
+        const token = localStorage.getItem('access_token');
+        if (token) headers.Authorization = `Bearer ${token}`;
+        if (lastSeq) headers['Last-Event-ID'] = lastSeq;
+        const params = classId === undefined ? '' : `?class_id=${classId}`;
+        const response = await fetch(`${API_BASE_URL}/changes/stream${params}`, {
+          headers,
+          signal: controller.signal
+        });
+        if (!response.ok || !response.body) throw new Error(`Change stream: HTTP ${response.status}`);
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf('\n\n')) >= 0) {
+            handleBlock(buffer.slice(0, end));
+            buffer = buffer.slice(end + 2);
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        console.warn('Change stream interrupted, reconnecting', error);
+      }
+      await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+};
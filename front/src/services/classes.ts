@@ -1,5 +1,5 @@
 import api from './api';
-import { Class, ClassCreate, ClassWithStudents, Student, StudentCreate } from '../types';
+import { Class, ClassCreate, ClassWithStudents, Gradebook, Student, StudentCreate } from '../types';
 
 export const classService = {
   async createClass(classData: ClassCreate): Promise<Class> {
@@ -26,6 +26,13 @@ export const classService = {
     }
   },
 
+  async getGradebook(classId: number, subjectId: number, from?: string, to?: string): Promise<Gradebook> {
+    const response = await api.get<Gradebook>(`/classes/${classId}/gradebook`, {
+      params: { subject_id: subjectId, from, to }
+    });
+    return response.data;
+  },
+
   async createStudent(studentData: StudentCreate): Promise<Student> {
     try {
       const response = await api.post<Student>('/students', studentData);
@@ -1,5 +1,5 @@
 import api from './api';
-import { JournalEntry, JournalEntryCreate, Subject, SubjectCreate } from '../types';
+import { EntryFilters, EntryHistoryRecord, JournalEntry, JournalEntryCreate, Subject, SubjectCreate } from '../types';
 
 export const journalService = {
   // Предметы
@@ -40,13 +40,28 @@ async createEntry(entryData: JournalEntryCreate): Promise<JournalEntry> {
   }
 },
 
-  async getEntries(): Promise<JournalEntry[]> {
-    const response = await api.get<JournalEntry[]>('/entries');
+  async getEntries(filters: EntryFilters = {}): Promise<JournalEntry[]> {
+    // Сервер отдает записи страницами, следующая страница указана в заголовке X-Next-Cursor
+    const entries: JournalEntry[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await api.get<JournalEntry[]>('/entries', {
+        params: { ...filters, cursor }
+      });
+      entries.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return entries;
+  },
+
+  async getEntry(entryId: number, asOf?: string): Promise<JournalEntry> {
+    // asOf - состояние записи на указанный момент (из истории изменений)
+    const response = await api.get<JournalEntry>(`/entries/${entryId}`, { params: asOf ? { as_of: asOf } : undefined });
     return response.data;
   },
 
-  async getEntry(entryId: number): Promise<JournalEntry> {
-    const response = await api.get<JournalEntry>(`/entries/${entryId}`);
+  async getEntryHistory(entryId: number): Promise<EntryHistoryRecord[]> {
+    const response = await api.get<EntryHistoryRecord[]>(`/entries/${entryId}/history`);
     return response.data;
   },
 
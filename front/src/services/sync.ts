@@ -0,0 +1,95 @@
+import api from './api';
+import { JournalEntry, JournalEntryCreate, SyncOperation, SyncResponse, SyncResult } from '../types';
+
+// Изменения без сети копятся в очереди (localStorage) и отправляются пакетом в POST /sync.
+// Ключ операции создается один раз, поэтому повтор после обрыва связи не создает дублей.
+// Новая запись до синхронизации известна только по ключу своей операции create.
+
+const QUEUE_KEY = 'sync_queue';
+const TOKEN_KEY = 'sync_token';
+
+const loadQueue = (): SyncOperation[] => JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+const saveQueue = (queue: SyncOperation[]) => localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+const tokenKey = (classId?: number) => (classId === undefined ? TOKEN_KEY : `${TOKEN_KEY}_${classId}`);
+
+const newKey = (): string =>
+  typeof crypto !== 'undefined' && 'randomUUID' in crypto
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+export interface SyncOutcome {
+  results: SyncResult[];
+  changes: JournalEntry[];
+  deleted: number[];
+}
+
+export const syncService = {
+  pending(): SyncOperation[] {
+    return loadQueue();
+  },
+
+  queueCreate(entry: JournalEntryCreate): string {
+    const key = newKey();
+    saveQueue([...loadQueue(), { key, op: 'create', entry }]);
+    return key;
+  },
+
+  // target - id записи на сервере или ключ еще не отправленной операции create
+  queueUpdate(target: number | string, baseVersion: number, entry: JournalEntryCreate) {
+    const queue = loadQueue();
+    const pendingCreate = queue.find((op) => op.op === 'create' && op.key === target);
+    if (pendingCreate) {
+      pendingCreate.entry = entry;
+    } else {
+      queue.push({ key: newKey(), op: 'update', entry_id: target as number, base_version: baseVersion, entry });
+    }
+    saveQueue(queue);
+  },
+
+  queueDelete(target: number | string, baseVersion: number) {
+    const queue = loadQueue();
+    if (queue.some((op) => op.op === 'create' && op.key === target)) {
+      saveQueue(queue.filter((op) => op.key !== target));
+      return;
+    }
+    saveQueue([...queue, { key: newKey(), op: 'delete', entry_id: target as number, base_version: baseVersion }]);
+  },
+
+  // Отправляет очередь и получает изменения сервера после прошлой синхронизации.
+  // При ошибке сети очередь остается как есть и уйдет с теми же ключами в следующий раз.
+  async sync(classId?: number): Promise<SyncOutcome> {
+    const operations = loadQueue();
+    const outcome: SyncOutcome = { results: [], changes: [], deleted: [] };
+    let since = localStorage.getItem(tokenKey(classId)) || undefined;
+    let batch = operations;
+    for (;;) {
+      let data: SyncResponse;
+      try {
+        const response = await api.post<SyncResponse>('/sync', { operations: batch, since, class_id: classId });
+        data = response.data;
+      } catch (error: any) {
+        if (error.response?.status === 410 && since) {
+          // Токен устарел: загружаем журнал заново целиком
+          since = undefined;
+          outcome.changes = [];
+          outcome.deleted = [];
+          continue;
+        }
+        throw error;
+      }
+      if (batch.length) {
+        const sent = new Set(data.results.map((result) => result.key));
+        saveQueue(loadQueue().filter((op) => !sent.has(op.key)));
+        outcome.results = data.results;
+        batch = [];
+      }
+      outcome.changes.push(...data.changes);
+      outcome.deleted.push(...data.deleted);
+      since = data.token;
+      localStorage.setItem(tokenKey(classId), data.token);
+      if (!data.has_more) {
+        return outcome;
+      }
+    }
+  }
+};
@@ -13,6 +13,7 @@ export interface UserCreate {
 export interface LoginResponse {
   access_token: string;
   token_type: string;
+  refresh_token: string;
 }
 
 export interface Subject {
@@ -37,6 +38,15 @@ export interface JournalEntry {
   grades: { [studentId: number]: GradeInfo };  // Добавьте это свойство
   subject_name?: string;
   class_name?: string;
+  version: number;  // растет при каждом изменении, нужна для синхронизации
+}
+
+export interface EntryHistoryRecord {
+  version: number;
+  action: 'create' | 'update' | 'delete' | 'snapshot';  // snapshot - свернутое состояние на конец месяца
+  changed_by: number | null;
+  changed_at: string;
+  changes: { [field: string]: any };  // только изменившиеся поля; null в attendance/grades - отметку убрали
 }
 
 export interface JournalEntryCreate {
@@ -49,6 +59,64 @@ export interface JournalEntryCreate {
   grades: { [studentId: number]: GradeInfo };  // Добавьте это свойство
 }
 
+// Офлайн-синхронизация (POST /sync)
+export interface SyncOperation {
+  key: string;  // ключ идемпотентности: повтор операции не создает дублей
+  op: 'create' | 'update' | 'delete';
+  entry_id?: number;
+  base_version?: number;
+  entry?: JournalEntryCreate;
+}
+
+export interface SyncResult {
+  key: string;
+  status: 'applied' | 'conflict' | 'not_found' | 'invalid';
+  entry_id?: number | null;
+  version?: number | null;
+  error?: string | null;
+}
+
+export interface SyncResponse {
+  results: SyncResult[];
+  changes: JournalEntry[];
+  deleted: number[];
+  token: string;
+  has_more: boolean;
+}
+
+// Лента изменений (GET /changes/stream): только что изменилось, сами данные клиент перечитывает
+export interface ChangeEvent {
+  seq: number;
+  kind: 'entry' | 'schedule';
+  id: number;
+  action: 'create' | 'update' | 'delete';
+  class_id: number | null;
+  version: number | null;
+  at: string;
+}
+
+export interface EntryFilters {
+  class_id?: number;
+  subject_id?: number;
+  date_from?: string;
+  date_to?: string;
+}
+
+// Журнал класса в колоночном виде: grades[i][j] - ученик students.id[i] на уроке lessons.id[j]
+export interface Gradebook {
+  class_id: number;
+  subject_id: number;
+  students: { id: number[]; name: string[] };
+  lessons: { id: number[]; date: string[] };
+  grades: (string | null)[][];
+  attendance: (string | null)[][];
+  stats: {
+    average: (number | null)[];
+    count: number[];
+    attendance_rate: (number | null)[];
+  };
+}
+
 export interface GradeInfo {
   grade?: string;
   comment?: string;